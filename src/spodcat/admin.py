@@ -1,7 +1,6 @@
 import logging
 import os
 import random
-import statistics
 import tempfile
 from datetime import date, timedelta
 from threading import Thread
@@ -16,18 +15,17 @@ from django.core.exceptions import PermissionDenied
 from django.core.files.uploadedfile import UploadedFile
 from django.db import models
 from django.db.models import (
-    Avg,
+    Case,
     Count,
     F,
     FloatField,
-    Max,
-    Min,
     OuterRef,
     Q,
     Subquery,
     Sum,
+    When,
 )
-from django.db.models.functions import Cast
+from django.db.models.functions import Cast, Coalesce
 from django.forms import ClearableFileInput, ModelChoiceField
 from django.http import HttpRequest, HttpResponseRedirect
 from django.template.response import TemplateResponse
@@ -54,12 +52,23 @@ from spodcat.models import (
     Podcast,
     Post,
 )
+from spodcat.settings import spodcat_settings
 from spodcat.utils import delete_storage_file, seconds_to_timestamp
 
 
 logger = logging.getLogger(__name__)
 
 
+def get_rollups_complete_through() -> date | None:
+    """The last date to read audio rollups for, or None to not use them."""
+    if not spodcat_settings.USE_LOG_ROLLUPS:
+        return None
+
+    from spodcat.logs.models import PodcastEpisodeAudioDailyRollup
+
+    return PodcastEpisodeAudioDailyRollup.get_complete_through()
+
+
 @admin.register(Podcast)
 class PodcastAdmin(AdminMixin, admin.ModelAdmin):
     filter_horizontal = ["categories", "authors"]
@@ -172,14 +181,28 @@ class PodcastAdmin(AdminMixin, admin.ModelAdmin):
     def play_count(self, obj):
         from spodcat.logs.models import PodcastEpisodeAudioRequestLog
 
+        audio_request_log_qs = PodcastEpisodeAudioRequestLog.objects.filter(is_bot=False, episode__podcast=obj)
+        rollup_play_count = None
+        rollups_through = get_rollups_complete_through()
+
+        if rollups_through is not None:
+            from spodcat.logs.models import PodcastEpisodeAudioDailyRollup
+
+            rollup_play_count = (
+                PodcastEpisodeAudioDailyRollup.objects
+                .filter(is_bot=False, episode__podcast=obj, date__lte=rollups_through)
+                .aggregate(play_count=Sum("plays"))
+            )["play_count"]
+            audio_request_log_qs = audio_request_log_qs.filter_dates(start_date=rollups_through + timedelta(days=1))
+
         play_count = (
-            PodcastEpisodeAudioRequestLog.objects
-            .filter(is_bot=False, episode__podcast=obj)
+            audio_request_log_qs
             .aggregate(play_count=Sum(Cast(F("response_body_size"), FloatField()) / F("episode__audio_file_length")))
         )["play_count"]
 
-        if play_count is None:
+        if play_count is None and rollup_play_count is None:
             return 0.0
+        play_count = (play_count or 0.0) + (rollup_play_count or 0.0)
 
         return self.get_changelist_link(
             model=PodcastEpisodeAudioRequestLog,
@@ -221,31 +244,10 @@ class PodcastAdmin(AdminMixin, admin.ModelAdmin):
         return mark_safe(f'<a href="{url}">' + _("Statistics") + "</a>")
 
     def stats_view(self, request: HttpRequest, object_id):
-        from spodcat.logs.models import (
-            PodcastContentRequestLog,
-            PodcastEpisodeAudioRequestLog,
-            PodcastRequestLog,
-        )
+        from spodcat.logs.stats import get_podcast_stats
 
         obj = self.get_object(request, unquote(object_id))
-        audio_request_log_qs = PodcastEpisodeAudioRequestLog.objects.filter(episode__podcast=obj, is_bot=False)
-        home_page_views = PodcastRequestLog.objects.filter(podcast=obj).get_monthly_views()
-        content_page_views = PodcastContentRequestLog.objects.filter(content__podcast=obj).get_monthly_views()
-        episode_durations = (
-            Episode.objects
-            .filter(podcast=obj)
-            .listed()
-            .aggregate(
-                total=Sum("duration_seconds"),
-                max=Max("duration_seconds"),
-                min=Min("duration_seconds"),
-                avg=Avg("duration_seconds"),
-            )
-        )
-        episode_durations["median"] = statistics.median(
-            Episode.objects.filter(podcast=obj).listed().values_list("duration_seconds", flat=True)
-        )
-        top_episodes_all_time = audio_request_log_qs.get_most_played().filter(plays__gte=0.05)
+        stats = get_podcast_stats(obj)
 
         return TemplateResponse(
             request=request,
@@ -254,29 +256,19 @@ class PodcastAdmin(AdminMixin, admin.ModelAdmin):
                 "opts": self.opts,
                 "episode_opts": Episode._meta,
                 "object": obj,
-                "home_page_views": home_page_views,
-                "home_page_views_total": home_page_views.aggregate(total=Sum("views"))["total"],
-                "home_page_visitors_total": (
-                    PodcastRequestLog.objects
-                    .filter(podcast=obj)
-                    .aggregate(visitors=Count("remote_addr", distinct=True))
-                )["visitors"],
-                "content_page_views": content_page_views,
-                "content_page_views_total": content_page_views.aggregate(total=Sum("views"))["total"],
-                "content_page_visitors_total": (
-                    PodcastContentRequestLog.objects
-                    .filter(content__podcast=obj)
-                    .aggregate(visitors=Count("remote_addr", distinct=True))
-                )["visitors"],
-                "published_episodes": Episode.objects.filter(podcast=obj).listed().count(),
-                "episode_durations": episode_durations,
-                "top_episodes_all_time": top_episodes_all_time,
-                "top_episode_first_week": top_episodes_all_time.filter(
-                    created__lte=F("episode__published") + timedelta(days=7)
-                ),
-                "top_countries": audio_request_log_qs.get_ip_count_query(ccode=F("geoip__country")),
-                "top_apps": audio_request_log_qs.get_ip_count_query(app_name=F("user_agent_data__name")),
-                "top_devices": audio_request_log_qs.get_ip_count_query(device_name=F("user_agent_data__device_name")),
+                "home_page_views": stats.home_page.monthly_views,
+                "home_page_views_total": stats.home_page.views_total,
+                "home_page_visitors_total": stats.home_page.visitors_total,
+                "content_page_views": stats.content_page.monthly_views,
+                "content_page_views_total": stats.content_page.views_total,
+                "content_page_visitors_total": stats.content_page.visitors_total,
+                "published_episodes": stats.published_episodes,
+                "episode_durations": stats.episode_durations,
+                "top_episodes_all_time": stats.top_episodes_all_time,
+                "top_episode_first_week": stats.top_episode_first_week,
+                "top_countries": stats.listeners.top_countries,
+                "top_apps": stats.listeners.top_apps,
+                "top_devices": stats.listeners.top_devices,
                 "title": _("Statistics"),
                 "subtitle": str(obj),
                 "media": self.media,
@@ -391,7 +383,39 @@ class EpisodeAdmin(BasePodcastContentAdmin):
 
     def get_queryset(self, request):
         if apps.is_installed("spodcat.logs"):
-            from spodcat.logs.models import PodcastEpisodeAudioRequestLog
+            from spodcat.logs.models import (
+                PodcastEpisodeAudioDailyRollup,
+                PodcastEpisodeAudioRequestLog,
+            )
+
+            rollups_through = get_rollups_complete_through()
+
+            if rollups_through is not None:
+                # Rollups for all days they are complete through, raw logs
+                # for the days after that.
+                return (
+                    super().get_queryset(request)
+                    .alias(
+                        rollup_play_count=Subquery(
+                            PodcastEpisodeAudioDailyRollup.objects
+                            .filter(is_bot=False, date__lte=rollups_through)
+                            .get_play_count_query(episode=OuterRef("pk"))
+                        ),
+                        recent_play_count=Subquery(
+                            PodcastEpisodeAudioRequestLog.objects
+                            .filter(is_bot=False)
+                            .filter_dates(start_date=rollups_through + timedelta(days=1))
+                            .get_play_count_query(episode=OuterRef("pk"))
+                        ),
+                    )
+                    .annotate(
+                        play_count=Case(
+                            When(Q(rollup_play_count=None, recent_play_count=None), then=None),
+                            default=Coalesce("rollup_play_count", 0.0) + Coalesce("recent_play_count", 0.0),
+                            output_field=FloatField(),
+                        ),
+                    )
+                )
 
             return (
                 super().get_queryset(request)
@@ -502,16 +526,10 @@ class EpisodeAdmin(BasePodcastContentAdmin):
         return mark_safe(f'<a href="{url}">' + _("Statistics") + "</a>")
 
     def stats_view(self, request: HttpRequest, object_id):
-        from spodcat.logs.models import (
-            PodcastContentRequestLog,
-            PodcastEpisodeAudioRequestLog,
-        )
+        from spodcat.logs.stats import get_episode_stats
 
         obj = self.get_object(request, unquote(object_id))
-        audio_request_log_qs = PodcastEpisodeAudioRequestLog.objects.filter(episode=obj, is_bot=False)
-        page_views = PodcastContentRequestLog.objects.filter(content=obj).get_monthly_views()
-        plays_qs = audio_request_log_qs.filter(response_body_size__gt=0).with_quota_fetched()
-        players_qs = audio_request_log_qs.filter(response_body_size__gt=0)
+        stats = get_episode_stats(obj)
 
         return TemplateResponse(
             request=request,
@@ -520,28 +538,16 @@ class EpisodeAdmin(BasePodcastContentAdmin):
                 "opts": self.opts,
                 "episode_opts": Episode._meta,
                 "object": obj,
-                "page_views": page_views,
-                "page_views_total": page_views.aggregate(total=Sum("views"))["total"],
-                "page_visitors_total": (
-                    PodcastContentRequestLog.objects
-                    .filter(content=obj)
-                    .aggregate(visitors=Count("remote_addr", distinct=True))
-                )["visitors"],
-                "plays_all_time": plays_qs.aggregate(plays=Sum("quota_fetched"))["plays"],
-                "plays_first_week": (
-                    plays_qs
-                    .filter(created__lte=F("episode__published") + timedelta(days=7))
-                    .aggregate(plays=Sum("quota_fetched"))
-                )["plays"],
-                "players_all_time": players_qs.aggregate(players=Count("remote_addr", distinct=True))["players"],
-                "players_first_week": (
-                    players_qs
-                    .filter(created__lte=F("episode__published") + timedelta(days=7))
-                    .aggregate(players=Count("remote_addr", distinct=True))
-                )["players"],
-                "top_countries": audio_request_log_qs.get_ip_count_query(ccode=F("geoip__country")),
-                "top_apps": audio_request_log_qs.get_ip_count_query(app_name=F("user_agent_data__name")),
-                "top_devices": audio_request_log_qs.get_ip_count_query(device_name=F("user_agent_data__device_name")),
+                "page_views": stats.page.monthly_views,
+                "page_views_total": stats.page.views_total,
+                "page_visitors_total": stats.page.visitors_total,
+                "plays_all_time": stats.plays_all_time,
+                "plays_first_week": stats.plays_first_week,
+                "players_all_time": stats.players_all_time,
+                "players_first_week": stats.players_first_week,
+                "top_countries": stats.listeners.top_countries,
+                "top_apps": stats.listeners.top_apps,
+                "top_devices": stats.listeners.top_devices,
                 "title": _("Statistics"),
                 "subtitle": str(obj),
                 "media": self.media,
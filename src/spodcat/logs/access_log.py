@@ -0,0 +1,266 @@
+import datetime
+import gzip
+import ipaddress
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Callable, Iterable, Iterator
+from urllib.parse import unquote, urlsplit
+
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from spodcat.logs.cache import (
+    geoip_cache,
+    invalidate_graph_cache,
+    user_agent_cache,
+)
+from spodcat.logs.models import GeoIP, PodcastEpisodeAudioRequestLog, UserAgent
+
+
+logger = logging.getLogger(__name__)
+
+COMBINED_LOG_RE = re.compile(
+    r'^(?P<remote_addr>\S+) \S+ \S+ \[(?P<time>[^\]]+)\] "(?P<method>\S+) (?P<path>\S+)[^"]*" '
+    r'(?P<status>\d{3}) (?P<size>\d+|-)(?: "(?P<referrer>[^"]*)" "(?P<user_agent>[^"]*)")?'
+)
+
+
+@dataclass
+class AccessLogRecord:
+    """One episode audio request from an access log."""
+    created: datetime.datetime
+    path: str
+    remote_addr: str | None
+    response_body_size: int
+    status_code: int
+    duration_ms: int | None = None
+    referrer: str = ""
+    user_agent: str = ""
+
+
+@dataclass
+class AccessLogImportResult:
+    lines: int = 0
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+
+
+def parse_azure_line(line: str) -> AccessLogRecord | None:
+    """
+    Parses one line of Azure Storage blob resource logs (as exported by a
+    diagnostic setting, one JSON object per line). Only successful GetBlob
+    operations are returned.
+    """
+    try:
+        row = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+
+    if row.get("operationName") != "GetBlob" or not 200 <= int(row.get("statusCode", 0)) < 300:
+        return None
+
+    properties = row.get("properties", {})
+    created = parse_datetime(row.get("time", ""))
+    if created is None:
+        return None
+
+    return AccessLogRecord(
+        created=created,
+        path=urlsplit(row.get("uri", "")).path,
+        remote_addr=clean_remote_addr(row.get("callerIpAddress", "")),
+        response_body_size=int(properties.get("responseBodySize", 0)),
+        status_code=int(row["statusCode"]),
+        duration_ms=row.get("durationMs", None),
+        referrer=properties.get("referrerHeader", ""),
+        user_agent=properties.get("userAgentHeader", ""),
+    )
+
+
+def parse_combined_line(line: str) -> AccessLogRecord | None:
+    """
+    Parses one line in the NCSA combined (or common) log format, as used by
+    Apache, Nginx, and many CDNs. Only successful GET requests are returned.
+    """
+    match = COMBINED_LOG_RE.match(line)
+    if not match or match["method"] != "GET" or not match["status"].startswith("2"):
+        return None
+
+    try:
+        created = datetime.datetime.strptime(match["time"], "%d/%b/%Y:%H:%M:%S %z")
+    except ValueError:
+        return None
+
+    return AccessLogRecord(
+        created=created,
+        path=urlsplit(match["path"]).path,
+        remote_addr=clean_remote_addr(match["remote_addr"]),
+        response_body_size=int(match["size"]) if match["size"] != "-" else 0,
+        status_code=int(match["status"]),
+        referrer=match["referrer"] if match["referrer"] not in (None, "-") else "",
+        user_agent=match["user_agent"] if match["user_agent"] not in (None, "-") else "",
+    )
+
+
+PARSERS: dict[str, Callable[[str], AccessLogRecord | None]] = {
+    "azure": parse_azure_line,
+    "combined": parse_combined_line,
+}
+
+
+def clean_remote_addr(address: str) -> str | None:
+    """Strips any port number, and returns None for invalid addresses."""
+    if address.startswith("["):
+        address = address[1:].split("]")[0]
+    elif address.count(":") == 1:
+        address = address.split(":")[0]
+
+    try:
+        return str(ipaddress.ip_address(address))
+    except ValueError:
+        return None
+
+
+class EpisodePathMatcher:
+    """
+    Finds the episode for an access log request path, by matching the end of
+    the path with the names of episode audio files. E.g. the path
+    `/container/my-podcast/episodes/foo.mp3` matches an episode whose audio
+    file name is `my-podcast/episodes/foo.mp3`.
+    """
+    def __init__(self):
+        from spodcat.models import Episode
+
+        self.episode_ids: dict[str, str] = {
+            name.strip("/"): str(episode_id)
+            for episode_id, name in Episode.objects.exclude(audio_file="").values_list("id", "audio_file")
+            if name
+        }
+
+    def get_episode_id(self, path: str) -> str | None:
+        parts = unquote(path).strip("/").split("/")
+        for idx in range(len(parts)):
+            episode_id = self.episode_ids.get("/".join(parts[idx:]), None)
+            if episode_id is not None:
+                return episode_id
+        return None
+
+
+def iter_lines(path: str | Path) -> Iterator[str]:
+    """Reads a plain or gzipped text file line by line."""
+    opener: Callable[..., IO[str]] = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+        yield from f
+
+
+def import_access_log(
+    lines: Iterable[str],
+    log_format: str = "combined",
+    batch_size: int = 1000,
+    no_bots: bool = False,
+    lookup_remote_hosts: bool = False,
+    progress: Callable[[AccessLogImportResult, float], None] | None = None,
+) -> AccessLogImportResult:
+    """
+    Imports episode audio requests from access log `lines` as
+    PodcastEpisodeAudioRequestLogs. Logs are enriched just like live ones,
+    and inserted or updated (using remote_addr and created as the natural
+    key) in batches of `batch_size`, one transaction per batch. Lines that
+    can't be parsed or don't match any episode are skipped, as are bots if
+    `no_bots` is True.
+
+    Remote hosts are not looked up unless `lookup_remote_hosts` is True,
+    since it's a lot faster to fill them in afterwards with the
+    `fill_remote_hosts` management command.
+    """
+    parser = PARSERS[log_format]
+    matcher = EpisodePathMatcher()
+    result = AccessLogImportResult()
+    started = time.monotonic()
+    batch: list[tuple[AccessLogRecord, str]] = []
+
+    def flush():
+        created, updated, skipped = import_batch(batch, no_bots=no_bots, lookup_remote_hosts=lookup_remote_hosts)
+        result.created += created
+        result.updated += updated
+        result.skipped += skipped
+        batch.clear()
+        elapsed = time.monotonic() - started
+        logger.info("%d lines read, %.1f lines/s", result.lines, result.lines / elapsed if elapsed else 0)
+        if progress:
+            progress(result, elapsed)
+
+    for line in lines:
+        result.lines += 1
+        record = parser(line)
+        episode_id = matcher.get_episode_id(record.path) if record else None
+
+        if record is None or episode_id is None:
+            result.skipped += 1
+            continue
+
+        batch.append((record, episode_id))
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+
+    if result.created or result.updated:
+        invalidate_graph_cache()
+
+    return result
+
+
+def import_batch(
+    batch: list[tuple[AccessLogRecord, str]],
+    no_bots: bool,
+    lookup_remote_hosts: bool,
+) -> tuple[int, int, int]:
+    prefetch_lookups([record for record, _ in batch])
+    logs = []
+    skipped = 0
+
+    for record, episode_id in batch:
+        log = PodcastEpisodeAudioRequestLog.create(
+            user_agent=record.user_agent,
+            remote_addr=record.remote_addr,
+            referrer=record.referrer,
+            created=record.created,
+            save=False,
+            lookup_remote_host=lookup_remote_hosts,
+            duration_ms=record.duration_ms,
+            episode_id=episode_id,
+            path_info=record.path,
+            response_body_size=record.response_body_size,
+            status_code=record.status_code,
+        )
+        if no_bots and log.is_bot:
+            skipped += 1
+        else:
+            logs.append(log)
+
+    with transaction.atomic():
+        created, updated = PodcastEpisodeAudioRequestLog.bulk_update_or_create(logs)
+
+    return created, updated, skipped
+
+
+def prefetch_lookups(records: list[AccessLogRecord]):
+    """
+    Loads the existing GeoIP and UserAgent objects needed for `records` into
+    the lookup caches with one query each, instead of one query per miss.
+    """
+    ips = {record.remote_addr for record in records if record.remote_addr}
+    user_agents = {record.user_agent for record in records if record.user_agent}
+
+    for geoip in GeoIP.objects.filter(ip__in=[ip for ip in ips if geoip_cache.get(ip) is None]):
+        geoip_cache.set(geoip.ip, geoip, shared=False)
+    for user_agent in UserAgent.objects.filter(
+        user_agent__in=[ua for ua in user_agents if user_agent_cache.get(ua) is None]
+    ):
+        user_agent_cache.set(user_agent.user_agent, user_agent, shared=False)
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from django.db.models.functions import Coalesce
+from django.db.models import Value as V
+from django.db.models.functions import Coalesce, NullIf
 from django.forms import ModelChoiceField, ModelForm
 from django.utils.translation import gettext_lazy as _
 
@@ -53,11 +54,17 @@ class LogAdmin(AdminMixin, admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return False
 
-    @admin.display(ordering=Coalesce("user_agent_data__name", "user_agent"), description=_("user agent name"))
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("user_agent_string")
+
+    @admin.display(
+        ordering=Coalesce("user_agent_data__name", NullIf("user_agent", V("")), "user_agent_string__value"),
+        description=_("user agent name"),
+    )
     def user_agent_name(self, obj: RequestLog):
         if obj.user_agent_data:
             return obj.user_agent_data.name
-        return obj.user_agent
+        return obj.get_user_agent()
 
 
 @admin.register(PodcastRequestLog)
@@ -126,6 +133,7 @@ class PodcastEpisodeAudioRequestLogAdmin(LogAdmin):
         "user_agent_name",
         "user_agent_data__type",
         "percent_fetched",
+        "request_count",
         "is_bot",
     ]
     list_filter = [
@@ -7,3 +7,11 @@ class SpodcatLogsConfig(AppConfig):
     name = "spodcat.logs"
     label = "spodcat_logs"
     verbose_name = _("logs")
+
+    def ready(self):
+        from spodcat.logs import signals
+        from spodcat.logs.warmup import warmup
+        from spodcat.settings import spodcat_settings
+
+        if spodcat_settings.PRELOAD_LOG_DATA:
+            warmup()
@@ -0,0 +1,195 @@
+import datetime
+import gzip
+import itertools
+import json
+import logging
+import tempfile
+from typing import IO, Iterator
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import Storage, storages
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.utils import timezone
+
+from spodcat.logs.cache import invalidate_graph_cache
+from spodcat.logs.models import RequestLog, get_request_log_models
+from spodcat.settings import spodcat_settings
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_archive_storage() -> Storage:
+    """
+    Archives contain full log rows (IP addresses, user agents etc.), so there
+    is deliberately no fallback to the default storage, which is typically
+    publicly readable media storage.
+    """
+    storage = spodcat_settings.LOG_ARCHIVE_STORAGE
+    if not storage:
+        raise ImproperlyConfigured("LOG_ARCHIVE_STORAGE is not set.")
+    if isinstance(storage, str):
+        return storages[storage]
+    return storage
+
+
+def get_log_class(name: str) -> type[RequestLog]:
+    for log_class in get_request_log_models():
+        if name in (log_class.__name__, log_class._meta.label):
+            return log_class
+    raise ValueError(f"{name} is not a request log model")
+
+
+def get_retention_cutoff(log_class: type[RequestLog]) -> datetime.datetime | None:
+    """
+    Logs created before the returned datetime are due for archival, according
+    to the LOG_RETENTION_DAYS setting. None means they are kept forever.
+    """
+    days = spodcat_settings.LOG_RETENTION_DAYS.get(log_class.__name__, None)
+    if days is None:
+        return None
+    return timezone.now() - datetime.timedelta(days=days)
+
+
+def iter_pk_chunks(queryset: models.QuerySet, chunk_size: int) -> Iterator[tuple[int, int]]:
+    """
+    Yields (first pk, last pk) for consecutive chunks of at most `chunk_size`
+    rows in `queryset`.
+    """
+    last_pk = 0
+
+    while True:
+        pks = list(
+            queryset.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:chunk_size]
+        )
+        if not pks:
+            return
+        yield pks[0], pks[-1]
+        last_pk = pks[-1]
+
+
+def write_archive(log_class: type[RequestLog], queryset: models.QuerySet, file: IO[bytes], chunk_size: int) -> int:
+    fields = log_class._meta.concrete_fields
+    count = 0
+
+    with gzip.GzipFile(fileobj=file, mode="wb") as gz:
+        for first_pk, last_pk in iter_pk_chunks(queryset, chunk_size):
+            for log in queryset.filter(pk__gte=first_pk, pk__lte=last_pk).order_by("pk"):
+                row = {field.attname: field.value_from_object(log) for field in fields}
+                # DjangoJSONEncoder would cut datetimes down to milliseconds.
+                row.update({k: v.isoformat() for k, v in row.items() if isinstance(v, datetime.datetime)})
+                gz.write(json.dumps(row, cls=DjangoJSONEncoder).encode() + b"\n")
+                count += 1
+
+    return count
+
+
+def archive_logs(
+    log_class: type[RequestLog],
+    cutoff: datetime.datetime,
+    chunk_size: int = 1000,
+    archive: bool = True,
+) -> tuple[int, str | None]:
+    """
+    Exports all `log_class` logs created before `cutoff` to a gzipped NDJSON
+    file in the archive storage, and then deletes them in chunks of at most
+    `chunk_size` rows, each in its own transaction. Nothing is deleted unless
+    the archive file was successfully saved. With `archive=False`, the logs
+    are just deleted.
+
+    Returns the number of deleted logs and the name of the archive file.
+    """
+    queryset = log_class.objects.filter(created__lt=cutoff)
+    max_pk = queryset.order_by("-pk").values_list("pk", flat=True).first()
+    name = None
+
+    if max_pk is None:
+        return 0, None
+
+    # Logs that somehow get created after this point will be left alone.
+    queryset = queryset.filter(pk__lte=max_pk)
+
+    if archive:
+        with tempfile.TemporaryFile() as file:
+            count = write_archive(log_class, queryset, file, chunk_size)
+            file.seek(0)
+            name = get_archive_storage().save(
+                f"log-archive/{log_class._meta.model_name}/"
+                f"{log_class._meta.model_name}-{cutoff:%Y%m%d%H%M%S}.ndjson.gz",
+                File(file),
+            )
+        logger.info("Archived %d %s to %s", count, log_class.__name__, name)
+
+    deleted = 0
+    for first_pk, last_pk in iter_pk_chunks(queryset, chunk_size):
+        with transaction.atomic():
+            deleted += queryset.filter(pk__gte=first_pk, pk__lte=last_pk).delete()[0]
+
+    if deleted:
+        invalidate_graph_cache()
+
+    return deleted, name
+
+
+def import_archive(log_class: type[RequestLog], name: str, batch_size: int = 1000) -> tuple[int, int]:
+    """
+    Re-imports logs from an archive file created by archive_logs(). Logs
+    that already exist are left as they are. Missing nullable foreign keys
+    (e.g. UserAgent objects that have since been deleted) are set to null;
+    logs whose non-nullable foreign keys are missing (e.g. logs for deleted
+    episodes) are skipped.
+
+    Returns the number of imported (or already existing) and skipped logs.
+    """
+    fields = {field.attname: field for field in log_class._meta.concrete_fields}
+    imported = 0
+    skipped = 0
+
+    with get_archive_storage().open(name, "rb") as file, gzip.GzipFile(fileobj=file, mode="rb") as gz:
+        batch: list[RequestLog] = []
+
+        for line in itertools.chain(gz, [None]):
+            if line is not None:
+                row = json.loads(line)
+                batch.append(log_class(**{key: fields[key].to_python(value) for key, value in row.items()}))
+
+            if batch and (line is None or len(batch) >= batch_size):
+                batch_imported, batch_skipped = import_batch(log_class, batch)
+                imported += batch_imported
+                skipped += batch_skipped
+                batch = []
+
+    if imported:
+        invalidate_graph_cache()
+
+    return imported, skipped
+
+
+def import_batch(log_class: type[RequestLog], logs: list[RequestLog]) -> tuple[int, int]:
+    skipped = 0
+
+    for field in log_class._meta.concrete_fields:
+        if not isinstance(field, models.ForeignKey):
+            continue
+        ids = {getattr(log, field.attname) for log in logs} - {None}
+        existing = set(
+            field.related_model._default_manager
+            .filter(pk__in=ids)
+            .values_list("pk", flat=True)
+        )
+        missing = ids - existing
+        if not missing:
+            continue
+        if field.null:
+            for log in logs:
+                if getattr(log, field.attname) in missing:
+                    setattr(log, field.attname, None)
+        else:
+            kept = [log for log in logs if getattr(log, field.attname) not in missing]
+            skipped += len(logs) - len(kept)
+            logs = kept
+
+    log_class.objects.bulk_create(logs, ignore_conflicts=True)
+    return len(logs), skipped
@@ -0,0 +1,204 @@
+import ipaddress
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from spodcat.logs.ip_check import GeoIP2Result, lookup_many
+from spodcat.logs.models import (
+    BackfillCheckpoint,
+    GeoIP,
+    RequestLog,
+    get_request_log_models,
+)
+from spodcat.logs.remote_host import RemoteHostResolver
+from spodcat.settings import spodcat_settings
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_ips_without_geoip(log_classes: Iterable[type[RequestLog]]) -> list[str]:
+    """
+    Distinct public remote IPs of logs without GeoIP, from all `log_classes`
+    in one query.
+    """
+    querysets = [
+        log_class.objects
+        .filter(geoip=None)
+        .exclude(remote_addr=None)
+        .order_by()
+        .values_list("remote_addr", flat=True)
+        .distinct()
+        for log_class in log_classes
+    ]
+    if not querysets:
+        return []
+
+    ips = querysets[0].union(*querysets[1:]) if len(querysets) > 1 else querysets[0]
+    return [ip for ip in ips if not ipaddress.ip_address(ip).is_private]
+
+
+def fill_geoips(
+    log_classes: Iterable[type[RequestLog]] | None = None,
+    batch_size: int = 1000,
+    progress: Callable[[int, int, float], None] | None = None,
+) -> int:
+    """
+    Sets GeoIP on all logs that lack one, for all request log models (or just
+    `log_classes`). IPs are looked up in batches, the next batch being looked
+    up in a background thread while the results for the current one are
+    written to the database. Every batch is committed separately.
+
+    `progress` is called after every batch with the number of handled IPs,
+    the total number of IPs, and the number of seconds elapsed.
+
+    Returns the number of IPs that now have GeoIP data.
+    """
+    log_classes = list(log_classes or get_request_log_models())
+    started = time.monotonic()
+    ips = get_ips_without_geoip(log_classes)
+    batches = [ips[idx:idx + batch_size] for idx in range(0, len(ips), batch_size)]
+    filled = 0
+
+    if not batches:
+        return 0
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="spodcat-geoip") as executor:
+        future = executor.submit(lookup_many, batches[0])
+
+        for idx, batch in enumerate(batches):
+            results = future.result()
+            if idx + 1 < len(batches):
+                future = executor.submit(lookup_many, batches[idx + 1])
+
+            filled += save_geoips(log_classes, batch, results)
+            handled = min((idx + 1) * batch_size, len(ips))
+            elapsed = time.monotonic() - started
+            logger.info("(%d/%d) IPs handled, %.1f IPs/s", handled, len(ips), handled / elapsed if elapsed else 0)
+            if progress:
+                progress(handled, len(ips), elapsed)
+
+    return filled
+
+
+@transaction.atomic
+def save_geoips(log_classes: Iterable[type[RequestLog]], ips: list[str], results: dict[str, GeoIP2Result]) -> int:
+    existing = set(GeoIP.objects.filter(ip__in=ips).values_list("ip", flat=True))
+    new_geoips = []
+
+    for ip in ips:
+        if ip in existing:
+            continue
+        result = results.get(ip, None)
+        if result is None or result.city is None:
+            continue
+        new_geoips.append(
+            GeoIP(
+                ip=ip,
+                city=result.city.city.name or "",
+                region=(result.city.subdivisions[0].name or "") if result.city.subdivisions else "",
+                country=result.city.country.iso_code or "",
+                org=(result.asn.autonomous_system_organization or "") if result.asn else "",
+            )
+        )
+
+    GeoIP.objects.bulk_create(new_geoips, ignore_conflicts=True)
+    resolved = list(existing) + [geoip.ip for geoip in new_geoips]
+
+    if resolved:
+        for log_class in log_classes:
+            # GeoIP's primary key is the IP, so there's no need to map
+            # remote_addr to anything.
+            log_class.objects.filter(geoip=None, remote_addr__in=resolved).update(geoip_id=F("remote_addr"))
+
+    return len(resolved)
+
+
+def get_ips_without_remote_host(log_classes: Iterable[type[RequestLog]]) -> list[str]:
+    """
+    Distinct remote IPs of logs without remote host (or where the "remote
+    host" is just the IP), from all `log_classes` in one query, sorted by
+    IP version and numeric value.
+    """
+    querysets = [
+        log_class.objects
+        .filter(Q(remote_host="") | Q(remote_addr__startswith=F("remote_host")))
+        .exclude(remote_addr=None)
+        .order_by()
+        .values_list("remote_addr", flat=True)
+        .distinct()
+        for log_class in log_classes
+    ]
+    if not querysets:
+        return []
+
+    ips = querysets[0].union(*querysets[1:]) if len(querysets) > 1 else querysets[0]
+    return sorted(ips, key=ip_sort_key)
+
+
+def ip_sort_key(ip: str) -> tuple[int, int]:
+    ip_address = ipaddress.ip_address(ip)
+    return ip_address.version, int(ip_address)
+
+
+def fill_remote_hosts(
+    log_classes: Iterable[type[RequestLog]] | None = None,
+    concurrency: int = 20,
+    timeout: float | None = None,
+    batch_size: int = 500,
+    restart: bool = False,
+    progress: Callable[[int, int, float], None] | None = None,
+) -> int:
+    """
+    Sets remote host on all logs that lack one, for all request log models
+    (or just `log_classes`). IPs are resolved in batches, with up to
+    `concurrency` lookups running at a time and each lookup timing out after
+    `timeout` seconds (default: the REMOTE_HOST_LOOKUP_TIMEOUT setting).
+    After every batch, the logs are updated and the last handled IP is saved
+    as a checkpoint, so an interrupted run will resume from there unless
+    `restart` is True. The checkpoint is removed when a run is completed.
+
+    `progress` is called after every batch with the number of handled IPs,
+    the total number of IPs, and the number of seconds elapsed.
+
+    Returns the number of IPs that got a remote host.
+    """
+    log_classes = list(log_classes or get_request_log_models())
+    checkpoint_name = "remote_hosts:" + ",".join(sorted(log_class.__name__ for log_class in log_classes))
+    checkpoint = None if restart else BackfillCheckpoint.objects.filter(name=checkpoint_name).first()
+    started = time.monotonic()
+    ips = get_ips_without_remote_host(log_classes)
+    resolver = RemoteHostResolver(
+        max_workers=concurrency * 2,
+        timeout=timeout or spodcat_settings.REMOTE_HOST_LOOKUP_TIMEOUT,
+    )
+    filled = 0
+
+    if checkpoint is not None:
+        checkpoint_key = ip_sort_key(checkpoint.value)
+        skipped = len(ips)
+        ips = [ip for ip in ips if ip_sort_key(ip) > checkpoint_key]
+        logger.info("Resuming after %s, skipping %d IPs", checkpoint.value, skipped - len(ips))
+
+    for idx in range(0, len(ips), batch_size):
+        batch = ips[idx:idx + batch_size]
+        remote_hosts = {ip: host for ip, host in resolver.resolve_concurrently(batch, concurrency) if host}
+
+        with transaction.atomic():
+            for log_class in log_classes:
+                log_class.update_remote_hosts(remote_hosts)
+            BackfillCheckpoint.objects.update_or_create(name=checkpoint_name, defaults={"value": batch[-1]})
+
+        filled += len(remote_hosts)
+        handled = idx + len(batch)
+        elapsed = time.monotonic() - started
+        logger.info("(%d/%d) IPs handled, %.1f IPs/s", handled, len(ips), handled / elapsed if elapsed else 0)
+        if progress:
+            progress(handled, len(ips), elapsed)
+
+    BackfillCheckpoint.objects.filter(name=checkpoint_name).delete()
+    return filled
@@ -0,0 +1,136 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any
+
+from django.core.cache import BaseCache, caches
+
+from spodcat.settings import spodcat_settings
+
+
+class LRUCache:
+    """
+    Thread safe, size bounded, per process LRU cache with hit & miss counters.
+
+    If the LOG_LOOKUP_CACHE_BACKEND setting is the alias of a Django cache,
+    that cache is used as a second level, shared between processes and nodes.
+    Local entries expire after `local_ttl` seconds, which bounds how long a
+    process can go on using an object that was changed by another process
+    (changes within the same process are handled by `delete()`, see
+    spodcat.logs.signals).
+    """
+    def __init__(self, name: str, local_ttl: float = 300.0, shared_ttl: int = 3600):
+        self.name = name
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self) -> int:
+        return spodcat_settings.LOG_LOOKUP_CACHE_SIZE
+
+    @property
+    def shared_cache(self) -> BaseCache | None:
+        alias = spodcat_settings.LOG_LOOKUP_CACHE_BACKEND
+        return caches[alias] if alias else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+        shared_cache = self.shared_cache
+        if shared_cache is not None:
+            shared_cache.delete(self.get_shared_key(key))
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            item = self._data.get(key, None)
+            if item is not None:
+                if item[1] >= time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return item[0]
+                del self._data[key]
+
+        shared_cache = self.shared_cache
+        if shared_cache is not None:
+            value = shared_cache.get(self.get_shared_key(key))
+            if value is not None:
+                self.set(key, value, shared=False)
+                with self._lock:
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def get_shared_key(self, key: str) -> str:
+        # Raw keys may be long user agent strings with all kinds of characters
+        # in them, which not all cache backends will accept.
+        return f"spodcat:{self.name}:{hashlib.sha1(key.encode()).hexdigest()}"
+
+    def set(self, key: str, value: Any, shared: bool = True):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.local_ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+        shared_cache = self.shared_cache if shared else None
+        if shared_cache is not None:
+            shared_cache.set(self.get_shared_key(key), value, timeout=self.shared_ttl)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+geoip_cache = LRUCache("geoip")
+user_agent_cache = LRUCache("user_agent")
+interned_string_cache = LRUCache("interned_string")
+
+
+GRAPH_CACHE_GENERATION_KEY = "spodcat:graph:generation"
+
+
+def get_graph_cache() -> BaseCache | None:
+    alias = spodcat_settings.GRAPH_CACHE_BACKEND
+    return caches[alias] if alias else None
+
+
+def get_graph_cache_generation(cache: BaseCache) -> str:
+    """
+    Cached graph responses are stored under the current generation, which
+    invalidate_graph_cache() replaces. If the generation itself gets evicted,
+    a new one is made up, which also (harmlessly) invalidates everything.
+    """
+    generation = cache.get(GRAPH_CACHE_GENERATION_KEY)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        if not cache.add(GRAPH_CACHE_GENERATION_KEY, generation, timeout=None):
+            # Some other process got there first.
+            generation = cache.get(GRAPH_CACHE_GENERATION_KEY) or generation
+    return generation
+
+
+def invalidate_graph_cache():
+    """
+    Should be called whenever logs, rollups, or sketches for past dates, or
+    the episodes and podcasts they belong to, have been changed, since graph
+    responses for those are cached for a long time.
+    """
+    cache = get_graph_cache()
+    if cache is not None:
+        cache.set(GRAPH_CACHE_GENERATION_KEY, uuid.uuid4().hex, timeout=None)
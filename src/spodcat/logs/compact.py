@@ -0,0 +1,113 @@
+import logging
+from typing import Callable
+
+from django.db import transaction
+from django.db.models import Q
+
+from spodcat.logs.archive import iter_pk_chunks
+from spodcat.logs.models import (
+    PodcastContentRequestLog,
+    ReferrerString,
+    RequestLog,
+    UserAgentString,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_path_info_related(log_class: type[RequestLog]) -> list[str]:
+    """What to select_related() for derive_path_info() to not do queries."""
+    return ["content"] if issubclass(log_class, PodcastContentRequestLog) else []
+
+
+def compact_logs(
+    log_class: type[RequestLog],
+    chunk_size: int = 1000,
+    progress: Callable[[int], None] | None = None,
+) -> int:
+    """
+    Converts existing `log_class` logs to the compact layout (see the
+    COMPACT_REQUEST_LOGS setting), in chunks of at most `chunk_size` rows,
+    each in its own transaction. Can safely be interrupted and run again.
+    path_info is only cleared where it equals derive_path_info(), so paths
+    that can't be derived (e.g. from imported access logs) are kept.
+
+    `progress` is called after every chunk with the number of converted logs
+    so far. Returns the total number of converted logs.
+    """
+    queryset = log_class.objects.filter(~Q(user_agent="") | ~Q(referrer="") | ~Q(path_info=""))
+    count = 0
+
+    for first_pk, last_pk in iter_pk_chunks(queryset, chunk_size):
+        with transaction.atomic():
+            chunk = queryset.filter(pk__gte=first_pk, pk__lte=last_pk)
+            # There are usually few distinct values per chunk, so one UPDATE
+            # per value is a lot faster than updating row by row.
+            for field, interned_class in (("user_agent", UserAgentString), ("referrer", ReferrerString)):
+                values = set(chunk.exclude(**{field: ""}).values_list(field, flat=True).distinct())
+                ids = interned_class.get_ids(values)
+                for value in values:
+                    chunk.filter(**{field: value}).update(**{
+                        f"{field}_string_id": ids[interned_class.clean_value(value)],
+                    })
+            derivable = [
+                log.pk
+                for log in chunk.exclude(path_info="").select_related(*get_path_info_related(log_class))
+                if log.path_info == log.derive_path_info()
+            ]
+            converted = (
+                chunk
+                .filter(~Q(user_agent="") | ~Q(referrer="") | Q(pk__in=derivable))
+                .update(user_agent="", referrer="")
+            )
+            chunk.filter(pk__in=derivable).update(path_info="")
+
+        count += converted
+        logger.info("%d %s compacted", count, log_class.__name__)
+        if progress:
+            progress(count)
+
+    return count
+
+
+def expand_logs(
+    log_class: type[RequestLog],
+    chunk_size: int = 1000,
+    progress: Callable[[int], None] | None = None,
+) -> int:
+    """
+    The reverse of compact_logs(): moves user agents and referrers back into
+    the log rows, and stores derived paths in path_info.
+    """
+    queryset = log_class.objects.filter(
+        Q(user_agent_string__isnull=False) | Q(referrer_string__isnull=False) | Q(path_info="")
+    )
+    count = 0
+
+    for first_pk, last_pk in iter_pk_chunks(queryset, chunk_size):
+        with transaction.atomic():
+            logs = list(
+                queryset
+                .filter(pk__gte=first_pk, pk__lte=last_pk)
+                .select_related("user_agent_string", "referrer_string", *get_path_info_related(log_class))
+            )
+
+            for log in logs:
+                log.user_agent = log.get_user_agent()
+                log.referrer = log.get_referrer()
+                log.path_info = log.get_path_info()
+                log.user_agent_string = None
+                log.referrer_string = None
+
+            log_class.objects.bulk_update(
+                logs,
+                ["user_agent", "referrer", "path_info", "user_agent_string", "referrer_string"],
+            )
+
+        count += len(logs)
+        logger.info("%d %s expanded", count, log_class.__name__)
+        if progress:
+            progress(count)
+
+    return count
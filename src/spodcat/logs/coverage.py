@@ -0,0 +1,63 @@
+import hashlib
+from typing import Iterable
+
+
+RETENTION_BUCKETS = 100
+
+Interval = tuple[int, int]
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> list[Interval]:
+    """
+    Returns the union of the half-open byte ranges [start, end) in
+    `intervals`, as sorted, non-overlapping, non-adjacent ranges. Empty
+    ranges are dropped.
+    """
+    merged: list[list[int]] = []
+
+    for start, end in sorted(interval for interval in intervals if interval[1] > interval[0]):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    return [(start, end) for start, end in merged]
+
+
+def get_covered_size(intervals: list[Interval], total_size: int) -> int:
+    """`intervals` must be merged."""
+    return sum(min(end, total_size) - start for start, end in intervals if start < total_size)
+
+
+def get_covered_buckets(intervals: list[Interval], total_size: int, buckets: int = RETENTION_BUCKETS) -> set[int]:
+    """
+    Splits a file of `total_size` bytes into `buckets` equally sized parts,
+    and returns the indices of those that are at least half covered by
+    `intervals` (which must be merged).
+    """
+    if total_size <= 0:
+        return set()
+
+    covered_bytes = [0] * buckets
+
+    for start, end in intervals:
+        end = min(end, total_size)
+        idx = start * buckets // total_size
+        while idx < buckets and start < end:
+            bucket_end = (idx + 1) * total_size // buckets
+            covered_bytes[idx] += min(end, bucket_end) - start
+            start = bucket_end
+            idx += 1
+
+    return {
+        idx for idx, covered in enumerate(covered_bytes)
+        if covered * 2 >= (idx + 1) * total_size // buckets - idx * total_size // buckets
+    }
+
+
+def get_listener_key(remote_addr: str, user_agent: str) -> str:
+    """
+    Listeners are identified by IP address and user agent, just like audio
+    request sessions.
+    """
+    return hashlib.blake2b(f"{remote_addr}\n{user_agent}".encode(), digest_size=16).hexdigest()
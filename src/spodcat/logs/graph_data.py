@@ -1,3 +1,4 @@
+import bisect
 import itertools
 from datetime import date
 from typing import Any, Iterable, TypedDict
@@ -60,6 +61,11 @@ class GraphData(AbstractGraphData):
         return self
 
 
+class EpisodeRetentionGraphData(GraphData):
+    def group_queryset_by(self, d):
+        return (d["slug"], d["name"])
+
+
 class PeriodicalGraphData(AbstractGraphData):
     period_type: type[TimePeriod]
     raw_data: Iterable[dict]
@@ -79,17 +85,11 @@ class PeriodicalGraphData(AbstractGraphData):
         self.grouped = grouped
 
     def get_datasets(self, start_date: date, end_date: date) -> list[AbstractGraphData.DataSet]:
-        start = self.period_type(start_date)
-        end = self.period_type(end_date)
+        boundaries = self.period_type.get_boundaries(start_date, end_date)
         datasets: list[AbstractGraphData.DataSet] = []
 
         for key, values in itertools.groupby(self.raw_data, key=self.group_queryset_by):
-            datapoints: list[AbstractGraphData.DataPoint] = []
-            raw_datapoints: list[AbstractGraphData.DataPoint] = [
-                {"x": self.get_x(v), "y": self.get_y(v)} for v in values
-            ]
-            for period in start.range(end):
-                datapoints.append(self.__collect_datapoint(raw_datapoints, period))
+            datapoints = self.__collect_datapoints(values, boundaries)
             datasets.append({"label": self.get_label(key), "data": list(self.__prune_datapoints(datapoints))})
 
         return datasets
@@ -112,18 +112,30 @@ class PeriodicalGraphData(AbstractGraphData):
             return (d["slug"], d["name"])
         return None
 
-    def __collect_datapoint(
+    def __collect_datapoints(
         self,
-        datapoints: list[AbstractGraphData.DataPoint],
-        period: TimePeriod,
-    ) -> AbstractGraphData.DataPoint:
-        points = [dp for dp in datapoints if period.start_timestamp <= dp["x"] < period.end_timestamp]
-        y = sum((dp["y"] for dp in points), 0.0)
-
-        if self.average and points:
-            y = y / len(points)
-
-        return {"x": period.start_timestamp, "y": y}
+        values: Iterable[dict],
+        boundaries: tuple[int, ...],
+    ) -> list[AbstractGraphData.DataPoint]:
+        """
+        Sums (or averages) the y values of `values` per period, where
+        `boundaries` is as returned by TimePeriod.get_boundaries(). Values
+        outside of all periods are ignored.
+        """
+        period_count = max(len(boundaries) - 1, 0)
+        sums = [0.0] * period_count
+        counts = [0] * period_count
+
+        for value in values:
+            idx = bisect.bisect_right(boundaries, self.get_x(value)) - 1
+            if 0 <= idx < period_count:
+                sums[idx] += self.get_y(value)
+                counts[idx] += 1
+
+        return [
+            {"x": boundaries[idx], "y": sums[idx] / counts[idx] if self.average and counts[idx] else sums[idx]}
+            for idx in range(period_count)
+        ]
 
     def __prune_datapoints(self, points: list[AbstractGraphData.DataPoint]):
         for idx, point in enumerate(points):
@@ -0,0 +1,106 @@
+import hashlib
+import math
+from collections import Counter
+from typing import Iterable, Self
+
+
+DEFAULT_PRECISION = 14
+
+
+class HyperLogLog:
+    """
+    HyperLogLog sketch for estimating the number of distinct values (here:
+    IP addresses) in a set. Sketches can be merged, so the number of distinct
+    values for a month can be estimated from the sketches for its days.
+
+    Uses 2 ** `precision` one-byte registers, for a standard error of about
+    1.04 / sqrt(2 ** `precision`), i.e. 0.8% with the default precision of 14.
+    """
+    FORMAT_DENSE = 0
+    FORMAT_SPARSE = 1
+
+    def __init__(self, precision: int = DEFAULT_PRECISION):
+        if not 4 <= precision <= 16:
+            raise ValueError("HyperLogLog precision must be between 4 and 16")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    @property
+    def error(self) -> float:
+        """Relative standard error of the estimates."""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, value: str):
+        hashed = int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+        bits = 64 - self.precision
+        idx = hashed >> bits
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def count(self) -> int:
+        m = len(self.registers)
+        counts = Counter(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(count * 2.0 ** -rank for rank, count in counts.items())
+
+        if estimate <= 2.5 * m and counts[0]:
+            # Small range correction (linear counting).
+            estimate = m * math.log(m / counts[0])
+
+        return round(estimate)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> Self:
+        hll = cls(precision=data[1])
+        hll.merge_bytes(data)
+        return hll
+
+    def merge(self, other: "bytes | HyperLogLog"):
+        if not isinstance(other, HyperLogLog):
+            self.merge_bytes(other)
+            return
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLogs with different precisions")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def merge_bytes(self, data: bytes):
+        """Merges a serialized sketch without deserializing it first."""
+        if data[1] != self.precision:
+            raise ValueError("Cannot merge HyperLogLogs with different precisions")
+
+        if data[0] == self.FORMAT_SPARSE:
+            registers = self.registers
+            for pos in range(2, len(data), 3):
+                idx = (data[pos] << 8) | data[pos + 1]
+                if data[pos + 2] > registers[idx]:
+                    registers[idx] = data[pos + 2]
+        else:
+            self.registers = bytearray(map(max, self.registers, memoryview(data)[2:]))
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializes to a sparse format (3 bytes per non-zero register) or a
+        dense one (1 byte per register), whichever is smaller.
+        """
+        nonzero = [(idx, rank) for idx, rank in enumerate(self.registers) if rank]
+
+        if len(nonzero) * 3 < len(self.registers):
+            data = bytearray((self.FORMAT_SPARSE, self.precision))
+            for idx, rank in nonzero:
+                data.extend((idx >> 8, idx & 0xFF, rank))
+            return bytes(data)
+
+        return bytes((self.FORMAT_DENSE, self.precision)) + bytes(self.registers)
+
+    def update(self, values: Iterable[str]):
+        for value in values:
+            self.add(value)
+
+    @classmethod
+    def union(cls, sketches: "Iterable[bytes | HyperLogLog]", precision: int = DEFAULT_PRECISION) -> Self:
+        hll = cls(precision=precision)
+        for sketch in sketches:
+            hll.merge(sketch)
+        return hll
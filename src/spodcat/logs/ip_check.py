@@ -1,7 +1,14 @@
+import bisect
+import heapq
 import ipaddress
 import logging
+import os
+import threading
+import time
+from array import array
+from dataclasses import dataclass
 from pathlib import Path
-from typing import NotRequired, TypedDict
+from typing import Iterable, NotRequired, Sequence, TypedDict
 
 import geoip2.database
 import geoip2.errors
@@ -43,13 +50,136 @@ class GeoProperties(TypedDict):
     status: str
 
 
-ip_list_cache: dict[IpAddressCategory, list[ipaddress.IPv4Network | ipaddress.IPv6Network]] = {}
+class IpRangeIndex:
+    """
+    All categorized IP networks of one IP version, as sorted and non
+    overlapping integer ranges that can be searched with bisect. Where
+    networks of different categories overlap, the category that comes first
+    in IpAddressCategory wins, just like in a linear scan over the categories.
+
+    To keep memory usage down, IPv4 ranges are kept in arrays of unsigned
+    64-bit ints. IPv6 addresses don't fit in those, so they are kept in lists.
+    """
+    categories: array
+    ends: Sequence[int]
+    starts: Sequence[int]
+
+    def __init__(self, starts: list[int], ends: list[int], categories: list[IpAddressCategory]):
+        category_list = list(IpAddressCategory)
+
+        if starts and max(ends) < 2 ** 64:
+            self.starts = array("Q", starts)
+            self.ends = array("Q", ends)
+        else:
+            self.starts = starts
+            self.ends = ends
+        self.categories = array("B", [category_list.index(c) for c in categories])
+        self._category_list = category_list
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def build(cls, ranges: Iterable[tuple[int, int, IpAddressCategory]]):
+        """`ranges` = (first address, last address, category) tuples."""
+        priorities = {category: idx for idx, category in enumerate(IpAddressCategory)}
+        sorted_ranges = sorted(ranges, key=lambda r: r[0])
+        points = sorted({r[0] for r in sorted_ranges} | {r[1] + 1 for r in sorted_ranges})
+        starts: list[int] = []
+        ends: list[int] = []
+        categories: list[IpAddressCategory] = []
+        active: list[tuple[int, int, IpAddressCategory]] = []
+        range_idx = 0
+
+        # Sweep over all points where some range starts or ends, keeping a
+        # heap of the ranges that cover the current point, with the highest
+        # priority one on top.
+        for point_idx, point in enumerate(points[:-1]):
+            while range_idx < len(sorted_ranges) and sorted_ranges[range_idx][0] == point:
+                _, end, category = sorted_ranges[range_idx]
+                heapq.heappush(active, (priorities[category], end, category))
+                range_idx += 1
+            while active and active[0][1] < point:
+                heapq.heappop(active)
+            if not active:
+                continue
+
+            category = active[0][2]
+            end = points[point_idx + 1] - 1
+            if ends and categories[-1] == category and ends[-1] == point - 1:
+                ends[-1] = end
+            else:
+                starts.append(point)
+                ends.append(end)
+                categories.append(category)
+
+        return cls(starts, ends, categories)
+
+    def get_category(self, ip: int) -> IpAddressCategory:
+        idx = bisect.bisect_right(self.starts, ip) - 1
+        if idx >= 0 and ip <= self.ends[idx]:
+            return self._category_list[self.categories[idx]]
+        return IpAddressCategory.UNKNOWN
+
+
+ip_range_index_cache: dict[int, IpRangeIndex] = {}
+
+
+@dataclass
+class GeoIP2Result:
+    city: geoip2.models.City | None
+    asn: geoip2.models.ASN | None
+
+
+class GeoIP2Database:
+    """
+    Keeps a geoip2 Reader for one .mmdb file in data_dir open for the life of
+    the process. It's opened in MODE_MMAP, so all processes on the host share
+    the same pages through the OS cache. The file's mtime is checked at most
+    once every `check_interval` seconds, and the reader is reopened if it has
+    changed (e.g. after a GeoLite2 update).
+    """
+    def __init__(self, filename: str, check_interval: float = 60.0):
+        self.filename = filename
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._reader: geoip2.database.Reader | None = None
+        self._mtime: float | None = None
+        self._checked_at = 0.0
+
+    @property
+    def path(self) -> Path:
+        from spodcat.logs import ip_check
+
+        return ip_check.data_dir / self.filename
+
+    def get_reader(self) -> geoip2.database.Reader:
+        reader = self._reader
+        if reader is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return reader
+
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime
+            self._checked_at = time.monotonic()
+
+            if self._reader is None or mtime != self._mtime:
+                if self._reader is not None:
+                    logger.info("%s has changed, reopening", self.path)
+                # Not closing the old reader, since other threads may still be
+                # using it. It will be closed when garbage collected.
+                self._reader = geoip2.database.Reader(self.path, mode=geoip2.database.MODE_MMAP)
+                self._mtime = mtime
+
+            return self._reader
+
+
+geoip2_asn_database = GeoIP2Database("GeoLite2-ASN.mmdb")
+geoip2_city_database = GeoIP2Database("GeoLite2-City.mmdb")
 
 
 def get_geoip2_asn(ip: str) -> geoip2.models.ASN | None:
     try:
-        with geoip2.database.Reader(data_dir / "GeoLite2-ASN.mmdb") as reader:
-            return reader.asn(ip)
+        return geoip2_asn_database.get_reader().asn(ip)
     except geoip2.errors.GeoIP2Error as e:
         logger.warning("Exception getting geoip2 ASN for %s: %s", ip, e)
         return None
@@ -57,8 +187,7 @@ def get_geoip2_asn(ip: str) -> geoip2.models.ASN | None:
 
 def get_geoip2_city(ip: str) -> geoip2.models.City | None:
     try:
-        with geoip2.database.Reader(data_dir / "GeoLite2-City.mmdb") as reader:
-            return reader.city(ip)
+        return geoip2_city_database.get_reader().city(ip)
     except geoip2.errors.GeoIP2Error as e:
         logger.warning("Exception getting geoip2 city for %s: %s", ip, e)
         return None
@@ -68,36 +197,63 @@ def get_ip_address_category(ip: str | None) -> IpAddressCategory:
     if not ip:
         return IpAddressCategory.UNKNOWN
 
-    for category in IpAddressCategory:
-        if category != IpAddressCategory.UNKNOWN and is_ip_in_category(ip, category):
-            return category
-
-    return IpAddressCategory.UNKNOWN
+    ip_address = ipaddress.ip_address(ip)
+    return get_ip_range_index(ip_address.version).get_category(int(ip_address))
 
 
-def get_ip_network_list(category: IpAddressCategory) -> list[ipaddress.IPv4Network | ipaddress.IPv6Network]:
+def get_ip_range_index(version: int) -> IpRangeIndex:
     from spodcat.logs import ip_check
 
-    if category == IpAddressCategory.UNKNOWN:
-        return []
-
-    cached = ip_check.ip_list_cache.get(category, None)
+    cached = ip_check.ip_range_index_cache.get(version, None)
     if cached is not None:
         return cached
 
+    index = IpRangeIndex.build(
+        (int(network.network_address), int(network.broadcast_address), category)
+        for category in IpAddressCategory
+        for network in get_ip_network_list(category)
+        if network.version == version
+    )
+
+    ip_check.ip_range_index_cache[version] = index
+    return index
+
+
+def get_ip_network_list(category: IpAddressCategory) -> list[ipaddress.IPv4Network | ipaddress.IPv6Network]:
+    """
+    Reads the networks for `category` from file. Not cached; the data is kept
+    in memory in more compact form by get_ip_range_index().
+    """
+    if category == IpAddressCategory.UNKNOWN:
+        return []
+
     path = submodule_dir / f"GoodBots/iplists/{category.value}.ips"
     with path.open("rt") as f:
-        networks = [ipaddress.ip_network(line.strip()) for line in f]
+        return [ipaddress.ip_network(line.strip()) for line in f]
 
-    ip_check.ip_list_cache[category] = networks
-    return networks
 
+def lookup_many(ips: Iterable[str]) -> dict[str, GeoIP2Result]:
+    """
+    Looks up city and ASN data for all `ips` using the same two readers. As
+    in GeoIP.get_or_create(), ASN is only looked up for IPs that have city
+    data.
+    """
+    city_reader = geoip2_city_database.get_reader()
+    asn_reader = geoip2_asn_database.get_reader()
+    result: dict[str, GeoIP2Result] = {}
 
-def is_ip_in_category(ip: str, category: IpAddressCategory) -> bool:
-    ip_address = ipaddress.ip_address(ip)
+    for ip in ips:
+        city: geoip2.models.City | None = None
+        asn: geoip2.models.ASN | None = None
+
+        try:
+            city = city_reader.city(ip)
+            asn = asn_reader.asn(ip)
+        except geoip2.errors.GeoIP2Error:
+            pass
+        except ValueError as e:
+            logger.warning("Exception getting geoip2 data for %s: %s", ip, e)
 
-    for network in get_ip_network_list(category):
-        if ip_address.version == network.version and ip_address in network:
-            return True
+        result[ip] = GeoIP2Result(city=city, asn=asn)
 
-    return False
+    return result
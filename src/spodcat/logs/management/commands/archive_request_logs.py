@@ -0,0 +1,57 @@
+from django.core.management import BaseCommand, CommandError
+
+from spodcat.logs.archive import (
+    archive_logs,
+    get_log_class,
+    get_retention_cutoff,
+)
+from spodcat.logs.models import get_request_log_models
+from spodcat.settings import spodcat_settings
+
+
+class Command(BaseCommand):
+    help = (
+        "Archives and deletes request logs that are older than allowed by the "
+        "LOG_RETENTION_DAYS setting."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", action="append", help="Only handle this log model (may be repeated)")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Max number of logs to delete at a time")
+        parser.add_argument("--no-archive", action="store_true", help="Just delete the logs, don't archive them")
+        parser.add_argument("--dry-run", action="store_true", help="Only show how many logs would be archived")
+
+    def handle(self, *args, **options):
+        if not options["no_archive"] and not spodcat_settings.LOG_ARCHIVE_STORAGE:
+            raise CommandError(
+                "LOG_ARCHIVE_STORAGE is not set. Set it to a private storage, or use --no-archive to delete the logs "
+                "without archiving them."
+            )
+
+        if options["model"]:
+            log_classes = [get_log_class(name) for name in options["model"]]
+        else:
+            log_classes = get_request_log_models()
+
+        for log_class in log_classes:
+            cutoff = get_retention_cutoff(log_class)
+
+            if cutoff is None:
+                self.stdout.write(f"{log_class.__name__}: No retention policy, skipping.")
+                continue
+
+            if options["dry_run"]:
+                count = log_class.objects.filter(created__lt=cutoff).count()
+                self.stdout.write(f"{log_class.__name__}: {count} logs created before {cutoff} would be archived.")
+                continue
+
+            deleted, name = archive_logs(
+                log_class,
+                cutoff=cutoff,
+                chunk_size=options["chunk_size"],
+                archive=not options["no_archive"],
+            )
+            if name:
+                self.stdout.write(f"{log_class.__name__}: Archived and deleted {deleted} logs, archive: {name}")
+            else:
+                self.stdout.write(f"{log_class.__name__}: Deleted {deleted} logs.")
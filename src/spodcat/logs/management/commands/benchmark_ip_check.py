@@ -0,0 +1,82 @@
+import ipaddress
+import random
+import time
+
+from django.core.management import BaseCommand
+
+from spodcat.logs.ip_check import (
+    IpAddressCategory,
+    get_ip_address_category,
+    get_ip_network_list,
+    get_ip_range_index,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the indexed IP address categorization against a linear scan "
+        "over all bot networks, using the real GoodBots lists."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=10000, help="Number of IPs to categorize (default: 10000)")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options["seed"])
+        category_networks = {category: get_ip_network_list(category) for category in IpAddressCategory}
+        networks = [network for category_list in category_networks.values() for network in category_list]
+        ips: list[str] = []
+
+        # Half of the IPs are random, the other half are picked from the bot
+        # networks.
+        for _ in range(options["count"] // 2):
+            ips.append(str(ipaddress.IPv4Address(rnd.getrandbits(32))))
+            if networks:
+                network = rnd.choice(networks)
+                offset = rnd.randrange(network.num_addresses)
+                ips.append(str(network.network_address + offset))
+
+        started = time.perf_counter()
+        index_v4 = get_ip_range_index(4)
+        index_v6 = get_ip_range_index(6)
+        build_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        linear = [self.get_category_linear(ip, category_networks) for ip in ips]
+        linear_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        indexed = [get_ip_address_category(ip) for ip in ips]
+        indexed_time = time.perf_counter() - started
+
+        mismatches = [(ip, a, b) for ip, a, b in zip(ips, linear, indexed) if a != b]
+
+        self.stdout.write(f"Networks: {len(networks)}")
+        self.stdout.write(f"Index ranges: {len(index_v4)} (IPv4), {len(index_v6)} (IPv6)")
+        self.stdout.write(f"Index build time: {build_time * 1000:.02f} ms")
+        self.stdout.write(f"Categorized IPs: {len(ips)} ({sum(c.is_bot for c in linear)} bots)")
+        self.stdout.write(f"Linear scan: {linear_time * 1000:.02f} ms ({linear_time / len(ips) * 1e6:.02f} µs/IP)")
+        self.stdout.write(f"Index: {indexed_time * 1000:.02f} ms ({indexed_time / len(ips) * 1e6:.02f} µs/IP)")
+        if indexed_time:
+            self.stdout.write(f"Speedup: {linear_time / indexed_time:.01f}x")
+
+        for ip, a, b in mismatches:
+            self.stderr.write(f"Mismatch for {ip}: linear={a}, index={b}")
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Results are identical."))
+
+    def get_category_linear(
+        self,
+        ip: str,
+        category_networks: dict[IpAddressCategory, list[ipaddress.IPv4Network | ipaddress.IPv6Network]],
+    ) -> IpAddressCategory:
+        # This is how get_ip_address_category() used to work.
+        ip_address = ipaddress.ip_address(ip)
+
+        for category, networks in category_networks.items():
+            for network in networks:
+                if ip_address.version == network.version and ip_address in network:
+                    return category
+
+        return IpAddressCategory.UNKNOWN
@@ -0,0 +1,208 @@
+import datetime
+import ipaddress
+import random
+import time
+from typing import Callable
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import connection, models, transaction
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from spodcat.logs.models import (
+    PodcastContentRequestLog,
+    PodcastEpisodeAudioRequestLog,
+    PodcastRequestLog,
+    PodcastRssRequestLog,
+    RequestLog,
+)
+from spodcat.models import Episode, Podcast
+from spodcat.views.graph import GraphView
+
+
+GRAPH_TYPES = ["episode-plays", "podcast-plays", "unique-ips", "rss-unique-ips", "episode-retention"]
+
+# The single column FK indexes that the composite indexes replaced.
+OLD_INDEXES: list[tuple[type[RequestLog], models.Index]] = [
+    (PodcastRequestLog, models.Index(fields=["podcast"], name="benchmark_podcastlog_podcast")),
+    (PodcastContentRequestLog, models.Index(fields=["content"], name="benchmark_contentlog_content")),
+    (PodcastEpisodeAudioRequestLog, models.Index(fields=["episode"], name="benchmark_audiolog_episode")),
+    (PodcastRssRequestLog, models.Index(fields=["podcast"], name="benchmark_rsslog_podcast")),
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a synthetic podcast with lots of request logs, and times every "
+        "GraphView graph type and the podcast and episode statistics pages, "
+        "first with the old single column indexes and then with the current "
+        "composite ones. Everything happens in a transaction that is rolled "
+        "back afterwards, so no data is changed. Rollups and sketches are not "
+        "used, since the point is to measure the raw log queries. Needs a "
+        "database with transactional DDL (i.e. not MySQL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logs", type=int, default=200000, help="Number of audio logs (default: 200000)")
+        parser.add_argument("--episodes", type=int, default=50, help="Number of episodes (default: 50)")
+        parser.add_argument("--days", type=int, default=365, help="Spread logs over this many days (default: 365)")
+        parser.add_argument("--repeat", type=int, default=3, help="Best of this many runs per query (default: 3)")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        # Cached responses would make the timings meaningless.
+        spodcat = {**getattr(settings, "SPODCAT", {}), "GRAPH_CACHE_BACKEND": None}
+
+        try:
+            with override_settings(SPODCAT=spodcat), transaction.atomic():
+                self.run(options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rnd = random.Random(options["seed"])
+        started = time.perf_counter()
+        user_model = get_user_model()
+        user = user_model.objects.create(
+            **{user_model.USERNAME_FIELD: f"benchmark-{rnd.getrandbits(32):08x}"},
+            is_staff=True,
+            is_superuser=True,
+        )
+        podcast, episodes = self.seed(rnd, user, options)
+        self.stdout.write(f"Seeded {options['logs']} audio logs in {time.perf_counter() - started:.01f} s.")
+
+        start_date = (timezone.localdate() - datetime.timedelta(days=options["days"])).isoformat()
+        cases: list[tuple[str, Callable]] = []
+        for graph_type in GRAPH_TYPES:
+            cases.append((f"graph {graph_type} (podcast)", self.graph(user, type=graph_type, podcast=podcast.pk)))
+            cases.append((f"graph {graph_type} (episode)", self.graph(user, type=graph_type, episode=episodes[0].pk)))
+            cases.append((f"graph {graph_type} (all)", self.graph(user, type=graph_type, start=start_date)))
+        cases.append(("podcast stats_view", self.stats_view(user, Podcast, podcast.pk)))
+        cases.append(("episode stats_view", self.stats_view(user, Episode, episodes[0].pk)))
+
+        self.swap_indexes(old=True)
+        before = self.time_cases(cases, options["repeat"])
+        self.swap_indexes(old=False)
+        after = self.time_cases(cases, options["repeat"])
+
+        width = max(len(name) for name, _ in cases)
+        self.stdout.write(f"{'':{width}}  {'old indexes':>12}  {'new indexes':>12}  {'speedup':>8}")
+        for name, _ in cases:
+            speedup = before[name] / after[name] if after[name] else 0.0
+            self.stdout.write(f"{name:{width}}  {before[name]:9.02f} ms  {after[name]:9.02f} ms  {speedup:7.01f}x")
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                for log_class, _ in OLD_INDEXES:
+                    cursor.execute(f"ANALYZE {connection.ops.quote_name(log_class._meta.db_table)}")
+            elif connection.vendor == "sqlite":
+                cursor.execute("ANALYZE")
+
+    def graph(self, user, **params) -> Callable:
+        def func():
+            request = APIRequestFactory().get("/graph/", params)
+            force_authenticate(request, user=user)
+            response = GraphView.as_view()(request)
+            response.render()
+            assert response.status_code == 200, response.content
+
+        return func
+
+    def seed(self, rnd: random.Random, user, options) -> tuple[Podcast, list[Episode]]:
+        now = timezone.now()
+        days = options["days"]
+        podcast = Podcast.objects.create(slug=f"benchmark-{rnd.getrandbits(32):08x}", name="Benchmark", owner=user)
+        episodes = [
+            Episode.objects.create(
+                podcast=podcast,
+                name=f"Episode {idx}",
+                slug=f"episode-{idx}",
+                audio_file_length=rnd.randint(20_000_000, 80_000_000),
+                published=now - datetime.timedelta(days=days * (1 - idx / options["episodes"])),
+            )
+            for idx in range(options["episodes"])
+        ]
+        ips = [str(ipaddress.IPv4Address(rnd.getrandbits(32))) for _ in range(max(options["logs"] // 20, 1))]
+
+        def created() -> datetime.datetime:
+            return now - datetime.timedelta(seconds=rnd.randrange(days * 86400))
+
+        def common() -> dict:
+            return {"created": created(), "remote_addr": rnd.choice(ips), "is_bot": rnd.random() < 0.1}
+
+        def bulk_create(log_class: type[RequestLog], count: int, factory: Callable[[], RequestLog]):
+            for idx in range(0, count, 5000):
+                log_class.objects.bulk_create([factory() for _ in range(min(5000, count - idx))])
+
+        bulk_create(PodcastEpisodeAudioRequestLog, options["logs"], lambda: PodcastEpisodeAudioRequestLog(
+            episode=rnd.choice(episodes),
+            response_body_size=rnd.randint(0, 10_000_000),
+            status_code=206,
+            **common(),
+        ))
+        bulk_create(PodcastRssRequestLog, options["logs"] // 2, lambda: PodcastRssRequestLog(
+            podcast=podcast,
+            user_agent="Benchmark/1.0",
+            **common(),
+        ))
+        bulk_create(PodcastRequestLog, options["logs"] // 10, lambda: PodcastRequestLog(podcast=podcast, **common()))
+        bulk_create(PodcastContentRequestLog, options["logs"] // 10, lambda: PodcastContentRequestLog(
+            content=rnd.choice(episodes),
+            **common(),
+        ))
+
+        return podcast, episodes
+
+    def stats_view(self, user, model: type[models.Model], object_id) -> Callable:
+        model_admin = admin.site._registry[model]
+
+        def func():
+            request = RequestFactory().get("/")
+            request.user = user
+            model_admin.stats_view(request, str(object_id)).render()
+
+        return func
+
+    def swap_indexes(self, old: bool):
+        """Switches between the current composite indexes and the old ones."""
+        schema_editor = connection.schema_editor()
+
+        with connection.cursor() as cursor:
+            for log_class, old_index in OLD_INDEXES:
+                drop = log_class._meta.indexes if old else [old_index]
+                create = [old_index] if old else log_class._meta.indexes
+                for index in drop:
+                    # Index.remove_sql() needs an entered schema editor, which
+                    # SQLite doesn't allow inside a transaction.
+                    cursor.execute(schema_editor.sql_delete_index % {
+                        "table": schema_editor.quote_name(log_class._meta.db_table),
+                        "name": schema_editor.quote_name(index.name),
+                    })
+                for index in create:
+                    cursor.execute(str(index.create_sql(log_class, schema_editor)))
+
+        self.analyze()
+
+    def time_cases(self, cases: list[tuple[str, Callable]], repeat: int) -> dict[str, float]:
+        result: dict[str, float] = {}
+
+        for name, func in cases:
+            func()
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - started) * 1000)
+            result[name] = min(timings)
+
+        return result
@@ -0,0 +1,98 @@
+import re
+
+from django.core.management import BaseCommand, CommandError
+
+from spodcat.logs.user_agent import (
+    get_dicts_from_file,
+    get_matcher,
+    load_dicts_from_file,
+)
+
+
+def get_url_variants(values: set[str]) -> set[str]:
+    """
+    Variations of the URLs among `values`, with the other scheme, with and
+    without "www.", and with different things following the host name, to
+    exercise the edge cases of ReferrerMatcher's host lookups.
+    """
+    variants: set[str] = set()
+
+    for value in values:
+        _, separator, rest = value.partition("://")
+        if not separator:
+            continue
+        host = rest.split("/")[0].removeprefix("www.")
+        for scheme in ("http", "https", "ftp"):
+            for prefix in ("", "www.", "x."):
+                for suffix in ("", "/", "/x", "x", ".x", ":8080/", "?x", "\n"):
+                    variants.add(f"{scheme}://{prefix}{host}{suffix}")
+
+    return variants
+
+
+def get_case_variants(values: set[str]) -> set[str]:
+    """
+    Variations of `values` with non-ASCII characters that case insensitive
+    regexes treat as ASCII letters, to exercise PatternMatcher's literal
+    prefilter.
+    """
+    replacements = {"i": "\u0130", "I": "\u0131", "k": "\u212a", "s": "\u017f"}
+    variants: set[str] = set()
+
+    for value in values:
+        for old, new in replacements.items():
+            if old in value:
+                variants.add(value.replace(old, new))
+
+    return variants
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks that the compiled user agent & referrer matchers give exactly "
+        "the same results as a plain linear re.search() over the entries, "
+        "using all example strings in user-agents-v2 plus any strings in "
+        "FILE (one per line). User agents are also checked with non-ASCII "
+        "case variations, and referrers with variations of all URLs."
+    )
+    basenames = ["bots", "apps", "libraries", "browsers", "devices", "referrers"]
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", nargs="?")
+
+    def handle(self, *args, **options):
+        values: set[str] = set()
+        mismatches = 0
+        checks = 0
+
+        for basename in self.basenames:
+            for entry in load_dicts_from_file(basename):
+                values.update(entry.get("examples") or [])
+
+        if options["file"]:
+            with open(options["file"], "rt", encoding="utf-8") as f:
+                values.update(line.rstrip("\n") for line in f)
+
+        if not values:
+            raise CommandError("Found no values to check. Are the submodules checked out?")
+
+        for basename in self.basenames:
+            entries = get_dicts_from_file(basename)
+            matcher = get_matcher(basename)
+
+            extra_values = get_url_variants(values) if basename == "referrers" else get_case_variants(values)
+
+            for value in values | extra_values:
+                expected = next((e for e in entries if re.search(e["pattern"], value)), None)
+                actual = matcher.match(value)
+                checks += 1
+                if actual is not expected:
+                    mismatches += 1
+                    self.stderr.write(
+                        f"{basename}: {value!r} should match {expected and expected['name']!r}, "
+                        f"got {actual and actual['name']!r}"
+                    )
+
+        if mismatches:
+            raise CommandError(f"{mismatches} of {checks} checks failed.")
+        self.stdout.write(self.style.SUCCESS(f"All {checks} checks ({len(values)} values) passed."))
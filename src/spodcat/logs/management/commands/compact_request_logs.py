@@ -0,0 +1,29 @@
+from django.core.management import BaseCommand
+
+from spodcat.logs.archive import get_log_class
+from spodcat.logs.compact import compact_logs, expand_logs
+from spodcat.logs.models import get_request_log_models
+
+
+class Command(BaseCommand):
+    help = (
+        "Converts existing request logs to the compact layout used when the "
+        "COMPACT_REQUEST_LOGS setting is True, or back with --expand."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", action="append", help="Only handle this log model (may be repeated)")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Max number of logs to convert at a time")
+        parser.add_argument("--expand", action="store_true", help="Convert compact logs back to the full layout")
+
+    def handle(self, *args, **options):
+        if options["model"]:
+            log_classes = [get_log_class(name) for name in options["model"]]
+        else:
+            log_classes = get_request_log_models()
+
+        convert = expand_logs if options["expand"] else compact_logs
+
+        for log_class in log_classes:
+            count = convert(log_class, chunk_size=options["chunk_size"])
+            self.stdout.write(f"{log_class.__name__}: Converted {count} logs.")
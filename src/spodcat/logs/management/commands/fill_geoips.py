@@ -1,16 +1,18 @@
 from django.core.management import BaseCommand
 
-from spodcat.logs.models import (
-    PodcastContentRequestLog,
-    PodcastEpisodeAudioRequestLog,
-    PodcastRequestLog,
-    PodcastRssRequestLog,
-)
+from spodcat.logs.backfill import fill_geoips
 
 
 class Command(BaseCommand):
+    help = "Sets GeoIP data on all request logs that lack it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Number of IPs to handle at a time")
+
     def handle(self, *args, **options):
-        PodcastRequestLog.fill_geoips()
-        PodcastContentRequestLog.fill_geoips()
-        PodcastEpisodeAudioRequestLog.fill_geoips()
-        PodcastRssRequestLog.fill_geoips()
+        filled = fill_geoips(batch_size=options["batch_size"], progress=self.progress)
+        self.stdout.write(f"Done, {filled} IPs now have GeoIP data.")
+
+    def progress(self, handled: int, total: int, elapsed: float):
+        rate = handled / elapsed if elapsed else 0.0
+        self.stdout.write(f"({handled}/{total}) IPs handled, {rate:.1f} IPs/s")
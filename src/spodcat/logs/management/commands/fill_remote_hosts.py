@@ -1,16 +1,34 @@
 from django.core.management import BaseCommand
 
-from spodcat.logs.models import (
-    PodcastContentRequestLog,
-    PodcastEpisodeAudioRequestLog,
-    PodcastRequestLog,
-    PodcastRssRequestLog,
-)
+from spodcat.logs.backfill import fill_remote_hosts
 
 
 class Command(BaseCommand):
+    help = (
+        "Sets remote host on all request logs that lack it. An interrupted run "
+        "resumes where it stopped, unless --restart is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=20, help="Max number of simultaneous lookups")
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            help="Seconds before a lookup is given up (default: REMOTE_HOST_LOOKUP_TIMEOUT setting)",
+        )
+        parser.add_argument("--batch-size", type=int, default=500, help="Number of IPs to handle at a time")
+        parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint from an earlier run")
+
     def handle(self, *args, **options):
-        PodcastRequestLog.fill_remote_hosts()
-        PodcastContentRequestLog.fill_remote_hosts()
-        PodcastEpisodeAudioRequestLog.fill_remote_hosts()
-        PodcastRssRequestLog.fill_remote_hosts()
+        filled = fill_remote_hosts(
+            concurrency=options["concurrency"],
+            timeout=options["timeout"],
+            batch_size=options["batch_size"],
+            restart=options["restart"],
+            progress=self.progress,
+        )
+        self.stdout.write(f"Done, {filled} IPs got a remote host.")
+
+    def progress(self, handled: int, total: int, elapsed: float):
+        rate = handled / elapsed if elapsed else 0.0
+        self.stdout.write(f"({handled}/{total}) IPs handled, {rate:.1f} IPs/s")
@@ -0,0 +1,47 @@
+from django.core.management import BaseCommand
+
+from spodcat.logs.access_log import (
+    PARSERS,
+    AccessLogImportResult,
+    import_access_log,
+    iter_lines,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports episode audio requests from access log files (plain or "
+        "gzipped) as PodcastEpisodeAudioRequestLogs. Logs that already exist "
+        "(same remote address and time) are updated."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="+")
+        parser.add_argument("--format", choices=list(PARSERS), default="combined", help="Access log format")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Number of logs to save at a time")
+        parser.add_argument("--no-bots", action="store_true", help="Don't import requests from bots")
+        parser.add_argument(
+            "--lookup-remote-hosts",
+            action="store_true",
+            help="Look up remote hosts during import (slow; otherwise, run fill_remote_hosts afterwards)",
+        )
+
+    def handle(self, *args, **options):
+        for path in options["files"]:
+            self.stdout.write(f"Importing {path} ...")
+            result = import_access_log(
+                iter_lines(path),
+                log_format=options["format"],
+                batch_size=options["batch_size"],
+                no_bots=options["no_bots"],
+                lookup_remote_hosts=options["lookup_remote_hosts"],
+                progress=self.progress,
+            )
+            self.stdout.write(
+                f"Done: {result.lines} lines, {result.created} logs created, {result.updated} updated, "
+                f"{result.skipped} skipped."
+            )
+
+    def progress(self, result: AccessLogImportResult, elapsed: float):
+        rate = result.lines / elapsed if elapsed else 0.0
+        self.stdout.write(f"{result.lines} lines read, {rate:.1f} lines/s")
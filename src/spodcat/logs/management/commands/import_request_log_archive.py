@@ -0,0 +1,15 @@
+from django.core.management import BaseCommand
+
+from spodcat.logs.archive import get_log_class, import_archive
+
+
+class Command(BaseCommand):
+    help = "Re-imports request logs from an archive created by archive_request_logs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", help="Log model name, e.g. PodcastRssRequestLog")
+        parser.add_argument("name", help="Name of the archive file in the archive storage")
+
+    def handle(self, *args, **options):
+        imported, skipped = import_archive(get_log_class(options["model"]), options["name"])
+        self.stdout.write(f"Imported {imported} logs, skipped {skipped}.")
@@ -0,0 +1,52 @@
+from django.core.management import BaseCommand
+
+from spodcat.logs.archive import get_log_class
+from spodcat.logs.models import BackfillCheckpoint, get_request_log_models
+from spodcat.logs.reclassify import reclassify_logs
+from spodcat.logs.rules import get_rules_version
+
+
+CHECKPOINT_NAME = "reclassify_request_logs"
+
+
+class Command(BaseCommand):
+    help = (
+        "Redoes the bot, user agent, IP address, and referrer classification "
+        "of request logs that were classified before the user agent or IP "
+        "lists (in the user-agents-v2 and GoodBots submodules) last changed. "
+        "Does nothing if the lists haven't changed since the last complete "
+        "run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", action="append", help="Only handle this log model (may be repeated)")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Max number of logs to update at a time")
+        parser.add_argument("--full", action="store_true", help="Reclassify all logs, regardless of rules version")
+
+    def handle(self, *args, **options):
+        version = get_rules_version()
+        checkpoint = BackfillCheckpoint.objects.filter(name=CHECKPOINT_NAME).first()
+
+        if checkpoint and checkpoint.value == version and not options["full"]:
+            self.stdout.write(f"Classification rules unchanged since the last run (version {version}).")
+            return
+
+        if options["model"]:
+            log_classes = [get_log_class(name) for name in options["model"]]
+        else:
+            log_classes = get_request_log_models()
+
+        total = 0
+        for log_class in log_classes:
+            count = reclassify_logs(log_class, chunk_size=options["chunk_size"], full=options["full"])
+            total += count
+            self.stdout.write(f"{log_class.__name__}: Reclassified {count} logs.")
+
+        if not options["model"]:
+            BackfillCheckpoint.objects.update_or_create(name=CHECKPOINT_NAME, defaults={"value": version})
+
+        if total:
+            self.stdout.write(
+                "Rollups and unique IP sketches may now be out of date; run rollup_audio_logs --full and "
+                "rollup_unique_ips --full to recompute them."
+            )
@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from spodcat.logs.rollups import rollup_audio_coverage
+
+
+class Command(BaseCommand):
+    help = (
+        "Updates per-listener coverage of episode audio files, and the "
+        "episode retention histograms, with all logs created since the last "
+        "run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Recompute everything from scratch")
+        parser.add_argument("--chunk-size", type=int, default=10000, help="Logs per transaction (default: 10000)")
+
+    def handle(self, *args, **options):
+        count = rollup_audio_coverage(full=options["full"], chunk_size=options["chunk_size"])
+        self.stdout.write(f"Processed {count} logs.")
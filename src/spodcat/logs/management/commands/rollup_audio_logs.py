@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+
+from spodcat.logs.rollups import rollup_audio_logs
+
+
+class Command(BaseCommand):
+    help = (
+        "Updates daily episode audio rollups with all logs created since the "
+        "last run. Run this at least daily if USE_LOG_ROLLUPS is enabled."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Recompute all rollups from scratch")
+
+    def handle(self, *args, **options):
+        count = rollup_audio_logs(full=options["full"])
+        self.stdout.write(f"Rolled up {count} episode days.")
@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+
+from spodcat.logs.rollups import rollup_unique_ips
+
+
+class Command(BaseCommand):
+    help = (
+        "Updates the daily unique IP sketches with all logs created since the "
+        "last run. Run this at least daily if APPROXIMATE_UNIQUE_IPS is enabled."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Recompute all sketches from scratch")
+
+    def handle(self, *args, **options):
+        count = rollup_unique_ips(full=options["full"])
+        self.stdout.write(f"Built sketches for {count} podcast/content days.")
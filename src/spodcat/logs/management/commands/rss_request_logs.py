@@ -1,47 +1,119 @@
+import datetime
 import itertools
+import json
 
 from django.core.management import BaseCommand
+from django.db.models import Count, Max, Min
+from django.urls import reverse
 
 from spodcat.logs.models import PodcastRssRequestLog
 
 
 class Command(BaseCommand):
+    help = (
+        "Prints RSS feed request statistics per podcast: total requests, "
+        "requests per day and hour, unique IPs, and referrers. Logs are "
+        "grouped by podcast rather than by request path, since path_info "
+        "may be empty in the compact log layout; the printed path is the "
+        "podcast's feed URL. All aggregation is done by the database."
+    )
+
     def add_arguments(self, parser):
         parser.add_argument("--database", default="default")
+        parser.add_argument(
+            "--since",
+            type=datetime.date.fromisoformat,
+            help="Only include logs from this date (YYYY-MM-DD) onwards",
+        )
+        parser.add_argument("--podcast", help="Only include this podcast (slug)")
+        parser.add_argument("--json", action="store_true", help="Output one JSON object per podcast and line")
 
     def handle(self, *args, **options):
-        for path_info, logs in itertools.groupby(
-            PodcastRssRequestLog.objects
-            .using(options["database"])
-            .order_by("path_info", "created"),
-            key=lambda l: l.path_info,
-        ):
-            logs = list(logs)
-            requests = len(logs)
-            delta = logs[-1].created - logs[0].created
+        queryset = PodcastRssRequestLog.objects.using(options["database"]).order_by()
+        if options["since"]:
+            queryset = queryset.filter_dates(start_date=options["since"])
+        if options["podcast"]:
+            queryset = queryset.filter(podcast__slug=options["podcast"])
+
+        totals = (
+            queryset
+            .values("podcast_id")
+            .annotate(
+                requests=Count("pk"),
+                first=Min("created"),
+                last=Max("created"),
+                unique_ips=Count("remote_addr", distinct=True),
+            )
+            .order_by("podcast_id")
+            .iterator()
+        )
+        referrers = itertools.groupby(
+            queryset
+            .with_raw_referrer()
+            .exclude(raw_referrer="")
+            .values("podcast_id", "raw_referrer")
+            .annotate(requests=Count("pk"), unique_ips=Count("remote_addr", distinct=True))
+            .order_by("podcast_id", "-requests", "raw_referrer")
+            .iterator(),
+            key=lambda row: row["podcast_id"],
+        )
+
+        # Both querysets are ordered by podcast, and every podcast that has
+        # referrers also has totals, so they can be walked in lockstep.
+        next_referrers = next(referrers, None)
+
+        for row in totals:
+            podcast_referrers = []
+            if next_referrers is not None and next_referrers[0] == row["podcast_id"]:
+                podcast_referrers = list(next_referrers[1])
+                next_referrers = next(referrers, None)
+
+            delta = row["last"] - row["first"]
             if not delta:
                 continue
-            hours = delta.total_seconds() / 60 / 60
-            days = hours / 24
-            uq_ips = set(l.remote_addr for l in logs)
-            referrers = {
-                r: [l for l in logs if l.referrer == r]
-                for r in set(l.referrer for l in logs) if r
-            }
-
-            self.stdout.write(path_info)
-            self.stdout.write(f"Total requests: {requests}")
-            self.stdout.write(f"Requests/day: {(requests / days):.02f}")
-            self.stdout.write(f"Requests/hour: {(requests / hours):.02f}")
-            self.stdout.write(f"Unique IPs: {len(uq_ips)}")
-
-            if referrers:
-                self.stdout.write("Referrers:")
-                for ref, ref_logs in referrers.items():
-                    ref_uq_ips = set(l.remote_addr for l in ref_logs)
-                    ref_percent = len(ref_logs) / len(logs) * 100
-                    self.stdout.write(
-                        f" * {ref}: {len(ref_logs)} / {ref_percent:.02f}% ({len(ref_uq_ips)} unique IPs)"
-                    )
-
-            self.stdout.write("")
+
+            stats = self.get_stats(row, podcast_referrers, delta)
+            if options["json"]:
+                self.stdout.write(json.dumps(stats))
+            else:
+                self.write_stats(stats)
+
+    def get_stats(self, row: dict, referrers: list[dict], delta: datetime.timedelta) -> dict:
+        hours = delta.total_seconds() / 60 / 60
+
+        return {
+            "podcast": row["podcast_id"],
+            "path": reverse("spodcat:podcast-rss", args=[row["podcast_id"]]),
+            "first": row["first"].isoformat(),
+            "last": row["last"].isoformat(),
+            "requests": row["requests"],
+            "requests_per_day": row["requests"] / (hours / 24),
+            "requests_per_hour": row["requests"] / hours,
+            "unique_ips": row["unique_ips"],
+            "referrers": [
+                {
+                    "referrer": referrer["raw_referrer"],
+                    "requests": referrer["requests"],
+                    "percent": referrer["requests"] / row["requests"] * 100,
+                    "unique_ips": referrer["unique_ips"],
+                }
+                for referrer in referrers
+            ],
+        }
+
+    def write_stats(self, stats: dict):
+        self.stdout.write(stats["path"])
+        self.stdout.write(f"Total requests: {stats['requests']}")
+        self.stdout.write(f"Requests/day: {stats['requests_per_day']:.02f}")
+        self.stdout.write(f"Requests/hour: {stats['requests_per_hour']:.02f}")
+        self.stdout.write(f"Unique IPs: {stats['unique_ips']}")
+
+        if stats["referrers"]:
+            self.stdout.write("Referrers:")
+            for ref in stats["referrers"]:
+                self.stdout.write(
+                    f" * {ref['referrer']}: {ref['requests']} / {ref['percent']:.02f}% "
+                    f"({ref['unique_ips']} unique IPs)"
+                )
+
+        self.stdout.write("")
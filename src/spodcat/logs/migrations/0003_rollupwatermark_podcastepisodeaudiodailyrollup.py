@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spodcat', '0001_initial'),
+        ('spodcat_logs', '0002_alter_podcastepisodeaudiorequestlog_duration_ms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PodcastEpisodeAudioDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('is_bot', models.BooleanField(verbose_name='is bot')),
+                ('listeners', models.IntegerField(default=0, verbose_name='unique listeners')),
+                ('plays', models.FloatField(default=0.0, verbose_name='plays')),
+                ('requests', models.IntegerField(default=0, verbose_name='requests')),
+                ('response_body_size', models.BigIntegerField(default=0, verbose_name='response body size')),
+                ('episode', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audio_rollups', to='spodcat.episode', verbose_name='episode')),
+            ],
+            options={
+                'verbose_name': 'daily episode audio rollup',
+                'verbose_name_plural': 'daily episode audio rollups',
+                'indexes': [models.Index(fields=['date', 'is_bot'], name='spodcat_log_date_6d0bb5_idx')],
+                'constraints': [models.UniqueConstraint(fields=('episode', 'date', 'is_bot'), name='spodcat_logs_audio_rollup_uq')],
+            },
+        ),
+    ]
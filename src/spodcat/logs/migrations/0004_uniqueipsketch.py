@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spodcat', '0001_initial'),
+        ('spodcat_logs', '0003_rollupwatermark_podcastepisodeaudiodailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UniqueIpSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('is_bot', models.BooleanField(verbose_name='is bot')),
+                ('log_type', models.CharField(choices=[('audio', 'episode audio'), ('content', 'episode/post page'), ('podcast', 'home page'), ('rss', 'RSS')], max_length=10, verbose_name='log type')),
+                ('sketch', models.BinaryField(verbose_name='sketch')),
+                ('unique_ips', models.IntegerField(default=0, verbose_name='unique IPs (estimated)')),
+                ('content', models.ForeignKey(default=None, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='spodcat.podcastcontent', verbose_name='content')),
+                ('podcast', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='spodcat.podcast', verbose_name='podcast')),
+            ],
+            options={
+                'verbose_name': 'unique IP sketch',
+                'verbose_name_plural': 'unique IP sketches',
+                'indexes': [models.Index(fields=['log_type', 'podcast', 'date'], name='spodcat_log_log_typ_c99389_idx'), models.Index(fields=['log_type', 'content', 'date'], name='spodcat_log_log_typ_f4d2ce_idx')],
+            },
+        ),
+    ]
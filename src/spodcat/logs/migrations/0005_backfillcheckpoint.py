@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spodcat_logs', '0004_uniqueipsketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillCheckpoint',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('value', models.CharField(max_length=100)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spodcat_logs', '0005_backfillcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='podcastepisodeaudiorequestlog',
+            name='last_request',
+            field=models.DateTimeField(default=None, null=True, verbose_name='last request'),
+        ),
+        migrations.AddField(
+            model_name='podcastepisodeaudiorequestlog',
+            name='request_count',
+            field=models.PositiveIntegerField(default=1, verbose_name='request count'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spodcat', '0001_initial'),
+        ('spodcat_logs', '0006_audio_request_sessions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EpisodeRetentionHistogram',
+            fields=[
+                ('buckets', models.JSONField(default=list)),
+                ('episode', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='retention_histogram', serialize=False, to='spodcat.episode', verbose_name='episode')),
+                ('listeners', models.IntegerField(default=0, verbose_name='listeners')),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'episode retention histogram',
+                'verbose_name_plural': 'episode retention histograms',
+            },
+        ),
+        migrations.AddField(
+            model_name='podcastepisodeaudiorequestlog',
+            name='range_end',
+            field=models.BigIntegerField(default=None, null=True, verbose_name='range end'),
+        ),
+        migrations.AddField(
+            model_name='podcastepisodeaudiorequestlog',
+            name='range_start',
+            field=models.BigIntegerField(default=None, null=True, verbose_name='range start'),
+        ),
+        migrations.CreateModel(
+            name='EpisodeListenerCoverage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('coverage', models.FloatField(default=0.0, verbose_name='coverage')),
+                ('intervals', models.JSONField(default=list)),
+                ('listener', models.CharField(max_length=32, verbose_name='listener')),
+                ('episode', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='listener_coverages', to='spodcat.episode', verbose_name='episode')),
+            ],
+            options={
+                'verbose_name': 'episode listener coverage',
+                'verbose_name_plural': 'episode listener coverages',
+                'constraints': [models.UniqueConstraint(fields=('episode', 'listener'), name='spodcat_logs_listener_coverage_uq')],
+            },
+        ),
+    ]
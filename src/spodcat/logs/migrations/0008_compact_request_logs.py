@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spodcat_logs', '0007_audio_coverage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferrerString',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=150, unique=True, verbose_name='referrer')),
+            ],
+            options={
+                'verbose_name': 'referrer string',
+                'verbose_name_plural': 'referrer strings',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserAgentString',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=400, unique=True, verbose_name='user agent')),
+            ],
+            options={
+                'verbose_name': 'user agent string',
+                'verbose_name_plural': 'user agent strings',
+            },
+        ),
+        migrations.AlterField(
+            model_name='podcastepisodeaudiorequestlog',
+            name='status_code',
+            field=models.PositiveSmallIntegerField(verbose_name='status code'),
+        ),
+        migrations.AddField(
+            model_name='podcastcontentrequestlog',
+            name='referrer_string',
+            field=models.ForeignKey(db_index=False, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='spodcat_logs.referrerstring', verbose_name='referrer string'),
+        ),
+        migrations.AddField(
+            model_name='podcastepisodeaudiorequestlog',
+            name='referrer_string',
+            field=models.ForeignKey(db_index=False, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='spodcat_logs.referrerstring', verbose_name='referrer string'),
+        ),
+        migrations.AddField(
+            model_name='podcastrequestlog',
+            name='referrer_string',
+            field=models.ForeignKey(db_index=False, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='spodcat_logs.referrerstring', verbose_name='referrer string'),
+        ),
+        migrations.AddField(
+            model_name='podcastrssrequestlog',
+            name='referrer_string',
+            field=models.ForeignKey(db_index=False, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='spodcat_logs.referrerstring', verbose_name='referrer string'),
+        ),
+        migrations.AddField(
+            model_name='podcastcontentrequestlog',
+            name='user_agent_string',
+            field=models.ForeignKey(db_index=False, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='spodcat_logs.useragentstring', verbose_name='user agent string'),
+        ),
+        migrations.AddField(
+            model_name='podcastepisodeaudiorequestlog',
+            name='user_agent_string',
+            field=models.ForeignKey(db_index=False, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='spodcat_logs.useragentstring', verbose_name='user agent string'),
+        ),
+        migrations.AddField(
+            model_name='podcastrequestlog',
+            name='user_agent_string',
+            field=models.ForeignKey(db_index=False, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='spodcat_logs.useragentstring', verbose_name='user agent string'),
+        ),
+        migrations.AddField(
+            model_name='podcastrssrequestlog',
+            name='user_agent_string',
+            field=models.ForeignKey(db_index=False, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='spodcat_logs.useragentstring', verbose_name='user agent string'),
+        ),
+    ]
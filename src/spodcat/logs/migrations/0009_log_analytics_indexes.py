@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:58
+
+from django.db import migrations, models
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """
+    Builds the index without blocking writes on PostgreSQL (like
+    django.contrib.postgres.operations.AddIndexConcurrently, which can't be
+    imported without psycopg), and like a plain AddIndex elsewhere.
+    """
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, **self.get_options(schema_editor))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, **self.get_options(schema_editor))
+
+    def get_options(self, schema_editor):
+        return {"concurrently": True} if schema_editor.connection.vendor == "postgresql" else {}
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run in a transaction.
+    atomic = False
+
+    dependencies = [
+        ('spodcat', '0001_initial'),
+        ('spodcat_logs', '0008_compact_request_logs'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='podcastcontentrequestlog',
+            index=models.Index(fields=['content', 'is_bot', 'created', 'remote_addr'], name='contentlog_content_bot_created'),
+        ),
+        AddIndexConcurrently(
+            model_name='podcastepisodeaudiorequestlog',
+            index=models.Index(fields=['episode', 'is_bot', 'created', 'response_body_size', 'remote_addr'], name='audiolog_episode_bot_created'),
+        ),
+        AddIndexConcurrently(
+            model_name='podcastepisodeaudiorequestlog',
+            index=models.Index(fields=['is_bot', 'created', 'episode', 'response_body_size', 'remote_addr'], name='audiolog_bot_created'),
+        ),
+        AddIndexConcurrently(
+            model_name='podcastrequestlog',
+            index=models.Index(fields=['podcast', 'is_bot', 'created', 'remote_addr'], name='podcastlog_podcast_bot_created'),
+        ),
+        AddIndexConcurrently(
+            model_name='podcastrssrequestlog',
+            index=models.Index(fields=['podcast', 'is_bot', 'created', 'remote_addr'], name='rsslog_podcast_bot_created'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spodcat_logs', '0009_log_analytics_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='podcastcontentrequestlog',
+            name='rules_version',
+            field=models.CharField(blank=True, default='', max_length=16, verbose_name='rules version'),
+        ),
+        migrations.AddField(
+            model_name='podcastepisodeaudiorequestlog',
+            name='rules_version',
+            field=models.CharField(blank=True, default='', max_length=16, verbose_name='rules version'),
+        ),
+        migrations.AddField(
+            model_name='podcastrequestlog',
+            name='rules_version',
+            field=models.CharField(blank=True, default='', max_length=16, verbose_name='rules version'),
+        ),
+        migrations.AddField(
+            model_name='podcastrssrequestlog',
+            name='rules_version',
+            field=models.CharField(blank=True, default='', max_length=16, verbose_name='rules version'),
+        ),
+    ]
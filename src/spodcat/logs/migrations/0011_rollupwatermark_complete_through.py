@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spodcat_logs', '0010_request_log_rules_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='complete_through',
+            field=models.DateField(default=None, null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    The composite indexes from 0009 start with these foreign keys, so their
+    own indexes are only dropped now that those exist.
+    """
+
+    dependencies = [
+        ('spodcat', '0001_initial'),
+        ('spodcat_logs', '0011_rollupwatermark_complete_through'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='podcastcontentrequestlog',
+            name='content',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='requests', to='spodcat.podcastcontent', verbose_name='podcast content'),
+        ),
+        migrations.AlterField(
+            model_name='podcastepisodeaudiorequestlog',
+            name='episode',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='audio_requests', to='spodcat.episode', verbose_name='episode'),
+        ),
+        migrations.AlterField(
+            model_name='podcastrequestlog',
+            name='podcast',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='requests', to='spodcat.podcast', verbose_name='podcast'),
+        ),
+        migrations.AlterField(
+            model_name='podcastrssrequestlog',
+            name='podcast',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='rss_requests', to='spodcat.podcast', verbose_name='podcast'),
+        ),
+    ]
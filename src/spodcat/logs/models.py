@@ -1,16 +1,22 @@
 import datetime
 import ipaddress
 import logging
-import socket
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Iterable
 
 from django.db import models
-from django.db.models import F, Q
+from django.db.models import Case, F, Q, Value as V, When
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from klaatu_django.db import TruncatedCharField
 from rest_framework.request import Request
 
+from spodcat.logs.cache import (
+    geoip_cache,
+    interned_string_cache,
+    user_agent_cache,
+)
 from spodcat.logs.ip_check import (
     IpAddressCategory,
     get_geoip2_asn,
@@ -18,11 +24,19 @@ from spodcat.logs.ip_check import (
     get_ip_address_category,
 )
 from spodcat.logs.querysets import (
+    EpisodeRetentionHistogramQuerySet,
     PodcastContentRequestLogQuerySet,
+    PodcastEpisodeAudioDailyRollupQuerySet,
     PodcastEpisodeAudioRequestLogQuerySet,
     PodcastRequestLogQuerySet,
     PodcastRssRequestLogQuerySet,
+    UniqueIpSketchQuerySet,
+)
+from spodcat.logs.remote_host import (
+    get_remote_host_backfiller,
+    get_remote_host_resolver,
 )
+from spodcat.logs.rules import get_rules_version
 from spodcat.logs.user_agent import (
     DeviceCategory,
     UserAgentData,
@@ -31,14 +45,18 @@ from spodcat.logs.user_agent import (
     get_useragent_data,
 )
 from spodcat.model_mixin import ModelMixin
+from spodcat.settings import spodcat_settings
 
 
 if TYPE_CHECKING:
     from spodcat.logs.querysets import (
+        EpisodeRetentionHistogramManager,
         PodcastContentRequestLogManager,
+        PodcastEpisodeAudioDailyRollupManager,
         PodcastEpisodeAudioRequestLogManager,
         PodcastRequestLogManager,
         PodcastRssRequestLogManager,
+        UniqueIpSketchManager,
     )
     from spodcat.models import Episode, Podcast, PodcastContent
 
@@ -70,8 +88,12 @@ class UserAgent(ModelMixin, models.Model):
 
     @classmethod
     def get_or_create(cls, data: UserAgentData, save: bool = True):
+        cached = user_agent_cache.get(data.user_agent)
+        if cached is not None:
+            return cached
+
         try:
-            return cls.objects.get(user_agent=data.user_agent)
+            obj = cls.objects.get(user_agent=data.user_agent)
         except cls.DoesNotExist:
             obj = cls(
                 user_agent=data.user_agent,
@@ -80,9 +102,12 @@ class UserAgent(ModelMixin, models.Model):
                 device_category=data.device_category,
                 device_name=data.device_name,
             )
-            if save:
-                obj.save()
-            return obj
+            if not save:
+                return obj
+            obj.save()
+
+        user_agent_cache.set(data.user_agent, obj)
+        return obj
 
 
 class GeoIP(ModelMixin, models.Model):
@@ -101,13 +126,19 @@ class GeoIP(ModelMixin, models.Model):
         if ipaddress.ip_address(ip).is_private:
             return None
 
+        cached = geoip_cache.get(ip)
+        if cached is not None:
+            return cached
+
         try:
-            return cls.objects.get(ip=ip)
+            obj = cls.objects.get(ip=ip)
+            geoip_cache.set(ip, obj)
+            return obj
         except cls.DoesNotExist:
             geoip2_city = get_geoip2_city(ip)
             if geoip2_city:
                 geoip2_asn = get_geoip2_asn(ip)
-                return cls.objects.update_or_create(
+                obj = cls.objects.update_or_create(
                     ip=ip,
                     defaults={
                         "city": geoip2_city.city.name or "",
@@ -116,10 +147,69 @@ class GeoIP(ModelMixin, models.Model):
                         "org": (geoip2_asn.autonomous_system_organization or "") if geoip2_asn else "",
                     },
                 )[0]
+                geoip_cache.set(ip, obj)
+                return obj
 
         return None
 
 
+class InternedString(models.Model):
+    """
+    Lookup table for raw strings that would otherwise be repeated on lots of
+    request log rows. Used if the COMPACT_REQUEST_LOGS setting is True.
+    Rows are never changed, so their ids are safe to cache forever.
+    """
+    value: models.CharField
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return self.value
+
+    @classmethod
+    def clean_value(cls, value: str) -> str:
+        return value[:cls._meta.get_field("value").max_length]
+
+    @classmethod
+    def get_id(cls, value: str) -> int | None:
+        value = cls.clean_value(value)
+        if not value:
+            return None
+
+        cache_key = f"{cls.__name__}:{value}"
+        cached = interned_string_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        obj, _ = cls.objects.get_or_create(value=value)
+        interned_string_cache.set(cache_key, obj.pk)
+        return obj.pk
+
+    @classmethod
+    def get_ids(cls, values: Iterable[str]) -> dict[str, int]:
+        """Batch version of get_id(). Returns {value: id}."""
+        values = {cls.clean_value(value) for value in values if value}
+        cls.objects.bulk_create([cls(value=value) for value in values], ignore_conflicts=True)
+        return dict(cls.objects.filter(value__in=values).values_list("value", "pk"))
+
+
+class UserAgentString(InternedString):
+    value = models.CharField(max_length=400, unique=True, verbose_name=_("user agent"))
+
+    class Meta:
+        verbose_name = _("user agent string")
+        verbose_name_plural = _("user agent strings")
+
+
+class ReferrerString(InternedString):
+    value = models.CharField(max_length=150, unique=True, verbose_name=_("referrer"))
+
+    class Meta:
+        verbose_name = _("referrer string")
+        verbose_name_plural = _("referrer strings")
+
+
 class RequestLog(ModelMixin, models.Model):
     created = models.DateTimeField(db_index=True, verbose_name=_("created"))
     geoip = models.ForeignKey["GeoIP | None"](
@@ -141,6 +231,17 @@ class RequestLog(ModelMixin, models.Model):
         verbose_name=_("referrer category"),
     )
     referrer_name = models.CharField(max_length=50, blank=True, default="", verbose_name=_("referrer name"))
+    # With COMPACT_REQUEST_LOGS, referrer, user_agent, and path_info are left
+    # empty, and the first two are stored in these lookup tables instead.
+    referrer_string = models.ForeignKey["ReferrerString | None"](
+        "spodcat_logs.ReferrerString",
+        on_delete=models.SET_NULL,
+        null=True,
+        default=None,
+        db_index=False,
+        related_name="+",
+        verbose_name=_("referrer string"),
+    )
     remote_addr = models.GenericIPAddressField(
         null=True,
         db_index=True,
@@ -154,6 +255,10 @@ class RequestLog(ModelMixin, models.Model):
         verbose_name=_("remote address category"),
     )
     remote_host = models.CharField(max_length=100, blank=True, default="", verbose_name=_("remote host"))
+    # get_rules_version() at the time is_bot, user_agent_data,
+    # remote_addr_category, and referrer_* were last set. Empty for logs
+    # classified before this was introduced.
+    rules_version = models.CharField(max_length=16, blank=True, default="", verbose_name=_("rules version"))
     user_agent = models.CharField(max_length=400, blank=True, default="", verbose_name=_("user agent"))
     user_agent_data = models.ForeignKey["UserAgent | None"](
         "spodcat_logs.UserAgent",
@@ -163,6 +268,15 @@ class RequestLog(ModelMixin, models.Model):
         related_name="+",
         verbose_name=_("user agent data"),
     )
+    user_agent_string = models.ForeignKey["UserAgentString | None"](
+        "spodcat_logs.UserAgentString",
+        on_delete=models.SET_NULL,
+        null=True,
+        default=None,
+        db_index=False,
+        related_name="+",
+        verbose_name=_("user agent string"),
+    )
 
     class Meta:
         verbose_name = _("request log")
@@ -177,6 +291,7 @@ class RequestLog(ModelMixin, models.Model):
         referrer: str | None = None,
         save: bool = True,
         created: datetime.datetime | None = None,
+        lookup_remote_host: bool = True,
         **kwargs,
     ):
         user_agent = user_agent or ""
@@ -190,7 +305,15 @@ class RequestLog(ModelMixin, models.Model):
         remote_addr_category = get_ip_address_category(remote_addr)
         user_agent_obj = UserAgent.get_or_create(ua_data) if ua_data else None
         geoip = GeoIP.get_or_create(remote_addr) if remote_addr else None
-        remote_host = socket.getfqdn(remote_addr) if remote_addr else ""
+        remote_host = cls.get_remote_host(remote_addr) if remote_addr and lookup_remote_host else ""
+
+        if spodcat_settings.COMPACT_REQUEST_LOGS:
+            kwargs.update(
+                user_agent_string_id=UserAgentString.get_id(user_agent),
+                referrer_string_id=ReferrerString.get_id(referrer),
+            )
+            user_agent = ""
+            referrer = ""
 
         obj = cls(
             is_bot=(ua_data and ua_data.is_bot) or remote_addr_category.is_bot,
@@ -199,7 +322,8 @@ class RequestLog(ModelMixin, models.Model):
             referrer_name=ref_dict["name"] if ref_dict else "",
             remote_addr=remote_addr,
             remote_addr_category=remote_addr_category,
-            remote_host=remote_host if remote_host != remote_addr else "",
+            remote_host=remote_host,
+            rules_version=get_rules_version(),
             user_agent_data=user_agent_obj,
             user_agent=user_agent,
             geoip=geoip,
@@ -207,10 +331,19 @@ class RequestLog(ModelMixin, models.Model):
             **kwargs,
         )
 
+        if spodcat_settings.COMPACT_REQUEST_LOGS and obj.path_info == obj.derive_path_info():
+            # Paths that can't be derived (e.g. from imported access logs)
+            # are kept.
+            obj.path_info = ""
+
         if save:
             obj.save()
         return obj
 
+    @classmethod
+    def bulk_create_logs(cls, logs: "list[RequestLog]", batch_size: int | None = None):
+        cls.objects.bulk_create(logs, batch_size=batch_size)
+
     @classmethod
     def create_from_request(cls, request: Request, **kwargs):
         return cls.create(
@@ -221,40 +354,59 @@ class RequestLog(ModelMixin, models.Model):
             **kwargs,
         )
 
+    def derive_path_info(self) -> str:
+        """The path of the request, as far as it can be known from our FKs."""
+        return ""
+
     @classmethod
     def fill_geoips(cls):
-        ips = list(
-            cls.objects
-            .filter(geoip=None)
-            .exclude(remote_addr=None)
-            .order_by()
-            .values_list("remote_addr", flat=True)
-            .distinct()
-        )
+        from spodcat.logs.backfill import fill_geoips
 
-        for idx, ip in enumerate(ips):
-            logger.info("(%d/%d) %s", idx + 1, len(ips), ip)
-            geoip = GeoIP.get_or_create(ip)
-
-            if geoip:
-                cls.objects.filter(remote_addr=ip).update(geoip=geoip)
+        fill_geoips(log_classes=[cls])
 
     @classmethod
     def fill_remote_hosts(cls):
-        ips = list(
-            cls.objects
-            .filter(Q(remote_host="") | Q(remote_addr__startswith=F("remote_host")))
-            .exclude(remote_addr=None)
-            .order_by()
-            .values_list("remote_addr", flat=True)
-            .distinct()
+        from spodcat.logs.backfill import fill_remote_hosts
+
+        fill_remote_hosts(log_classes=[cls])
+
+    def get_path_info(self) -> str:
+        return self.path_info or self.derive_path_info()
+
+    def get_referrer(self) -> str:
+        return self.referrer or (self.referrer_string.value if self.referrer_string else "")
+
+    @classmethod
+    def get_remote_host(cls, remote_addr: str) -> str:
+        resolver = get_remote_host_resolver()
+
+        if spodcat_settings.DEFER_REMOTE_HOST_LOOKUPS:
+            remote_host = resolver.get_cached(remote_addr)
+            if remote_host is None:
+                get_remote_host_backfiller().enqueue(remote_addr)
+            return remote_host or ""
+
+        return resolver.resolve(remote_addr)
+
+    @classmethod
+    def update_remote_hosts(cls, remote_hosts: dict[str, str], only_empty: bool = False):
+        """remote_hosts = {remote_addr: remote_host}"""
+        if not remote_hosts:
+            return 0
+
+        qs = cls.objects.filter(remote_addr__in=list(remote_hosts))
+        if only_empty:
+            qs = qs.filter(remote_host="")
+
+        return qs.update(
+            remote_host=Case(
+                *[When(remote_addr=ip, then=V(host)) for ip, host in remote_hosts.items()],
+                default=F("remote_host"),
+            ),
         )
 
-        for idx, ip in enumerate(ips):
-            remote_host = socket.getfqdn(ip)
-            if remote_host != ip:
-                logger.info("(%d/%d) %s: %s", idx + 1, len(ips), ip, remote_host)
-                cls.objects.filter(remote_addr=ip).update(remote_host=remote_host)
+    def get_user_agent(self) -> str:
+        return self.user_agent or (self.user_agent_string.value if self.user_agent_string else "")
 
     def has_change_permission(self, request):
         return False
@@ -266,6 +418,7 @@ class PodcastRequestLog(RequestLog):
         on_delete=models.CASCADE,
         related_name="requests",
         verbose_name=_("podcast"),
+        db_index=False,
     )
 
     objects: "PodcastRequestLogManager" = PodcastRequestLogQuerySet.as_manager()
@@ -273,6 +426,15 @@ class PodcastRequestLog(RequestLog):
     class Meta:
         verbose_name = _("podcast page request log")
         verbose_name_plural = _("podcast page request logs")
+        indexes = [
+            models.Index(
+                fields=["podcast", "is_bot", "created", "remote_addr"],
+                name="podcastlog_podcast_bot_created",
+            ),
+        ]
+
+    def derive_path_info(self):
+        return reverse("spodcat:podcast-ping", args=[self.podcast_id])
 
 
 class PodcastContentRequestLog(RequestLog):
@@ -281,6 +443,7 @@ class PodcastContentRequestLog(RequestLog):
         on_delete=models.CASCADE,
         related_name="requests",
         verbose_name=_("podcast content"),
+        db_index=False,
     )
 
     objects: "PodcastContentRequestLogManager" = PodcastContentRequestLogQuerySet.as_manager()
@@ -288,6 +451,16 @@ class PodcastContentRequestLog(RequestLog):
     class Meta:
         verbose_name = _("podcast content page request log")
         verbose_name_plural = _("podcast content page request logs")
+        indexes = [
+            models.Index(
+                fields=["content", "is_bot", "created", "remote_addr"],
+                name="contentlog_content_bot_created",
+            ),
+        ]
+
+    def derive_path_info(self):
+        viewname = f"spodcat:{self.content.get_real_instance_class()._meta.model_name}-ping"
+        return reverse(viewname, args=[self.content_id])
 
 
 class PodcastEpisodeAudioRequestLog(RequestLog):
@@ -297,15 +470,163 @@ class PodcastEpisodeAudioRequestLog(RequestLog):
         on_delete=models.CASCADE,
         related_name="audio_requests",
         verbose_name=_("episode"),
+        db_index=False,
     )
+    # If AUDIO_REQUEST_SESSION_WINDOW is set, one log may represent several
+    # requests; see merge_into_session().
+    last_request = models.DateTimeField(null=True, default=None, verbose_name=_("last request"))
+    # Byte range [range_start, range_end) of the audio file. Null for logs
+    # from before these fields existed, which are treated as covering
+    # [0, response_body_size).
+    range_end = models.BigIntegerField(null=True, default=None, verbose_name=_("range end"))
+    range_start = models.BigIntegerField(null=True, default=None, verbose_name=_("range start"))
+    request_count = models.PositiveIntegerField(default=1, verbose_name=_("request count"))
     response_body_size = models.IntegerField(db_index=True, verbose_name=_("response body size"))
-    status_code = models.CharField(max_length=10, verbose_name=_("status code"))
+    status_code = models.PositiveSmallIntegerField(verbose_name=_("status code"))
 
     objects: "PodcastEpisodeAudioRequestLogManager" = PodcastEpisodeAudioRequestLogQuerySet.as_manager()
 
     class Meta:
         verbose_name = _("podcast episode audio request log")
         verbose_name_plural = _("podcast episode audio request logs")
+        # The graph and statistics querysets always filter on is_bot and
+        # usually on a created range, and mostly read response_body_size and
+        # remote_addr, which can then be read from the index alone. (Not
+        # using Index.include, since SQLite doesn't support it.)
+        indexes = [
+            models.Index(
+                fields=["episode", "is_bot", "created", "response_body_size", "remote_addr"],
+                name="audiolog_episode_bot_created",
+            ),
+            models.Index(
+                fields=["is_bot", "created", "episode", "response_body_size", "remote_addr"],
+                name="audiolog_bot_created",
+            ),
+        ]
+
+    @classmethod
+    def bulk_create_logs(cls, logs: "list[PodcastEpisodeAudioRequestLog]", batch_size: int | None = None):
+        if spodcat_settings.AUDIO_REQUEST_SESSION_WINDOW:
+            logs = [log for log in cls.merge_sessions(logs) if not log.merge_into_session()]
+        super().bulk_create_logs(logs, batch_size=batch_size)
+
+    @classmethod
+    def create(cls, *args, save: bool = True, **kwargs):
+        obj = super().create(*args, save=False, **kwargs)
+
+        if save and not (spodcat_settings.AUDIO_REQUEST_SESSION_WINDOW and obj.merge_into_session()):
+            obj.save()
+        return obj
+
+    def derive_path_info(self):
+        return reverse("spodcat:episode-audio", args=[self.episode_id])
+
+    @classmethod
+    def merge_sessions(cls, logs: "list[PodcastEpisodeAudioRequestLog]") -> "list[PodcastEpisodeAudioRequestLog]":
+        """
+        Merges unsaved logs for the same episode, remote address, and user
+        agent, where each log was created within AUDIO_REQUEST_SESSION_WINDOW
+        seconds of the previous one.
+        """
+        window = datetime.timedelta(seconds=spodcat_settings.AUDIO_REQUEST_SESSION_WINDOW)
+        sessions: dict[tuple, PodcastEpisodeAudioRequestLog] = {}
+        result: list[PodcastEpisodeAudioRequestLog] = []
+
+        for log in sorted(logs, key=lambda log: log.created):
+            key = (log.episode_id, log.remote_addr, log.user_agent, log.user_agent_string_id)
+            session = sessions.get(key, None) if log.remote_addr else None
+
+            if (
+                session is not None and
+                log.created - (session.last_request or session.created) <= window and
+                session.range_overlaps(log.range_start, log.range_end)
+            ):
+                session.last_request = log.created
+                session.request_count += log.request_count
+                session.response_body_size += log.response_body_size
+                if session.range_start is not None and log.range_start is not None:
+                    session.range_start = min(session.range_start, log.range_start)
+                    session.range_end = max(session.range_end, log.range_end)
+            else:
+                sessions[key] = log
+                result.append(log)
+
+        return result
+
+    def merge_into_session(self) -> bool:
+        """
+        If there is a saved log for the same episode, remote address, and
+        user agent, whose last request was no more than
+        AUDIO_REQUEST_SESSION_WINDOW seconds before this one was created, adds
+        this (unsaved) log's requests and response body size to it, and
+        returns True. Otherwise returns False, and this log should be saved
+        as the start of a new session.
+
+        Like the IAB podcast measurement guidelines, this identifies a
+        listener by IP address and user agent. Byte ranges are only merged if
+        they overlap or are adjacent, so that a session always covers one
+        contiguous range of the file; a seek to somewhere else starts a new
+        session.
+
+        Only logs created today are merged into, since logs from earlier days
+        may already have been included in rollups (see spodcat.logs.rollups),
+        which wouldn't notice them changing. A session that crosses midnight
+        is therefore split in two.
+        """
+        if not self.remote_addr:
+            return False
+
+        window = datetime.timedelta(seconds=spodcat_settings.AUDIO_REQUEST_SESSION_WINDOW)
+        session_pk = (
+            self.__class__.objects
+            .filter(
+                episode_id=self.episode_id,
+                remote_addr=self.remote_addr,
+                user_agent=self.user_agent,
+                user_agent_string=self.user_agent_string_id,
+                created__lte=self.created,
+            )
+            .filter_dates(start_date=timezone.localdate())
+            .filter(
+                Q(last_request__gte=self.created - window) |
+                Q(last_request=None, created__gte=self.created - window)
+            )
+            .filter(
+                Q(range_start=None) |
+                Q(range_start__lte=self.range_end, range_end__gte=self.range_start)
+                if self.range_start is not None and self.range_end is not None
+                else Q()
+            )
+            .order_by("-created")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if session_pk is None:
+            return False
+
+        return bool(
+            self.__class__.objects
+            .filter(pk=session_pk)
+            .update(
+                last_request=Greatest(Coalesce("last_request", "created"), V(self.last_request or self.created)),
+                request_count=F("request_count") + self.request_count,
+                response_body_size=F("response_body_size") + self.response_body_size,
+                **(
+                    {
+                        "range_start": Least("range_start", V(self.range_start)),
+                        "range_end": Greatest("range_end", V(self.range_end)),
+                    }
+                    if self.range_start is not None and self.range_end is not None
+                    else {}
+                ),
+            )
+        )
+
+    def range_overlaps(self, range_start: int | None, range_end: int | None) -> bool:
+        """Whether [range_start, range_end) overlaps or adjoins our range."""
+        if None in (self.range_start, self.range_end, range_start, range_end):
+            return True
+        return range_start <= self.range_end and range_end >= self.range_start
 
     @classmethod
     def update_or_create(
@@ -333,8 +654,12 @@ class PodcastEpisodeAudioRequestLog(RequestLog):
             "referrer_name",
             "remote_addr_category",
             "remote_host",
+            "rules_version",
             "user_agent_data",
             "user_agent",
+            "user_agent_string",
+            "referrer_string",
+            "path_info",
             "geoip",
             *defaults,
         ]
@@ -348,6 +673,52 @@ class PodcastEpisodeAudioRequestLog(RequestLog):
             defaults={key: getattr(obj, key) for key in defaults_keys},
         )
 
+    @classmethod
+    def bulk_update_or_create(cls, objs: "list[PodcastEpisodeAudioRequestLog]") -> tuple[int, int]:
+        """
+        Batch version of update_or_create(), for objects created with
+        create(save=False). Existing logs with the same remote_addr and
+        created get all their other fields updated; the rest are inserted. If
+        `objs` contains several objects with the same remote_addr and
+        created, the last one wins.
+
+        Returns the number of created and updated logs.
+        """
+        unique_objs = {(obj.remote_addr, obj.created): obj for obj in objs}
+        if not unique_objs:
+            return 0, 0
+
+        remote_addrs = {key[0] for key in unique_objs}
+        # remote_addr__in never matches NULL.
+        remote_addr_q = Q(remote_addr__in=remote_addrs - {None})
+        if None in remote_addrs:
+            remote_addr_q |= Q(remote_addr__isnull=True)
+
+        existing = {
+            (remote_addr, created): pk
+            for pk, remote_addr, created in (
+                cls.objects
+                .filter(remote_addr_q, created__in={key[1] for key in unique_objs})
+                .values_list("pk", "remote_addr", "created")
+            )
+        }
+        to_create = []
+        to_update = []
+
+        for key, obj in unique_objs.items():
+            if key in existing:
+                obj.pk = existing[key]
+                to_update.append(obj)
+            else:
+                to_create.append(obj)
+
+        cls.objects.bulk_create(to_create)
+        cls.objects.bulk_update(
+            to_update,
+            fields=[field.name for field in cls._meta.concrete_fields if not field.primary_key],
+        )
+        return len(to_create), len(to_update)
+
 
 class PodcastRssRequestLog(RequestLog):
     podcast = models.ForeignKey["Podcast"](
@@ -355,6 +726,207 @@ class PodcastRssRequestLog(RequestLog):
         on_delete=models.CASCADE,
         related_name="rss_requests",
         verbose_name=_("podcast"),
+        db_index=False,
     )
 
     objects: "PodcastRssRequestLogManager" = PodcastRssRequestLogQuerySet.as_manager()
+
+    class Meta(RequestLog.Meta):
+        verbose_name = _("request log")
+        verbose_name_plural = _("request logs")
+        indexes = [
+            models.Index(
+                fields=["podcast", "is_bot", "created", "remote_addr"],
+                name="rsslog_podcast_bot_created",
+            ),
+        ]
+
+    def derive_path_info(self):
+        return reverse("spodcat:podcast-rss", args=[self.podcast_id])
+
+
+class PodcastEpisodeAudioDailyRollup(models.Model):
+    """
+    Totals of PodcastEpisodeAudioRequestLog per episode, date (in TIME_ZONE),
+    and is_bot. Created by the `rollup_audio_logs` management command.
+    """
+    WATERMARK = "audio_daily"
+
+    date = models.DateField(verbose_name=_("date"))
+    episode = models.ForeignKey["Episode"](
+        "spodcat.Episode",
+        on_delete=models.CASCADE,
+        related_name="audio_rollups",
+        verbose_name=_("episode"),
+    )
+    is_bot = models.BooleanField(verbose_name=_("is bot"))
+    listeners = models.IntegerField(default=0, verbose_name=_("unique listeners"))
+    plays = models.FloatField(default=0.0, verbose_name=_("plays"))
+    requests = models.IntegerField(default=0, verbose_name=_("requests"))
+    response_body_size = models.BigIntegerField(default=0, verbose_name=_("response body size"))
+
+    objects: "PodcastEpisodeAudioDailyRollupManager" = PodcastEpisodeAudioDailyRollupQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _("daily episode audio rollup")
+        verbose_name_plural = _("daily episode audio rollups")
+        constraints = [
+            models.UniqueConstraint(fields=["episode", "date", "is_bot"], name="spodcat_logs_audio_rollup_uq"),
+        ]
+        indexes = [models.Index(fields=["date", "is_bot"])]
+
+    @classmethod
+    def get_complete_through(cls) -> datetime.date | None:
+        """
+        The last date that the rollups can be used for; logs from after that
+        date have to be read raw. None if there are no usable rollups.
+        """
+        return RollupWatermark.get_complete_through(cls.WATERMARK)
+
+
+class UniqueIpSketchLogType(models.TextChoices):
+    AUDIO = "audio", _("episode audio")
+    CONTENT = "content", _("episode/post page")
+    PODCAST = "podcast", _("home page")
+    RSS = "rss", _("RSS")
+
+
+class UniqueIpSketch(models.Model):
+    """
+    HyperLogLog sketch of the remote IPs of one type of request log, per
+    podcast, content (for audio and content page logs), date (in TIME_ZONE),
+    and is_bot. Created by the `rollup_unique_ips` management command.
+    """
+    content = models.ForeignKey["PodcastContent | None"](
+        "spodcat.PodcastContent",
+        on_delete=models.CASCADE,
+        related_name="+",
+        null=True,
+        default=None,
+        verbose_name=_("content"),
+    )
+    date = models.DateField(verbose_name=_("date"))
+    is_bot = models.BooleanField(verbose_name=_("is bot"))
+    log_type = models.CharField(max_length=10, choices=UniqueIpSketchLogType.choices, verbose_name=_("log type"))
+    podcast = models.ForeignKey["Podcast"](
+        "spodcat.Podcast",
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name=_("podcast"),
+    )
+    sketch = models.BinaryField(verbose_name=_("sketch"))
+    unique_ips = models.IntegerField(default=0, verbose_name=_("unique IPs (estimated)"))
+
+    objects: "UniqueIpSketchManager" = UniqueIpSketchQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _("unique IP sketch")
+        verbose_name_plural = _("unique IP sketches")
+        indexes = [
+            models.Index(fields=["log_type", "podcast", "date"]),
+            models.Index(fields=["log_type", "content", "date"]),
+        ]
+
+    @classmethod
+    def get_complete_through(cls, log_type: UniqueIpSketchLogType) -> datetime.date | None:
+        """
+        The last date that there are complete sketches of `log_type` logs
+        for; logs from after that date have to be read raw. None if there are
+        no usable sketches.
+        """
+        return RollupWatermark.get_complete_through(cls.get_watermark_name(log_type))
+
+    @classmethod
+    def get_sketches(cls, log_type: UniqueIpSketchLogType, **filters) -> "UniqueIpSketchQuerySet | None":
+        """
+        Sketches for all days that the sketches are complete through, or None
+        if the APPROXIMATE_UNIQUE_IPS setting is not enabled or the sketches
+        have never been built. Sketches for the days after that are built from
+        the raw logs by BaseRequestLogQuerySet.get_unique_ip_sketch_rows().
+        """
+        if not spodcat_settings.APPROXIMATE_UNIQUE_IPS:
+            return None
+        complete_through = cls.get_complete_through(log_type)
+        if complete_through is None:
+            return None
+        return cls.objects.filter(log_type=log_type, **filters).filter(date__lte=complete_through)
+
+    @staticmethod
+    def get_watermark_name(log_type: UniqueIpSketchLogType) -> str:
+        return f"unique_ips_{log_type.value}"
+
+
+class EpisodeListenerCoverage(models.Model):
+    """
+    The parts of an episode's audio file that one listener (IP address and
+    user agent) has fetched, as merged [start, end) byte ranges. Created by
+    the `rollup_audio_coverage` management command.
+    """
+    coverage = models.FloatField(default=0.0, verbose_name=_("coverage"))
+    episode = models.ForeignKey["Episode"](
+        "spodcat.Episode",
+        on_delete=models.CASCADE,
+        related_name="listener_coverages",
+        verbose_name=_("episode"),
+    )
+    intervals = models.JSONField(default=list)
+    listener = models.CharField(max_length=32, verbose_name=_("listener"))
+
+    class Meta:
+        verbose_name = _("episode listener coverage")
+        verbose_name_plural = _("episode listener coverages")
+        constraints = [
+            models.UniqueConstraint(fields=["episode", "listener"], name="spodcat_logs_listener_coverage_uq"),
+        ]
+
+
+class EpisodeRetentionHistogram(models.Model):
+    """
+    For each of RETENTION_BUCKETS equally sized parts of an episode's audio
+    file, the number of listeners that have fetched (at least half of) it.
+    Updated incrementally by the `rollup_audio_coverage` management command.
+    """
+    buckets = models.JSONField(default=list)
+    episode = models.OneToOneField["Episode"](
+        "spodcat.Episode",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="retention_histogram",
+        verbose_name=_("episode"),
+    )
+    listeners = models.IntegerField(default=0, verbose_name=_("listeners"))
+    updated = models.DateTimeField(auto_now=True)
+
+    objects: "EpisodeRetentionHistogramManager" = EpisodeRetentionHistogramQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _("episode retention histogram")
+        verbose_name_plural = _("episode retention histograms")
+
+
+class RollupWatermark(models.Model):
+    """
+    The last log PK that has been included in a rollup, and the last date
+    that the rollup is complete through. Logs from after that date have to
+    be read raw, since the rollup only runs every now and then.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
+    complete_through = models.DateField(null=True, default=None)
+    updated = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def get_complete_through(cls, name: str) -> datetime.date | None:
+        """None if the rollup has never been run."""
+        return cls.objects.filter(name=name).values_list("complete_through", flat=True).first()
+
+
+class BackfillCheckpoint(models.Model):
+    """Where an interrupted backfill should resume."""
+    name = models.CharField(max_length=100, primary_key=True)
+    value = models.CharField(max_length=100)
+    updated = models.DateTimeField(auto_now=True)
+
+
+def get_request_log_models() -> list[type[RequestLog]]:
+    return [PodcastRequestLog, PodcastContentRequestLog, PodcastEpisodeAudioRequestLog, PodcastRssRequestLog]
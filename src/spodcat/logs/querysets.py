@@ -1,9 +1,12 @@
+import datetime
 import functools
+import itertools
 import operator
-from typing import TYPE_CHECKING, Any, TypeVar, cast
+from typing import TYPE_CHECKING, Any, Iterable, TypeVar, cast
 
 from django.contrib.auth.models import AbstractUser
 from django.db.models import (
+    Aggregate,
     CharField,
     Count,
     F,
@@ -13,10 +16,14 @@ from django.db.models import (
     Sum,
     Value as V,
 )
-from django.db.models.functions import Cast, Coalesce, LPad, Round
+from django.db.models.functions import Cast, Coalesce, Concat, NullIf, Round
 
-from spodcat.logs.graph_data import PeriodicalGraphData
-from spodcat.time_period import Month, TimePeriod, Week, Year
+from spodcat.logs.graph_data import (
+    EpisodeRetentionGraphData,
+    PeriodicalGraphData,
+)
+from spodcat.logs.hll import HyperLogLog
+from spodcat.time_period import Day, Month, TimePeriod
 
 
 if TYPE_CHECKING:
@@ -24,10 +31,13 @@ if TYPE_CHECKING:
     from django.db.models import Model
 
     from spodcat.logs.models import (
+        EpisodeRetentionHistogram,
         PodcastContentRequestLog,
+        PodcastEpisodeAudioDailyRollup,
         PodcastEpisodeAudioRequestLog,
         PodcastRequestLog,
         PodcastRssRequestLog,
+        UniqueIpSketch,
     )
 
     _Row_co = TypeVar("_Row_co", covariant=True)  # ONLY use together with _Model
@@ -36,47 +46,181 @@ if TYPE_CHECKING:
 
 class BaseRequestLogQuerySet(QuerySet["_Model_co", "_Row_co"]):
     _podcast_field_prefix: str
+    _unique_ip_sketch_log_type: str
+
+    def filter_dates(self, start_date: datetime.date | None = None, end_date: datetime.date | None = None):
+        """
+        Logs created from the start of `start_date` up until the end of
+        `end_date` (both in the current timezone, i.e. normally TIME_ZONE).
+        Filters on half-open datetime bounds instead of `created__date`, since
+        casting `created` to a date would keep the database from using the
+        indexes on it.
+        """
+        queryset = self
+        if start_date is not None:
+            queryset = queryset.filter(created__gte=Day(start_date).start_datetime)
+        if end_date is not None:
+            queryset = queryset.filter(created__lt=Day(end_date).end_datetime)
+        return queryset
+
+    def exclude_without_user_agent(self):
+        return self.exclude(user_agent="", user_agent_string=None)
+
+    def with_raw_referrer(self):
+        """Like with_raw_user_agent(), but annotates `raw_referrer`."""
+        return self.annotate(
+            raw_referrer=Coalesce(NullIf("referrer", V("")), "referrer_string__value", V("")),
+        )
 
-    def get_monthly_views(self):
-        return (
-            self
+    def with_raw_user_agent(self):
+        """
+        Annotates `raw_user_agent`, which works regardless of whether the logs
+        are compact (see COMPACT_REQUEST_LOGS) or not.
+        """
+        return self.annotate(
+            raw_user_agent=Coalesce(NullIf("user_agent", V("")), "user_agent_string__value", V("")),
+        )
+
+    def count_unique_ips(self, sketches: "UniqueIpSketchQuerySet | None" = None) -> int:
+        """
+        If `sketches` is given, the count is estimated from them plus the
+        logs from today in this queryset.
+        """
+        if sketches is not None:
+            hll = HyperLogLog.union(sketches.values_list("sketch", flat=True))
+            for row in self.get_unique_ip_sketch_rows():
+                hll.merge(row["sketch"])
+            return hll.count()
+
+        return self.aggregate(visitors=Count("remote_addr", distinct=True))["visitors"]
+
+    def get_monthly_views(self, sketches: "UniqueIpSketchQuerySet | None" = None) -> list[dict]:
+        """
+        Page views and visitors per month, newest first, as dicts with the keys
+        `month` (zero padded string), `year`, `views`, and `visitors`.
+        """
+        if sketches is not None:
+            views = (
+                self
+                .order_by()
+                .values(period=Month.trunc("created"))
+                .values("period", views=Count("pk", distinct=True))
+                .order_by("-period")
+            )
+            visitors = {
+                row["date"]: row["y"]
+                for row in get_unique_ips_rows(
+                    itertools.chain(sketches.get_sketch_rows(), self.get_unique_ip_sketch_rows()),
+                    period=Month,
+                    average=False,
+                    per_podcast=False,
+                )
+            }
+            return [
+                {
+                    "month": f"{row['period'].month:02d}",
+                    "year": row["period"].year,
+                    "views": row["views"],
+                    "visitors": round(visitors.get(row["period"], 0)),
+                }
+                for row in views
+            ]
+
+        return [
+            {
+                "month": f"{row['period'].month:02d}",
+                "year": row["period"].year,
+                "views": row["views"],
+                "visitors": row["visitors"],
+            }
+            for row in (
+                self
+                .order_by()
+                .values(period=Month.trunc("created"))
+                .values("period", views=Count("pk", distinct=True), visitors=Count("remote_addr", distinct=True))
+                .order_by("-period")
+            )
+        ]
+
+    def get_unique_ip_sketch_rows(self) -> list[dict]:
+        """
+        Sketches of the remote IPs in this queryset's logs from the days that
+        there are no complete UniqueIpSketches for yet (see
+        UniqueIpSketch.get_sketches()), per podcast and date, in the same
+        format as UniqueIpSketchQuerySet.get_sketch_rows().
+        """
+        from spodcat.logs.models import UniqueIpSketch, UniqueIpSketchLogType
+
+        sketches: dict[tuple[str, str, datetime.date], HyperLogLog] = {}
+        complete_through = UniqueIpSketch.get_complete_through(UniqueIpSketchLogType(self._unique_ip_sketch_log_type))
+        queryset = self
+        if complete_through is not None:
+            queryset = queryset.filter_dates(start_date=complete_through + datetime.timedelta(days=1))
+
+        for row in (
+            queryset
+            .exclude(remote_addr=None)
             .order_by()
             .values(
-                month=LPad(Cast("created__date__month", CharField()), 2, V("0")),
-                year=F("created__date__year"),
+                name=F(f"{self._podcast_field_prefix}__name"),
+                slug=F(f"{self._podcast_field_prefix}__slug"),
+                date=Day.trunc("created"),
+                ip=F("remote_addr"),
+            )
+            .distinct()
+        ):
+            sketches.setdefault((row["slug"], row["name"], row["date"]), HyperLogLog()).add(row["ip"])
+
+        return [
+            {"slug": slug, "name": name, "date": date, "sketch": sketch}
+            for (slug, name, date), sketch in sketches.items()
+        ]
+
+    def get_unique_ips_graph_data(
+        self,
+        period: type[TimePeriod],
+        grouped: bool,
+        average: bool,
+        sketches: "UniqueIpSketchQuerySet | None" = None,
+    ):
+        if sketches is not None:
+            rows = get_unique_ips_rows(
+                itertools.chain(sketches.get_sketch_rows(), self.get_unique_ip_sketch_rows()),
+                period=period,
+                average=average,
+            )
+            return PeriodicalGraphData(rows, period, average=average, grouped=grouped)
+
+        y = Count("remote_addr", distinct=True)
+        if average:
+            # The average of the daily unique IP counts in each period, i.e.
+            # the number of distinct (day, IP) pairs divided by the number of
+            # days that have any logs.
+            day = Day.trunc("created")
+            day_ips = Concat(Cast(day, CharField()), V(" "), "remote_addr", output_field=CharField())
+            y = (
+                Cast(Count(day_ips, distinct=True, filter=Q(remote_addr__isnull=False)), FloatField()) /
+                Count(day, distinct=True)
             )
-            .values("month", "year", views=Count("pk", distinct=True), visitors=Count("remote_addr", distinct=True))
-            .order_by("-year", "-month")
-        )
-
-    def get_unique_ips_graph_data(self, period: type[TimePeriod], grouped: bool, average: bool):
-        values = {"date": F("created__date")}
-
-        if not average:
-            if period is Year:
-                values = {"year": F("created__date__year")}
-            elif period is Week:
-                values = {"year": F("created__date__year"), "week": F("created__date__week")}
-            elif period is Month:
-                values = {"year": F("created__date__year"), "month": F("created__date__month")}
 
         qs = (
             self.order_by()
             .values(
                 name=F(f"{self._podcast_field_prefix}__name"),
                 slug=F(f"{self._podcast_field_prefix}__slug"),
-                **values,
+                date=period.trunc("created"),
             )
-            .annotate(y=Count("remote_addr", distinct=True))
-            .values("y", "name", "slug", *values.keys())
-            .order_by("slug", *values.keys())
+            .annotate(y=y)
+            .values("y", "name", "slug", "date")
+            .order_by("slug", "date")
         )
 
-        return PeriodicalGraphData(qs, period, average=average, grouped=grouped)
+        return PeriodicalGraphData(qs, period, grouped=grouped)
 
 
 class PodcastRequestLogQuerySet(BaseRequestLogQuerySet["PodcastRequestLog", "_Row_co"]):
     _podcast_field_prefix = "podcast"
+    _unique_ip_sketch_log_type = "podcast"
 
     @classmethod
     def as_manager(cls) -> "PodcastRequestLogManager":
@@ -85,6 +229,7 @@ class PodcastRequestLogQuerySet(BaseRequestLogQuerySet["PodcastRequestLog", "_Ro
 
 class PodcastContentRequestLogQuerySet(BaseRequestLogQuerySet["PodcastContentRequestLog", "_Row_co"]):
     _podcast_field_prefix = "content__podcast"
+    _unique_ip_sketch_log_type = "content"
 
     @classmethod
     def as_manager(cls) -> "PodcastContentRequestLogManager":
@@ -93,6 +238,7 @@ class PodcastContentRequestLogQuerySet(BaseRequestLogQuerySet["PodcastContentReq
 
 class PodcastRssRequestLogQuerySet(BaseRequestLogQuerySet["PodcastRssRequestLog", "_Row_co"]):
     _podcast_field_prefix = "podcast"
+    _unique_ip_sketch_log_type = "rss"
 
     @classmethod
     def as_manager(cls) -> "PodcastRssRequestLogManager":
@@ -108,6 +254,7 @@ class PodcastRssRequestLogQuerySet(BaseRequestLogQuerySet["PodcastRssRequestLog"
 
 class PodcastEpisodeAudioRequestLogQuerySet(BaseRequestLogQuerySet["PodcastEpisodeAudioRequestLog", "_Row_co"]):
     _podcast_field_prefix = "episode__podcast"
+    _unique_ip_sketch_log_type = "audio"
 
     @classmethod
     def as_manager(cls) -> "PodcastEpisodeAudioRequestLogManager":
@@ -120,28 +267,53 @@ class PodcastEpisodeAudioRequestLogQuerySet(BaseRequestLogQuerySet["PodcastEpiso
             return self
         return self.filter(Q(episode__podcast__owner=user) | Q(episode__podcast__authors=user))
 
-    def get_episode_play_count_graph_data(self, period: type[TimePeriod]):
+    def get_episode_play_count_graph_data(
+        self,
+        period: type[TimePeriod],
+        rollups: "PodcastEpisodeAudioDailyRollupQuerySet | None" = None,
+    ):
         qs = (
             self.order_by()
-            .values(name=F("episode__name"), slug=F("episode__slug"), date=F("created__date"))
+            .values(name=F("episode__name"), slug=F("episode__slug"), date=period.trunc("created"))
             .with_quota_fetched_alias()
             .annotate(y=Sum(F("quota_fetched")))
             .exclude(y=0.0)
             .values("name", "slug", "date", "y")
             .order_by("slug", "date")
         )
+        if rollups is not None:
+            return PeriodicalGraphData(merge_graph_rows(rollups.get_episode_play_count_rows(period), qs), period)
         return PeriodicalGraphData(qs, period)
 
     def get_most_played(self):
+        """
+        Plays and unique players per episode, also during the first week
+        after each episode was published (`first_week_plays` and
+        `first_week_players`), most played first.
+        """
         return (
             self.order_by()
             .values(name=F("episode__name"), slug=F("episode__slug"), eid=F("episode__id"))
             .with_quota_fetched_alias()
-            .annotate(plays=Sum(F("quota_fetched")), players=Count("remote_addr", distinct=True))
-            .values("name", "slug", "plays", "players", "eid")
+            .annotate(**self.get_play_stats_aggregates())
+            .values("name", "slug", "plays", "players", "first_week_plays", "first_week_players", "eid")
             .order_by("-plays")
         )
 
+    def get_play_stats(self) -> dict[str, Any]:
+        """Like get_most_played(), but in total instead of per episode."""
+        return self.with_quota_fetched().aggregate(**self.get_play_stats_aggregates())
+
+    @staticmethod
+    def get_play_stats_aggregates() -> dict[str, Aggregate]:
+        first_week = Q(created__lte=F("episode__published") + datetime.timedelta(days=7))
+        return {
+            "plays": Sum(F("quota_fetched")),
+            "players": Count("remote_addr", distinct=True),
+            "first_week_plays": Sum(F("quota_fetched"), filter=first_week),
+            "first_week_players": Count("remote_addr", distinct=True, filter=first_week),
+        }
+
     def get_play_count_query(self, **filters):
         return (
             self
@@ -162,22 +334,33 @@ class PodcastEpisodeAudioRequestLogQuerySet(BaseRequestLogQuerySet["PodcastEpiso
             .order_by("-ip_count")
         )
 
-    def get_podcast_play_count_graph_data(self, period: type[TimePeriod], grouped: bool):
-        values = {"date": "created__date"}
+    def get_podcast_play_count_graph_data(
+        self,
+        period: type[TimePeriod],
+        grouped: bool,
+        rollups: "PodcastEpisodeAudioDailyRollupQuerySet | None" = None,
+    ):
+        values = {"date": period.trunc("created")}
         order_by = ["date"]
         if grouped:
-            values.update({"name": "episode__podcast__name", "slug": "episode__podcast__slug"})
+            values.update({"name": F("episode__podcast__name"), "slug": F("episode__podcast__slug")})
             order_by = ["slug", "name", "date"]
 
         qs = (
             self.order_by()
-            .values(**{k: F(v) for k, v in values.items()})
+            .values(**values)
             .alias(plays=Cast(F("response_body_size"), FloatField()) / F("episode__audio_file_length"))
             .annotate(y=Sum(F("plays")))
             .values("y", *values.keys())
             .order_by(*order_by)
         )
 
+        if rollups is not None:
+            return PeriodicalGraphData(
+                merge_graph_rows(rollups.get_podcast_play_count_rows(period, grouped=grouped), qs),
+                period,
+                grouped=grouped,
+            )
         return PeriodicalGraphData(qs, period, grouped=grouped)
 
     def with_quota_fetched(self):
@@ -210,9 +393,166 @@ class PodcastEpisodeAudioRequestLogQuerySet(BaseRequestLogQuerySet["PodcastEpiso
         return super().values(*fields, **expressions) # type: ignore
 
 
+class PodcastEpisodeAudioDailyRollupQuerySet(QuerySet["PodcastEpisodeAudioDailyRollup"]):
+    @classmethod
+    def as_manager(cls) -> "PodcastEpisodeAudioDailyRollupManager":
+        return cast("PodcastEpisodeAudioDailyRollupManager", super().as_manager())
+
+    def filter_by_user(self, user: "AbstractBaseUser | AnonymousUser"):
+        if not isinstance(user, AbstractUser) or not user.is_staff:
+            return self.none()
+        if user.is_superuser:
+            return self
+        return self.filter(Q(episode__podcast__owner=user) | Q(episode__podcast__authors=user))
+
+    def get_episode_play_count_rows(self, period: type[TimePeriod]) -> list[dict]:
+        # Can't annotate as "date", since that's a field on the model.
+        return [
+            {"date": row.pop("period"), **row}
+            for row in (
+                self.order_by()
+                .values(period=period.trunc("date"), name=F("episode__name"), slug=F("episode__slug"))
+                .annotate(y=Sum("plays"))
+                .exclude(y=0.0)
+                .values("name", "slug", "period", "y")
+                .order_by("slug", "period")
+            )
+        ]
+
+    def get_play_count_query(self, **filters):
+        return (
+            self
+            .filter(**filters)
+            .order_by()
+            .values(*filters.keys())
+            .annotate(play_count=Coalesce(Sum("plays"), V(0.0), output_field=FloatField()))
+            .values("play_count")
+        )
+
+    def get_podcast_play_count_rows(self, period: type[TimePeriod], grouped: bool) -> list[dict]:
+        values = {"period": period.trunc("date")}
+        order_by = ["period"]
+        if grouped:
+            values.update({"name": F("episode__podcast__name"), "slug": F("episode__podcast__slug")})
+            order_by = ["slug", "name", "period"]
+
+        # Can't annotate as "date", since that's a field on the model.
+        return [
+            {"date": row.pop("period"), **row}
+            for row in (
+                self.order_by()
+                .values(**values)
+                .annotate(y=Sum("plays"))
+                .values("y", *values.keys())
+                .order_by(*order_by)
+            )
+        ]
+
+
+class EpisodeRetentionHistogramQuerySet(QuerySet["EpisodeRetentionHistogram"]):
+    @classmethod
+    def as_manager(cls) -> "EpisodeRetentionHistogramManager":
+        return cast("EpisodeRetentionHistogramManager", super().as_manager())
+
+    def filter_by_user(self, user: "AbstractBaseUser | AnonymousUser"):
+        if not isinstance(user, AbstractUser) or not user.is_staff:
+            return self.none()
+        if user.is_superuser:
+            return self
+        return self.filter(Q(episode__podcast__owner=user) | Q(episode__podcast__authors=user))
+
+    def get_retention_graph_data(self) -> EpisodeRetentionGraphData:
+        """
+        One dataset per episode, where x is the position in the episode in
+        percent and y is the number of listeners that got there.
+        """
+        rows = []
+
+        for histogram in self.select_related("episode").order_by("episode__slug"):
+            buckets = histogram.buckets
+            rows.extend(
+                {
+                    "slug": histogram.episode.slug,
+                    "name": histogram.episode.name,
+                    "x": idx * 100 // len(buckets),
+                    "y": float(count),
+                }
+                for idx, count in enumerate(buckets)
+            )
+
+        return EpisodeRetentionGraphData(rows)
+
+
+class UniqueIpSketchQuerySet(QuerySet["UniqueIpSketch"]):
+    @classmethod
+    def as_manager(cls) -> "UniqueIpSketchManager":
+        return cast("UniqueIpSketchManager", super().as_manager())
+
+    def filter_by_user(self, user: "AbstractBaseUser | AnonymousUser"):
+        if not isinstance(user, AbstractUser) or not user.is_staff:
+            return self.none()
+        if user.is_superuser:
+            return self
+        return self.filter(Q(podcast__owner=user) | Q(podcast__authors=user))
+
+    def get_sketch_rows(self):
+        return (
+            self.order_by()
+            .values("date", "sketch", name=F("podcast__name"), slug=F("podcast__slug"))
+        )
+
+
+def get_unique_ips_rows(
+    sketch_rows: Iterable[dict],
+    period: type[TimePeriod],
+    average: bool,
+    per_podcast: bool = True,
+) -> list[dict]:
+    """
+    Merges sketch rows (as returned by UniqueIpSketchQuerySet.get_sketch_rows()
+    and BaseRequestLogQuerySet.get_unique_ip_sketch_rows()) per podcast and
+    `period`, or per podcast and date if `average` is True (meaning the graph
+    will show the average of the daily counts). Returns graph data rows with
+    estimated counts as `y`.
+    """
+    merged: dict[tuple[str, str, datetime.date], HyperLogLog] = {}
+
+    for row in sketch_rows:
+        date = row["date"] if average else period(row["date"]).start_date
+        key = (row["slug"], row["name"], date) if per_podcast else ("", "", date)
+        merged.setdefault(key, HyperLogLog()).merge(row["sketch"])
+
+    return [
+        {"slug": slug, "name": name, "date": date, "y": float(sketch.count())}
+        for (slug, name, date), sketch in sorted(merged.items())
+    ]
+
+
+def merge_graph_rows(*row_lists: Iterable[dict]) -> list[dict]:
+    """
+    Merges graph data rows from different sources (e.g. rollups for earlier
+    days and raw logs for today) into one list, ordered the way
+    PeriodicalGraphData needs them to be.
+    """
+    rows = [row for row_list in row_lists for row in row_list]
+    return sorted(rows, key=lambda row: (row.get("slug", ""), row["date"]))
+
+
 if TYPE_CHECKING:
     from django.db.models.manager import Manager
 
+    class PodcastEpisodeAudioDailyRollupManager(
+        Manager[PodcastEpisodeAudioDailyRollup],
+        PodcastEpisodeAudioDailyRollupQuerySet,
+    ):
+        def filter(self, *args: Any, **kwargs: Any) -> PodcastEpisodeAudioDailyRollupQuerySet: ...
+
+    class EpisodeRetentionHistogramManager(Manager[EpisodeRetentionHistogram], EpisodeRetentionHistogramQuerySet):
+        def filter(self, *args: Any, **kwargs: Any) -> EpisodeRetentionHistogramQuerySet: ...
+
+    class UniqueIpSketchManager(Manager[UniqueIpSketch], UniqueIpSketchQuerySet):
+        def filter(self, *args: Any, **kwargs: Any) -> UniqueIpSketchQuerySet: ...
+
     class PodcastEpisodeAudioRequestLogManager(
         Manager[PodcastEpisodeAudioRequestLog],
         PodcastEpisodeAudioRequestLogQuerySet,
@@ -0,0 +1,224 @@
+import logging
+from collections import defaultdict
+from typing import Callable
+
+from django.db import transaction
+from django.db.models import (
+    BooleanField,
+    Case,
+    CharField,
+    F,
+    OuterRef,
+    Q,
+    QuerySet,
+    Subquery,
+    Value as V,
+    When,
+)
+
+from spodcat.logs.archive import iter_pk_chunks
+from spodcat.logs.cache import invalidate_graph_cache, user_agent_cache
+from spodcat.logs.ip_check import IpAddressCategory, get_ip_address_category
+from spodcat.logs.models import (
+    ReferrerCategory,
+    RequestLog,
+    UserAgent,
+    UserAgentString,
+)
+from spodcat.logs.rules import get_rules_version
+from spodcat.logs.user_agent import (
+    ReferrerDict,
+    UserAgentData,
+    UserAgentType,
+    get_referrer_dict,
+    get_useragent_data,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class RawValues:
+    """
+    The distinct raw values of the user agent or referrer field in a chunk of
+    logs, and the lookup table ids of those that are stored compactly (see
+    COMPACT_REQUEST_LOGS), so that logs having any of a set of values can be
+    matched without joins.
+    """
+    def __init__(self, queryset: QuerySet[RequestLog], field: str):
+        self.field = field
+        self.string_ids: dict[str, set[int]] = defaultdict(set)
+
+        for value, string_id, string_value in (
+            queryset.order_by().values_list(field, f"{field}_string_id", f"{field}_string__value").distinct()
+        ):
+            if value or string_id is None:
+                self.string_ids.setdefault(value, set())
+            else:
+                self.string_ids[string_value].add(string_id)
+
+    def __iter__(self):
+        return iter(self.string_ids)
+
+    def q(self, values: set[str]) -> Q:
+        """Matches logs whose raw value is one of `values`."""
+        string_ids = [string_id for value in values for string_id in self.string_ids.get(value, ())]
+        q = Q(**{f"{self.field}__in": [value for value in values if value]})
+        if string_ids:
+            q |= Q(**{f"{self.field}_string_id__in": string_ids})
+        if "" in values:
+            q |= Q(**{self.field: "", f"{self.field}_string_id": None})
+        return q
+
+
+class Reclassifier:
+    """
+    Classifies every distinct user agent, IP address, and referrer once per
+    run, no matter how many logs or chunks they occur in.
+    """
+    def __init__(self):
+        self.ip_categories: dict[str, IpAddressCategory] = {}
+        self.referrer_dicts: dict[str, ReferrerDict | None] = {}
+        self.saved_user_agents: set[str] = set()
+
+    def get_ip_category(self, ip: str) -> IpAddressCategory:
+        if ip not in self.ip_categories:
+            self.ip_categories[ip] = get_ip_address_category(ip)
+        return self.ip_categories[ip]
+
+    def get_referrer_dict(self, referrer: str) -> ReferrerDict | None:
+        if referrer not in self.referrer_dicts:
+            self.referrer_dicts[referrer] = get_referrer_dict(referrer) if referrer else None
+        return self.referrer_dicts[referrer]
+
+    def save_user_agents(self, ua_datas: list[UserAgentData]):
+        """Creates UserAgent objects, or updates them to the current rules."""
+        ua_datas = [data for data in ua_datas if data.user_agent not in self.saved_user_agents]
+        if not ua_datas:
+            return
+
+        UserAgent.objects.bulk_create(
+            [
+                UserAgent(
+                    user_agent=data.user_agent,
+                    name=data.name,
+                    type=data.type,
+                    device_category=data.device_category,
+                    device_name=data.device_name,
+                )
+                for data in ua_datas
+            ],
+            update_conflicts=True,
+            unique_fields=["user_agent"],
+            update_fields=["device_category", "device_name", "name", "type"],
+        )
+        for data in ua_datas:
+            # bulk_create() doesn't send the signals that normally do this.
+            user_agent_cache.delete(data.user_agent)
+            self.saved_user_agents.add(data.user_agent)
+
+    def reclassify_chunk(self, chunk: QuerySet[RequestLog], version: str) -> int:
+        user_agents = RawValues(chunk, "user_agent")
+        referrers = RawValues(chunk, "referrer")
+        ips = set(chunk.exclude(remote_addr=None).order_by().values_list("remote_addr", flat=True).distinct())
+
+        ua_datas = {ua: data for ua in user_agents if (data := get_useragent_data(ua))}
+        bot_ips: dict[IpAddressCategory, list[str]] = defaultdict(list)
+        browser_uas = {ua for ua, data in ua_datas.items() if data.type == UserAgentType.BROWSER}
+        referrers_by_dict: dict[tuple[str, str], set[str]] = defaultdict(set)
+
+        for ip in ips:
+            category = self.get_ip_category(ip)
+            if category.is_bot:
+                bot_ips[category].append(ip)
+
+        for referrer in referrers:
+            ref_dict = self.get_referrer_dict(referrer)
+            if ref_dict:
+                referrers_by_dict[(ref_dict["category"], ref_dict["name"])].add(referrer)
+
+        self.save_user_agents(list(ua_datas.values()))
+
+        bot_q = user_agents.q({ua for ua, data in ua_datas.items() if data.is_bot})
+        bot_q |= Q(remote_addr__in=[ip for category_ips in bot_ips.values() for ip in category_ips])
+
+        # Referrers are only classified for browsers.
+        not_browser = ~user_agents.q(browser_uas)
+
+        return chunk.update(
+            is_bot=Case(
+                When(bot_q, then=V(True)),
+                default=V(False),
+                output_field=BooleanField(),
+            ),
+            referrer_category=Case(
+                When(not_browser, then=V(None)),
+                *[
+                    When(referrers.q(values), then=V(ReferrerCategory(category).value))
+                    for (category, _), values in referrers_by_dict.items()
+                ],
+                default=V(None),
+                output_field=CharField(),
+            ),
+            referrer_name=Case(
+                When(not_browser, then=V("")),
+                *[When(referrers.q(values), then=V(name)) for (_, name), values in referrers_by_dict.items()],
+                default=V(""),
+                output_field=CharField(),
+            ),
+            remote_addr_category=Case(
+                *[
+                    When(remote_addr__in=category_ips, then=V(category.value))
+                    for category, category_ips in bot_ips.items()
+                ],
+                default=V(IpAddressCategory.UNKNOWN.value),
+                output_field=CharField(),
+            ),
+            rules_version=V(version),
+            # UserAgent's primary key is the user agent string itself.
+            user_agent_data_id=Case(
+                When(Q(user_agent__in=[ua for ua in ua_datas if ua]), then=F("user_agent")),
+                When(
+                    user_agents.q(set(ua_datas)) & Q(user_agent=""),
+                    then=Subquery(UserAgentString.objects.filter(pk=OuterRef("user_agent_string_id")).values("value")),
+                ),
+                default=V(None),
+                output_field=CharField(),
+            ),
+        )
+
+
+def reclassify_logs(
+    log_class: type[RequestLog],
+    chunk_size: int = 1000,
+    full: bool = False,
+    progress: Callable[[int], None] | None = None,
+) -> int:
+    """
+    Redoes the bot, user agent, IP address, and referrer classification of
+    all `log_class` logs that were classified with other rules than the
+    current ones (see get_rules_version()), or of all logs if `full` is True.
+    Logs are updated in chunks of at most `chunk_size`, with one UPDATE query
+    per chunk, each in its own transaction. Can safely be interrupted and
+    run again.
+
+    `progress` is called after every chunk with the number of reclassified
+    logs so far. Returns the total number of reclassified logs.
+    """
+    version = get_rules_version()
+    queryset = log_class.objects.all() if full else log_class.objects.exclude(rules_version=version)
+    reclassifier = Reclassifier()
+    count = 0
+
+    for first_pk, last_pk in iter_pk_chunks(queryset, chunk_size):
+        with transaction.atomic():
+            count += reclassifier.reclassify_chunk(queryset.filter(pk__gte=first_pk, pk__lte=last_pk), version)
+
+        logger.info("%d %s reclassified", count, log_class.__name__)
+        if progress:
+            progress(count)
+
+    if count:
+        invalidate_graph_cache()
+
+    return count
@@ -0,0 +1,304 @@
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import Iterable, Iterator
+
+from django.db import close_old_connections
+
+from spodcat.settings import spodcat_settings
+
+
+logger = logging.getLogger(__name__)
+
+
+def lookup_remote_host(ip: str) -> str:
+    """Blocking PTR lookup. Returns empty string if there was no result."""
+    remote_host = socket.getfqdn(ip)
+    return remote_host if remote_host != ip else ""
+
+
+class RemoteHostResolver:
+    """
+    Reverse DNS lookups through a thread pool, with a bounded TTL cache that
+    also remembers failed lookups (for a shorter while). A lookup that takes
+    longer than `timeout` seconds counts as failed as far as the caller is
+    concerned; its worker thread will finish in the background, though, since
+    there is no way to cancel a blocking socket.getfqdn().
+    """
+    def __init__(
+        self,
+        max_workers: int,
+        timeout: float,
+        cache_size: int = 10000,
+        ttl: float = 86400.0,
+        negative_ttl: float = 3600.0,
+    ):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._cache: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+        self._hung: set[Future] = set()
+        self._pid = os.getpid()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="spodcat-rdns")
+                self._hung = set()
+                self._pid = os.getpid()
+            return self._executor
+
+    def get_cached(self, ip: str) -> str | None:
+        with self._lock:
+            cached = self._cache.get(ip, None)
+            if cached is None:
+                return None
+            if cached[1] < time.monotonic():
+                del self._cache[ip]
+                return None
+            self._cache.move_to_end(ip)
+            return cached[0]
+
+    def resolve(self, ip: str) -> str:
+        return self.resolve_many([ip]).get(ip, "")
+
+    def resolve_many(self, ips: Iterable[str]) -> dict[str, str]:
+        """
+        Resolves all `ips` concurrently. Returns all results within
+        `timeout` seconds; the rest get empty strings. Lookups that never got
+        to start within that time (because all workers were busy) are
+        cancelled and not cached, so they will be tried again next time.
+        """
+        result: dict[str, str] = {}
+        futures = {}
+
+        for ip in set(ips):
+            cached = self.get_cached(ip)
+            if cached is not None:
+                result[ip] = cached
+            else:
+                futures[self.executor.submit(lookup_remote_host, ip)] = ip
+
+        if futures:
+            done, _ = wait(futures, timeout=self.timeout)
+            for future, ip in futures.items():
+                result[ip] = ""
+                if future in done:
+                    result[ip] = self.get_result(future, ip)
+                    self.set_cached(ip, result[ip])
+                elif not future.cancel():
+                    self.set_cached(ip, "")
+                    self.add_hung(future, ip)
+
+        return result
+
+    def resolve_concurrently(self, ips: Iterable[str], max_in_flight: int) -> Iterator[tuple[str, str]]:
+        """
+        Resolves `ips` with at most `max_in_flight` lookups running at a
+        time, yielding (ip, remote host) as lookups finish. Unlike
+        resolve_many(), `timeout` applies to each lookup separately, counting
+        from when it actually starts. Lookups that time out yield empty
+        strings, but their threads will keep occupying workers until they
+        finish; new lookups are only submitted while there are idle workers,
+        so none of them time out just from waiting in the executor's queue.
+        """
+        pending = iter(set(ips))
+        in_flight: dict[Future, str] = {}
+        started: dict[str, float] = {}
+        exhausted = False
+
+        def lookup(ip: str) -> str:
+            started[ip] = time.monotonic()
+            return lookup_remote_host(ip)
+
+        while True:
+            while (
+                not exhausted and
+                len(in_flight) < max_in_flight and
+                len(in_flight) + len(self.get_hung()) < self.max_workers
+            ):
+                ip = next(pending, None)
+                if ip is None:
+                    exhausted = True
+                    break
+                cached = self.get_cached(ip)
+                if cached is not None:
+                    yield ip, cached
+                else:
+                    in_flight[self.executor.submit(lookup, ip)] = ip
+
+            if not in_flight:
+                if exhausted:
+                    return
+                # Every worker is stuck on a lookup that has timed out.
+                wait(self.get_hung(), return_when=FIRST_COMPLETED)
+                continue
+
+            now = time.monotonic()
+            # Lookups that haven't started yet have no deadline, but will
+            # start any moment now.
+            next_deadline = min(started.get(ip, now) + self.timeout for ip in in_flight.values())
+            done, _ = wait(in_flight, timeout=max(next_deadline - now, 0), return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+
+            for future, ip in list(in_flight.items()):
+                if future in done:
+                    remote_host = self.get_result(future, ip)
+                elif ip in started and started[ip] + self.timeout <= now:
+                    remote_host = ""
+                    self.add_hung(future, ip)
+                else:
+                    continue
+                del in_flight[future]
+                self.set_cached(ip, remote_host)
+                yield ip, remote_host
+
+    def add_hung(self, future: Future, ip: str):
+        """
+        Keeps track of a lookup that timed out but is still occupying a
+        worker. If it does finish with a result, that gets cached.
+        """
+        with self._lock:
+            self._hung.add(future)
+
+        def done(future: Future):
+            with self._lock:
+                self._hung.discard(future)
+            if not future.cancelled() and future.exception() is None and future.result():
+                self.set_cached(ip, future.result())
+
+        future.add_done_callback(done)
+
+    def get_hung(self) -> list[Future]:
+        with self._lock:
+            return list(self._hung)
+
+    def get_result(self, future: Future, ip: str) -> str:
+        try:
+            return future.result(timeout=0)
+        except Exception as e:
+            logger.warning("Could not resolve remote host for %s: %s", ip, e)
+            return ""
+
+    def set_cached(self, ip: str, remote_host: str):
+        ttl = self.ttl if remote_host else self.negative_ttl
+
+        with self._lock:
+            self._cache[ip] = (remote_host, time.monotonic() + ttl)
+            self._cache.move_to_end(ip)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+
+class RemoteHostBackfiller:
+    """
+    Collects IPs whose logs were saved without a remote host, and has a
+    background thread resolve them in batches and fill in the remote host on
+    all request log rows that still lack one. Rows that are still missing
+    remote hosts after this (e.g. because they were saved after the backfill
+    ran) will be handled by the `fill_remote_hosts` management command.
+    """
+    def __init__(self, resolver: RemoteHostResolver, batch_size: int = 100, interval: float = 10.0):
+        self.resolver = resolver
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: queue.Queue[str] = queue.Queue(maxsize=10000)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._pid = os.getpid()
+
+    def backfill(self, ips: Iterable[str]):
+        from spodcat.logs.models import get_request_log_models
+
+        remote_hosts = {ip: host for ip, host in self.resolver.resolve_many(ips).items() if host}
+        if not remote_hosts:
+            return
+
+        close_old_connections()
+        try:
+            for log_class in get_request_log_models():
+                log_class.update_remote_hosts(remote_hosts, only_empty=True)
+        except Exception as e:
+            logger.error("Could not backfill remote hosts: %s", e, exc_info=e)
+        finally:
+            close_old_connections()
+
+    def enqueue(self, ip: str):
+        self.start()
+
+        try:
+            self._queue.put_nowait(ip)
+        except queue.Full:
+            pass
+
+    def run(self):
+        while True:
+            ips: set[str] = {self._queue.get()}
+            deadline = time.monotonic() + self.interval
+
+            while len(ips) < self.batch_size and time.monotonic() < deadline:
+                try:
+                    ips.add(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+
+            self.backfill(ips)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=10000)
+                self._pid = os.getpid()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run, name="spodcat-rdns-backfill", daemon=True)
+                self._thread.start()
+
+
+remote_host_resolver: RemoteHostResolver | None = None
+remote_host_backfiller: RemoteHostBackfiller | None = None
+remote_host_lock = threading.Lock()
+
+
+def get_remote_host_resolver() -> RemoteHostResolver:
+    from spodcat.logs import remote_host
+
+    if remote_host.remote_host_resolver is None:
+        with remote_host.remote_host_lock:
+            if remote_host.remote_host_resolver is None:
+                remote_host.remote_host_resolver = RemoteHostResolver(
+                    max_workers=spodcat_settings.REMOTE_HOST_LOOKUP_WORKERS,
+                    timeout=spodcat_settings.REMOTE_HOST_LOOKUP_TIMEOUT,
+                )
+
+    return remote_host.remote_host_resolver
+
+
+def get_remote_host_backfiller() -> RemoteHostBackfiller:
+    from spodcat.logs import remote_host
+
+    resolver = get_remote_host_resolver()
+
+    if remote_host.remote_host_backfiller is None:
+        with remote_host.remote_host_lock:
+            if remote_host.remote_host_backfiller is None:
+                remote_host.remote_host_backfiller = RemoteHostBackfiller(resolver)
+
+    return remote_host.remote_host_backfiller
@@ -0,0 +1,385 @@
+import datetime
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import (
+    Count,
+    FloatField,
+    Max,
+    Min,
+    QuerySet,
+    Sum,
+    Value as V,
+)
+from django.db.models.functions import Coalesce
+from django.utils.timezone import localdate
+
+from spodcat.logs.cache import invalidate_graph_cache
+from spodcat.logs.coverage import (
+    RETENTION_BUCKETS,
+    Interval,
+    get_covered_buckets,
+    get_covered_size,
+    get_listener_key,
+    merge_intervals,
+)
+from spodcat.logs.hll import HyperLogLog
+from spodcat.logs.models import (
+    EpisodeListenerCoverage,
+    EpisodeRetentionHistogram,
+    PodcastContentRequestLog,
+    PodcastEpisodeAudioDailyRollup,
+    PodcastEpisodeAudioRequestLog,
+    PodcastRequestLog,
+    PodcastRssRequestLog,
+    RequestLog,
+    RollupWatermark,
+    UniqueIpSketch,
+    UniqueIpSketchLogType,
+)
+from spodcat.time_period import Day
+
+
+logger = logging.getLogger(__name__)
+
+AUDIO_ROLLUP_WATERMARK = PodcastEpisodeAudioDailyRollup.WATERMARK
+AUDIO_COVERAGE_WATERMARK = "audio_coverage"
+
+
+def collect_new_logs(
+    queryset: QuerySet["RequestLog"],
+    key: str,
+    watermark: RollupWatermark,
+    full: bool,
+    today: datetime.date,
+) -> tuple[dict[datetime.date, set], int | None]:
+    """
+    Finds the logs in `queryset` that were created since the last run
+    (according to `watermark`), except those from `today` (since today isn't
+    over yet). Returns their distinct `key` values per date, and the new
+    last_id for `watermark`, or None if there were no new logs.
+    """
+    new_logs, last_id = get_new_logs(queryset, watermark, full, today)
+    keys_by_date: dict[datetime.date, set] = defaultdict(set)
+
+    for row in new_logs.values(key, date=Day.trunc("created")).distinct().iterator():
+        keys_by_date[row["date"]].add(row[key])
+
+    return keys_by_date, last_id
+
+
+def get_new_logs(
+    queryset: QuerySet["RequestLog"],
+    watermark: RollupWatermark,
+    full: bool,
+    today: datetime.date,
+) -> tuple[QuerySet["RequestLog"], int | None]:
+    """
+    Returns the logs in `queryset` that were created since the last run
+    (according to `watermark`), except those from `today`, and the new
+    last_id for `watermark`, or None if there were no new logs.
+    """
+    new_logs = queryset.filter(pk__gt=0 if full else watermark.last_id).order_by()
+    max_id = new_logs.aggregate(max_id=Max("pk"))["max_id"]
+
+    if max_id is None:
+        return new_logs.none(), None
+
+    new_logs = new_logs.filter(pk__lte=max_id)
+    # Logs from today will have to be looked at again on the next run, so
+    # don't move the watermark past any of them.
+    first_today_id = new_logs.filter_dates(start_date=today).aggregate(min_id=Min("pk"))["min_id"]
+
+    return (
+        new_logs.filter(created__lt=Day(today).start_datetime),
+        first_today_id - 1 if first_today_id is not None else max_id,
+    )
+
+
+def rollup_audio_logs(full: bool = False) -> int:
+    """
+    Updates PodcastEpisodeAudioDailyRollup with all
+    PodcastEpisodeAudioRequestLogs created since the last run, except those
+    from today. Every (episode, date) that has any new logs is recomputed in
+    full, so logs that are added after the fact (e.g. imported from access
+    logs) are handled too. With `full=True`, everything is recomputed.
+
+    Returns the number of recomputed (episode, date) combinations.
+    """
+    today = localdate()
+    watermark, _ = RollupWatermark.objects.get_or_create(name=AUDIO_ROLLUP_WATERMARK)
+    episodes_by_date, last_id = collect_new_logs(
+        PodcastEpisodeAudioRequestLog.objects.all(),
+        key="episode_id",
+        watermark=watermark,
+        full=full,
+        today=today,
+    )
+
+    for idx, (date, episode_ids) in enumerate(sorted(episodes_by_date.items())):
+        logger.info("(%d/%d) Rolling up %s", idx + 1, len(episodes_by_date), date)
+        rollup_audio_logs_for_date(date, episode_ids)
+
+    if last_id is not None:
+        watermark.last_id = last_id
+    watermark.complete_through = today - datetime.timedelta(days=1)
+    watermark.save()
+
+    if episodes_by_date:
+        invalidate_graph_cache()
+
+    return sum(len(episode_ids) for episode_ids in episodes_by_date.values())
+
+
+@transaction.atomic
+def rollup_audio_logs_for_date(date: datetime.date, episode_ids: set[str]):
+    rows = (
+        PodcastEpisodeAudioRequestLog.objects
+        .filter_dates(start_date=date, end_date=date)
+        .filter(episode_id__in=episode_ids)
+        .order_by()
+        .values("episode_id", "is_bot")
+        .with_quota_fetched_alias()
+        .annotate(
+            plays=Coalesce(Sum("quota_fetched"), V(0.0), output_field=FloatField()),
+            response_body_size_sum=Coalesce(Sum("response_body_size"), V(0)),
+            request_count=Sum("request_count"),
+            listener_count=Count("remote_addr", distinct=True),
+        )
+    )
+    rollups = [
+        PodcastEpisodeAudioDailyRollup(
+            date=date,
+            episode_id=row["episode_id"],
+            is_bot=row["is_bot"],
+            listeners=row["listener_count"],
+            plays=row["plays"],
+            requests=row["request_count"],
+            response_body_size=row["response_body_size_sum"],
+        )
+        for row in rows
+    ]
+
+    PodcastEpisodeAudioDailyRollup.objects.filter(date=date, episode_id__in=episode_ids).delete()
+    PodcastEpisodeAudioDailyRollup.objects.bulk_create(rollups)
+
+
+def get_unique_ip_source(log_type: UniqueIpSketchLogType) -> tuple[QuerySet["RequestLog"], str, str | None]:
+    """
+    Returns the logs that go into sketches of `log_type`, and the field names
+    for their podcast and content (if any) ids.
+    """
+    match log_type:
+        case UniqueIpSketchLogType.AUDIO:
+            return PodcastEpisodeAudioRequestLog.objects.all(), "episode__podcast_id", "episode_id"
+        case UniqueIpSketchLogType.CONTENT:
+            return PodcastContentRequestLog.objects.all(), "content__podcast_id", "content_id"
+        case UniqueIpSketchLogType.PODCAST:
+            return PodcastRequestLog.objects.all(), "podcast_id", None
+        case UniqueIpSketchLogType.RSS:
+            # The RSS unique IPs graph ignores logs without user agent.
+            return PodcastRssRequestLog.objects.exclude_without_user_agent(), "podcast_id", None
+    raise ValueError(log_type)
+
+
+def rollup_unique_ips(full: bool = False) -> int:
+    """
+    Updates UniqueIpSketch with all request logs created since the last run,
+    except those from today. Works like rollup_audio_logs(), but separately
+    for each log type.
+
+    Returns the number of recomputed (podcast or content, date) combinations.
+    """
+    today = localdate()
+    count = 0
+
+    for log_type in UniqueIpSketchLogType:
+        queryset, podcast_field, content_field = get_unique_ip_source(log_type)
+        watermark, _ = RollupWatermark.objects.get_or_create(name=UniqueIpSketch.get_watermark_name(log_type))
+        keys_by_date, last_id = collect_new_logs(
+            queryset,
+            key=content_field or podcast_field,
+            watermark=watermark,
+            full=full,
+            today=today,
+        )
+
+        for idx, (date, keys) in enumerate(sorted(keys_by_date.items())):
+            logger.info("(%d/%d) Building %s sketches for %s", idx + 1, len(keys_by_date), log_type.label, date)
+            rollup_unique_ips_for_date(log_type, date, keys)
+
+        if last_id is not None:
+            watermark.last_id = last_id
+        watermark.complete_through = today - datetime.timedelta(days=1)
+        watermark.save()
+
+        count += sum(len(keys) for keys in keys_by_date.values())
+
+    if count:
+        invalidate_graph_cache()
+
+    return count
+
+
+@transaction.atomic
+def rollup_unique_ips_for_date(log_type: UniqueIpSketchLogType, date: datetime.date, keys: set):
+    queryset, podcast_field, content_field = get_unique_ip_source(log_type)
+    key_field = content_field or podcast_field
+    fields = [podcast_field, "is_bot"] + ([content_field] if content_field else [])
+    sketches: dict[tuple, HyperLogLog] = {}
+
+    for row in (
+        queryset
+        .filter_dates(start_date=date, end_date=date)
+        .filter(**{f"{key_field}__in": keys})
+        .exclude(remote_addr=None)
+        .order_by()
+        .values("remote_addr", *fields)
+        .distinct()
+        .iterator()
+    ):
+        key = (row[podcast_field], row[content_field] if content_field else None, row["is_bot"])
+        sketches.setdefault(key, HyperLogLog()).add(row["remote_addr"])
+
+    UniqueIpSketch.objects.filter(
+        log_type=log_type,
+        date=date,
+        **{"content_id__in" if content_field else "podcast_id__in": keys},
+    ).delete()
+    UniqueIpSketch.objects.bulk_create([
+        UniqueIpSketch(
+            content_id=content_id,
+            date=date,
+            is_bot=is_bot,
+            log_type=log_type,
+            podcast_id=podcast_id,
+            sketch=sketch.to_bytes(),
+            unique_ips=sketch.count(),
+        )
+        for (podcast_id, content_id, is_bot), sketch in sketches.items()
+    ])
+
+
+def rollup_audio_coverage(full: bool = False, chunk_size: int = 10000) -> int:
+    """
+    Updates EpisodeListenerCoverage and EpisodeRetentionHistogram with all
+    non-bot PodcastEpisodeAudioRequestLogs created since the last run, except
+    those from today. Since coverage can only grow, logs are processed
+    incrementally: each one's byte range is merged into its listener's
+    coverage, and the histogram buckets that the listener has reached since
+    last time are incremented. The logs are handled in chunks of
+    `chunk_size`, each in its own transaction. With `full=True`, everything
+    is recomputed.
+
+    Episodes whose audio_file_length is unknown are skipped.
+
+    Returns the number of processed logs.
+    """
+    watermark, _ = RollupWatermark.objects.get_or_create(name=AUDIO_COVERAGE_WATERMARK)
+    new_logs, last_id = get_new_logs(
+        PodcastEpisodeAudioRequestLog.objects.filter(is_bot=False).exclude(remote_addr=None),
+        watermark=watermark,
+        full=full,
+        today=localdate(),
+    )
+    count = 0
+
+    if full:
+        with transaction.atomic():
+            EpisodeListenerCoverage.objects.all().delete()
+            EpisodeRetentionHistogram.objects.all().delete()
+            watermark.last_id = 0
+            watermark.save()
+        invalidate_graph_cache()
+
+    if last_id is None:
+        return 0
+
+    chunk_start = watermark.last_id
+    while True:
+        rows = list(
+            new_logs
+            .filter(pk__gt=chunk_start, episode__audio_file_length__gt=0)
+            .with_raw_user_agent()
+            .order_by("pk")
+            .values_list(
+                "pk",
+                "episode_id",
+                "remote_addr",
+                "raw_user_agent",
+                "range_start",
+                "range_end",
+                "response_body_size",
+            )[:chunk_size]
+        )
+        if not rows:
+            break
+
+        intervals: dict[str, dict[str, list[Interval]]] = defaultdict(lambda: defaultdict(list))
+        for _, episode_id, remote_addr, user_agent, range_start, range_end, response_body_size in rows:
+            if range_start is None or range_end is None:
+                range_start, range_end = 0, response_body_size
+            intervals[str(episode_id)][get_listener_key(remote_addr, user_agent)].append((range_start, range_end))
+
+        with transaction.atomic():
+            for episode_id, listener_intervals in intervals.items():
+                update_episode_coverage(episode_id, listener_intervals)
+            watermark.last_id = min(rows[-1][0], last_id)
+            watermark.save()
+
+        count += len(rows)
+        chunk_start = rows[-1][0]
+        logger.info("%d logs processed", count)
+
+    with transaction.atomic():
+        watermark.last_id = last_id
+        watermark.save()
+
+    if count:
+        invalidate_graph_cache()
+
+    return count
+
+
+def update_episode_coverage(episode_id: str, listener_intervals: dict[str, list[Interval]]):
+    from spodcat.models import Episode
+
+    total_size = Episode.objects.values_list("audio_file_length", flat=True).get(pk=episode_id)
+    histogram = EpisodeRetentionHistogram.objects.select_for_update().filter(episode_id=episode_id).first()
+    if histogram is None:
+        histogram = EpisodeRetentionHistogram(episode_id=episode_id)
+    if len(histogram.buckets) != RETENTION_BUCKETS:
+        histogram.buckets = [0] * RETENTION_BUCKETS
+
+    existing = {
+        coverage.listener: coverage
+        for coverage in EpisodeListenerCoverage.objects.filter(
+            episode_id=episode_id,
+            listener__in=listener_intervals.keys(),
+        )
+    }
+    new_coverages: list[EpisodeListenerCoverage] = []
+
+    for listener, intervals in listener_intervals.items():
+        coverage = existing.get(listener, None)
+        if coverage is None:
+            coverage = EpisodeListenerCoverage(episode_id=episode_id, listener=listener)
+            new_coverages.append(coverage)
+            histogram.listeners += 1
+
+        old_intervals = [tuple(interval) for interval in coverage.intervals]
+        merged = merge_intervals(old_intervals + intervals)
+        reached = (
+            get_covered_buckets(merged, total_size) -
+            get_covered_buckets(old_intervals, total_size)
+        )
+        for idx in reached:
+            histogram.buckets[idx] += 1
+
+        coverage.intervals = [list(interval) for interval in merged]
+        coverage.coverage = min(get_covered_size(merged, total_size) / total_size, 1.0)
+
+    EpisodeListenerCoverage.objects.bulk_create(new_coverages)
+    EpisodeListenerCoverage.objects.bulk_update(existing.values(), ["intervals", "coverage"])
+    histogram.save()
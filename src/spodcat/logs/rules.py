@@ -0,0 +1,38 @@
+import functools
+import hashlib
+from pathlib import Path
+
+from spodcat.logs import ip_check, user_agent
+
+
+USER_AGENT_BASENAMES = ["bots", "apps", "libraries", "browsers", "devices", "referrers"]
+
+
+def get_rules_files() -> list[Path]:
+    """The files that bot, user agent, and referrer classification uses."""
+    return [
+        *(user_agent.submodule_dir / f"user-agents-v2/src/{basename}.json" for basename in USER_AGENT_BASENAMES),
+        *(
+            ip_check.submodule_dir / f"GoodBots/iplists/{category.value}.ips"
+            for category in ip_check.IpAddressCategory
+            if category != ip_check.IpAddressCategory.UNKNOWN
+        ),
+    ]
+
+
+@functools.cache
+def get_rules_version() -> str:
+    """
+    Short hash of the contents of all classification files, which is stored
+    on every request log so logs classified with older rules can be found.
+    Like the parsed files themselves, it's computed once per process.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+
+    for path in get_rules_files():
+        digest.update(f"{path.parent.name}/{path.name}".encode() + b"\0")
+        if path.is_file():
+            digest.update(path.read_bytes())
+        digest.update(b"\0")
+
+    return digest.hexdigest()
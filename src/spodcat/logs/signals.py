@@ -0,0 +1,32 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from spodcat.logs.cache import (
+    geoip_cache,
+    invalidate_graph_cache,
+    user_agent_cache,
+)
+from spodcat.logs.models import GeoIP, UserAgent
+from spodcat.models import Episode, Podcast
+
+
+@receiver(post_save, sender=GeoIP, dispatch_uid="on_geoip_post_save")
+@receiver(post_delete, sender=GeoIP, dispatch_uid="on_geoip_post_delete")
+def on_geoip_change(sender, instance: GeoIP, **kwargs):
+    geoip_cache.delete(instance.ip)
+
+
+@receiver(post_save, sender=UserAgent, dispatch_uid="on_useragent_post_save")
+@receiver(post_delete, sender=UserAgent, dispatch_uid="on_useragent_post_delete")
+def on_useragent_change(sender, instance: UserAgent, **kwargs):
+    user_agent_cache.delete(instance.user_agent)
+
+
+@receiver(post_save, sender=Episode, dispatch_uid="on_episode_post_save_graphs")
+@receiver(post_delete, sender=Episode, dispatch_uid="on_episode_post_delete_graphs")
+@receiver(post_save, sender=Podcast, dispatch_uid="on_podcast_post_save_graphs")
+@receiver(post_delete, sender=Podcast, dispatch_uid="on_podcast_post_delete_graphs")
+def on_graph_source_change(sender, instance: Episode | Podcast, **kwargs):
+    # Cached graphs contain episode and podcast names, and which logs they
+    # cover depends on which episodes exist and what they belong to.
+    invalidate_graph_cache()
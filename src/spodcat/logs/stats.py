@@ -0,0 +1,193 @@
+import dataclasses
+from typing import TYPE_CHECKING, Any, Callable, TypeVar
+
+from django.db.models import Avg, Count, F, Max, Min, Sum, Window
+from django.db.models.functions import RowNumber
+
+from spodcat.logs.cache import get_graph_cache, get_graph_cache_generation
+from spodcat.logs.models import (
+    PodcastContentRequestLog,
+    PodcastEpisodeAudioRequestLog,
+    PodcastRequestLog,
+    UniqueIpSketch,
+    UniqueIpSketchLogType,
+)
+from spodcat.settings import spodcat_settings
+
+
+if TYPE_CHECKING:
+    from django.db.models import Model
+
+    from spodcat.logs.querysets import PodcastEpisodeAudioRequestLogQuerySet
+    from spodcat.models import Episode, Podcast
+    from spodcat.models.querysets import PodcastContentQuerySet
+
+    _Model = TypeVar("_Model", bound=Model)
+    _Stats = TypeVar("_Stats")
+
+
+# Episodes with fewer plays than this are left out of the top lists.
+MIN_TOP_EPISODE_PLAYS = 0.05
+
+
+@dataclasses.dataclass
+class PageViewStats:
+    monthly_views: list[dict]
+    views_total: int
+    visitors_total: int
+
+    @classmethod
+    def collect(cls, queryset, sketches) -> "PageViewStats":
+        monthly_views = queryset.get_monthly_views(sketches=sketches)
+        return cls(
+            monthly_views=monthly_views,
+            views_total=sum(row["views"] for row in monthly_views),
+            visitors_total=queryset.count_unique_ips(sketches=sketches),
+        )
+
+
+@dataclasses.dataclass
+class ListenerStats:
+    top_countries: list[dict]
+    top_apps: list[dict]
+    top_devices: list[dict]
+
+    @classmethod
+    def collect(cls, queryset: "PodcastEpisodeAudioRequestLogQuerySet") -> "ListenerStats":
+        return cls(
+            top_countries=list(queryset.get_ip_count_query(ccode=F("geoip__country"))),
+            top_apps=list(queryset.get_ip_count_query(app_name=F("user_agent_data__name"))),
+            top_devices=list(queryset.get_ip_count_query(device_name=F("user_agent_data__device_name"))),
+        )
+
+
+@dataclasses.dataclass
+class PodcastStats:
+    published_episodes: int
+    episode_durations: dict[str, float | None]
+    home_page: PageViewStats
+    content_page: PageViewStats
+    top_episodes_all_time: list[dict]
+    top_episode_first_week: list[dict]
+    listeners: ListenerStats
+
+    @classmethod
+    def collect(cls, podcast: "Podcast") -> "PodcastStats":
+        from spodcat.models import Episode
+
+        published_episodes, episode_durations = get_duration_stats(Episode.objects.filter(podcast=podcast).listed())
+        audio_request_log_qs = PodcastEpisodeAudioRequestLog.objects.filter(episode__podcast=podcast, is_bot=False)
+        most_played = list(audio_request_log_qs.get_most_played())
+
+        return cls(
+            published_episodes=published_episodes,
+            episode_durations=episode_durations,
+            home_page=PageViewStats.collect(
+                PodcastRequestLog.objects.filter(podcast=podcast),
+                UniqueIpSketch.get_sketches(UniqueIpSketchLogType.PODCAST, podcast=podcast),
+            ),
+            content_page=PageViewStats.collect(
+                PodcastContentRequestLog.objects.filter(content__podcast=podcast),
+                UniqueIpSketch.get_sketches(UniqueIpSketchLogType.CONTENT, podcast=podcast),
+            ),
+            top_episodes_all_time=[
+                row for row in most_played if (row["plays"] or 0) >= MIN_TOP_EPISODE_PLAYS
+            ],
+            top_episode_first_week=sorted(
+                [
+                    {**row, "plays": row["first_week_plays"], "players": row["first_week_players"]}
+                    for row in most_played
+                    if (row["first_week_plays"] or 0) >= MIN_TOP_EPISODE_PLAYS
+                ],
+                key=lambda row: row["plays"],
+                reverse=True,
+            ),
+            listeners=ListenerStats.collect(audio_request_log_qs),
+        )
+
+
+@dataclasses.dataclass
+class EpisodeStats:
+    page: PageViewStats
+    plays_all_time: float | None
+    plays_first_week: float | None
+    players_all_time: int
+    players_first_week: int
+    listeners: ListenerStats
+
+    @classmethod
+    def collect(cls, episode: "Episode") -> "EpisodeStats":
+        audio_request_log_qs = PodcastEpisodeAudioRequestLog.objects.filter(episode=episode, is_bot=False)
+        play_stats = audio_request_log_qs.filter(response_body_size__gt=0).get_play_stats()
+
+        return cls(
+            page=PageViewStats.collect(
+                PodcastContentRequestLog.objects.filter(content=episode),
+                UniqueIpSketch.get_sketches(UniqueIpSketchLogType.CONTENT, content=episode),
+            ),
+            plays_all_time=play_stats["plays"],
+            plays_first_week=play_stats["first_week_plays"],
+            players_all_time=play_stats["players"],
+            players_first_week=play_stats["first_week_players"],
+            listeners=ListenerStats.collect(audio_request_log_qs),
+        )
+
+
+def get_duration_stats(episodes: "PodcastContentQuerySet[Episode]") -> tuple[int, dict[str, float | None]]:
+    """
+    Number of episodes, and the total, min, max, average, and median of their
+    durations, in one query. Only the one or two episodes in the middle are
+    fetched, with the aggregates attached as window functions.
+    """
+    rows = list(
+        episodes
+        .order_by()
+        .annotate(
+            count=Window(Count("pk")),
+            total=Window(Sum("duration_seconds")),
+            min=Window(Min("duration_seconds")),
+            max=Window(Max("duration_seconds")),
+            avg=Window(Avg("duration_seconds")),
+            # Twice the row number, so the middle can be found without
+            # division (which is integer division in some databases).
+            position=Window(RowNumber(), order_by=[F("duration_seconds").asc(), F("pk").asc()]) * 2,
+        )
+        .filter(position__gte=F("count"), position__lte=F("count") + 2)
+        .values("duration_seconds", "count", "total", "min", "max", "avg")
+    )
+
+    if not rows:
+        return 0, {"total": None, "min": None, "max": None, "avg": None, "median": None}
+
+    return rows[0]["count"], {
+        "total": rows[0]["total"],
+        "min": rows[0]["min"],
+        "max": rows[0]["max"],
+        "avg": rows[0]["avg"],
+        "median": sum(row["duration_seconds"] for row in rows) / len(rows),
+    }
+
+
+def get_cached_stats(obj: "_Model", collect: "Callable[[_Model], _Stats]") -> "_Stats":
+    """
+    Statistics pages are cached per object for STATS_CACHE_TIMEOUT seconds,
+    in the same cache (and with the same invalidation) as the graphs.
+    """
+    cache = get_graph_cache()
+    if cache is None:
+        return collect(obj)
+
+    key = f"spodcat:stats:{get_graph_cache_generation(cache)}:{obj._meta.label_lower}:{obj.pk}"
+    stats: Any = cache.get(key)
+    if stats is None:
+        stats = collect(obj)
+        cache.set(key, stats, timeout=spodcat_settings.STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def get_podcast_stats(podcast: "Podcast") -> PodcastStats:
+    return get_cached_stats(podcast, PodcastStats.collect)
+
+
+def get_episode_stats(episode: "Episode") -> EpisodeStats:
+    return get_cached_stats(episode, EpisodeStats.collect)
@@ -1,3 +1,6 @@
+import bisect
+import functools
+import itertools
 import json
 import re
 from dataclasses import dataclass
@@ -55,14 +58,11 @@ class UserAgentData:
         )
 
 
+# Only the keys needed for classification are kept in memory; see
+# get_dicts_from_file().
 class BaseUserAgentDict(TypedDict):
     name: str
     pattern: str
-    comments: str | None
-    description: str | None
-    examples: list[str] | None
-    svg: str | None
-    urls: list[str] | None
 
 
 class UserAgentDict(BaseUserAgentDict):
@@ -77,13 +77,170 @@ class ReferrerDict(BaseUserAgentDict):
     category: Literal["app", "host"]
 
 
+class PatternMatcher:
+    """
+    Finds the first of `entries` whose pattern matches a value, with the same
+    result as running re.search() with each pattern in order, but faster:
+    patterns are compiled once, and for every pattern we try to find a literal
+    string that any match must contain. If the value doesn't contain that
+    string, the regex is never run.
+    """
+    def __init__(self, entries: list[dict]):
+        self.entries = entries
+        self.items: list[tuple[dict, re.Pattern, str, bool]] = []
+
+        for entry in entries:
+            literal, ignore_case = get_required_literal(entry["pattern"])
+            self.items.append((entry, re.compile(entry["pattern"]), literal, ignore_case))
+
+    def match(self, value: str, limit: int | None = None) -> dict | None:
+        """If `limit` is set, only the first `limit` entries are tried."""
+        # re.IGNORECASE matches some non-ASCII characters with ASCII ones
+        # (e.g. "\u0130" and "\u0131" with "i", "\u212a" with "k") in ways no
+        # simple folding reproduces, so such values skip the prefilter.
+        folded = value.lower() if value.isascii() else None
+
+        for entry, regex, literal, ignore_case in itertools.islice(self.items, limit):
+            if literal:
+                if ignore_case:
+                    if folded is not None and literal not in folded:
+                        continue
+                elif literal not in value:
+                    continue
+            if regex.search(value):
+                return entry
+
+        return None
+
+
+@dataclass
+class HostPattern:
+    """
+    A pattern like `^https?://(www\\.)?example\\.com(/|$)`, i.e. one that can
+    be matched by looking at the start of the URL only.
+    """
+    schemes: tuple[str, ...]
+    optional_www: bool
+    host: str
+    # Whether the host may be followed by anything at all, a slash, and/or
+    # the end of the string, respectively.
+    allow_any: bool
+    allow_slash: bool
+    allow_end: bool
+
+    @property
+    def first_label(self) -> str:
+        return self.host.split(".")[0]
+
+    def match(self, scheme: str, rest: str) -> bool:
+        if scheme not in self.schemes:
+            return False
+        for prefix in ("", "www.") if self.optional_www else ("",):
+            if rest.startswith(prefix + self.host):
+                following = rest[len(prefix) + len(self.host):]
+                if (
+                    self.allow_any or
+                    (self.allow_slash and following.startswith("/")) or
+                    # Like re's $, which also matches before a trailing
+                    # newline.
+                    (self.allow_end and following in ("", "\n"))
+                ):
+                    return True
+        return False
+
+
+HOST_PATTERN_RE = re.compile(
+    r"^\^(?P<scheme>https\??|http)://(?P<www>\(www\\\.\)\?)?"
+    r"(?P<host>[a-z0-9-]+(?:\\\.[a-z0-9-]*)+)"
+    r"(?P<end>\(/\|\$\)|\(\$\|/\)|/|\$)?$"
+)
+
+
+def parse_host_pattern(pattern: str) -> HostPattern | None:
+    match = HOST_PATTERN_RE.match(pattern)
+    if not match:
+        return None
+
+    end = match["end"] or ""
+    return HostPattern(
+        schemes={"https?": ("http", "https"), "https": ("https",), "http": ("http",)}[match["scheme"]],
+        optional_www=bool(match["www"]),
+        host=match["host"].replace("\\.", "."),
+        allow_any=not end,
+        allow_slash="/" in end,
+        allow_end="$" in end,
+    )
+
+
+class ReferrerMatcher(PatternMatcher):
+    """
+    Most referrer patterns only look at the scheme and host of the URL. Those
+    are kept in a dict keyed by the first label of their host name, so that
+    for every referrer, only the few patterns for its own host have to be
+    checked. The other patterns are tried with regexes as usual, but only
+    those that come before any matching host pattern, so the result is the
+    same as with a plain PatternMatcher.
+    """
+    def __init__(self, entries: list[dict]):
+        self.entries = entries
+        self.hosts: dict[str, list[tuple[int, HostPattern]]] = {}
+        regex_entries = []
+        self.regex_indices: list[int] = []
+
+        for idx, entry in enumerate(entries):
+            host_pattern = parse_host_pattern(entry["pattern"])
+            if host_pattern:
+                self.hosts.setdefault(host_pattern.first_label, []).append((idx, host_pattern))
+            else:
+                regex_entries.append(entry)
+                self.regex_indices.append(idx)
+
+        self.regex_matcher = PatternMatcher(regex_entries)
+
+    def match(self, value: str, limit: int | None = None) -> dict | None:
+        stop = len(self.entries) if limit is None else limit
+        host_idx = self.match_host(value)
+        if host_idx is not None and host_idx < stop:
+            stop = host_idx
+        else:
+            host_idx = None
+
+        entry = self.regex_matcher.match(value, limit=bisect.bisect_left(self.regex_indices, stop))
+        if entry is None and host_idx is not None:
+            return self.entries[host_idx]
+        return entry
+
+    def match_host(self, value: str) -> int | None:
+        """Index of the first host pattern that matches `value`, if any."""
+        scheme, separator, rest = value.partition("://")
+        if not separator:
+            return None
+
+        labels = {rest.split(".")[0]}
+        if rest.startswith("www."):
+            labels.add(rest[4:].split(".")[0])
+
+        return min(
+            (
+                idx
+                for label in labels
+                for idx, host_pattern in self.hosts.get(label, [])
+                if host_pattern.match(scheme, rest)
+            ),
+            default=None,
+        )
+
+
 user_agent_dict_cache: dict[str, list] = {}
+user_agent_matcher_cache: dict[str, PatternMatcher] = {}
 
 
+@functools.lru_cache(maxsize=10000)
 def get_referrer_dict(referrer: str) -> ReferrerDict | None:
     return get_dict_from_file("referrers", referrer)
 
 
+@functools.lru_cache(maxsize=10000)
 def get_useragent_data(user_agent: str) -> UserAgentData | None:
     basenames: list[tuple[UserAgentType, str]] = [
         (UserAgentType.BOT, "bots"),
@@ -117,10 +274,7 @@ def get_useragent_data(user_agent: str) -> UserAgentData | None:
 
 
 def get_dict_from_file(basename: str, value: str):
-    for ua_dict in get_dicts_from_file(basename):
-        if re.search(ua_dict["pattern"], value):
-            return ua_dict
-    return None
+    return get_matcher(basename).match(value)
 
 
 def get_dicts_from_file(basename: str):
@@ -130,13 +284,106 @@ def get_dicts_from_file(basename: str):
     if cached is not None:
         return cached
 
-    dicts = []
+    dicts = [
+        {key: d[key] for key in ("name", "pattern", "category") if key in d}
+        for d in load_dicts_from_file(basename)
+    ]
+    user_agent.user_agent_dict_cache[basename] = dicts
+
+    return dicts
+
+
+def get_matcher(basename: str) -> PatternMatcher:
+    from spodcat.logs import user_agent
+
+    cached = user_agent.user_agent_matcher_cache.get(basename, None)
+    if cached is not None:
+        return cached
+
+    matcher_class = ReferrerMatcher if basename == "referrers" else PatternMatcher
+    matcher = matcher_class(get_dicts_from_file(basename))
+    user_agent.user_agent_matcher_cache[basename] = matcher
+
+    return matcher
+
+
+def load_dicts_from_file(basename: str) -> list[dict]:
+    """Returns complete entries from file. Not cached."""
     json_path = submodule_dir / f"user-agents-v2/src/{basename}.json"
 
     if json_path.is_file():
         with json_path.open("rt") as f:
-            dicts = json.loads(f.read()).get("entries", [])
-
-    user_agent.user_agent_dict_cache[basename] = dicts
-
-    return dicts
+            return json.loads(f.read()).get("entries", [])
+
+    return []
+
+
+def get_required_literal(pattern: str) -> tuple[str, bool]:
+    """
+    Returns the longest literal string that must be part of any match of
+    `pattern`, and whether it should be matched case insensitively (in which
+    case it's lowercase). Returns an empty string if no such string can be
+    found, or if the pattern uses stuff we don't bother to parse. Never claims
+    a string is required when it isn't, but will often miss ones that are.
+    """
+    ignore_case = False
+    if pattern.startswith("(?i)"):
+        ignore_case = True
+        pattern = pattern[4:]
+    if re.search(r"\(\?[aiLmsux-]+[:)]", pattern):
+        return "", False
+
+    runs: list[str] = []
+    run = ""
+    depth = 0
+    idx = 0
+
+    while idx < len(pattern):
+        char = pattern[idx]
+        literal: str | None = None
+
+        if char == "\\":
+            escaped = pattern[idx + 1:idx + 2]
+            if escaped.isdigit() or escaped in ("x", "u", "U", "N", ""):
+                return "", False
+            if not escaped.isalnum():
+                literal = escaped
+            idx += 2
+        elif char == "[":
+            # Skip the whole character class.
+            idx += 1
+            if pattern[idx:idx + 1] == "^":
+                idx += 1
+            if pattern[idx:idx + 1] == "]":
+                idx += 1
+            while idx < len(pattern) and pattern[idx] != "]":
+                idx += 2 if pattern[idx] == "\\" else 1
+            idx += 1
+        elif char in "*?{":
+            quantifier = re.match(r"\{\d*(,\d*)?\}", pattern[idx:]) if char == "{" else None
+            if char != "{" or quantifier:
+                # The preceding character may occur zero times.
+                run = run[:-1]
+                idx += quantifier.end() if quantifier else 1
+            else:
+                literal = char
+                idx += 1
+        else:
+            if char == "|" and depth == 0:
+                return "", False
+            if char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+            elif char not in ".^$+|":
+                literal = char
+            idx += 1
+
+        if literal is not None and depth == 0 and (not ignore_case or literal.isascii()):
+            run += literal.lower() if ignore_case else literal
+        else:
+            runs.append(run)
+            run = ""
+
+    runs.append(run)
+    return max(runs, key=len), ignore_case
@@ -0,0 +1,38 @@
+import logging
+import time
+
+from spodcat.logs.ip_check import (
+    geoip2_asn_database,
+    geoip2_city_database,
+    get_ip_range_index,
+)
+from spodcat.logs.user_agent import get_matcher
+
+
+logger = logging.getLogger(__name__)
+
+
+def warmup():
+    """
+    Loads all data used for request log classification, which would
+    otherwise be loaded lazily on first use. Call this before forking worker
+    processes (e.g. by having gunicorn run with --preload and setting
+    SPODCAT["PRELOAD_LOG_DATA"] = True), and the workers will share the data
+    copy-on-write instead of loading it on their first request.
+    """
+    started = time.monotonic()
+
+    for version in (4, 6):
+        try:
+            get_ip_range_index(version)
+        except OSError as e:
+            logger.warning("Could not load IP lists: %s", e)
+    for basename in ("bots", "apps", "libraries", "browsers", "devices", "referrers"):
+        get_matcher(basename)
+    for database in (geoip2_asn_database, geoip2_city_database):
+        try:
+            database.get_reader()
+        except OSError as e:
+            logger.warning("Could not open %s: %s", database.path, e)
+
+    logger.info("Log classification data loaded in %.02f s", time.monotonic() - started)
@@ -0,0 +1,184 @@
+import atexit
+import datetime
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from django.db import close_old_connections
+from django.utils import timezone
+from rest_framework.request import Request
+
+from spodcat.settings import spodcat_settings
+
+
+if TYPE_CHECKING:
+    from spodcat.logs.models import RequestLog
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RawRequestLog:
+    """
+    The bare minimum of request data needed to create a RequestLog later on,
+    i.e. without any of the costly enrichment (user agent parsing, GeoIP
+    lookups etc).
+    """
+    log_class: type["RequestLog"]
+    user_agent: str
+    remote_addr: str | None
+    referrer: str
+    path_info: str
+    created: datetime.datetime
+    kwargs: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_request(cls, log_class: type["RequestLog"], request: Request, **kwargs):
+        return cls(
+            log_class=log_class,
+            user_agent=request.headers.get("User-Agent", ""),
+            remote_addr=request.META.get("REMOTE_ADDR", None),
+            referrer=request.headers.get("Referer", ""),
+            path_info=request.path_info,
+            created=timezone.now(),
+            kwargs=kwargs,
+        )
+
+    def to_log(self) -> "RequestLog":
+        return self.log_class.create(
+            user_agent=self.user_agent,
+            remote_addr=self.remote_addr,
+            referrer=self.referrer,
+            path_info=self.path_info,
+            created=self.created,
+            save=False,
+            **self.kwargs,
+        )
+
+
+class RequestLogWriter:
+    """
+    Collects RawRequestLogs in a bounded queue and has a background thread
+    enrich and bulk insert them, one batch per log class. A batch is written
+    when it reaches `batch_size` records or when `flush_interval` seconds
+    have passed since the last write, whichever comes first. Whatever is left
+    in the queue is written when the process exits.
+    """
+    _stop_sentinel = object()
+
+    def __init__(self, max_queue_size: int, batch_size: int, flush_interval: float):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._thread: threading.Thread | None = None
+        self._pid = os.getpid()
+        self._atexit_registered = False
+
+    def enqueue(self, record: RawRequestLog) -> bool:
+        self.start()
+
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            logger.warning("Request log queue is full, dropping %s", record.log_class.__name__)
+            return False
+
+    def flush(self, records: list[RawRequestLog]):
+        batches: dict[type["RequestLog"], list["RequestLog"]] = {}
+
+        for record in records:
+            try:
+                batches.setdefault(record.log_class, []).append(record.to_log())
+            except Exception as e:
+                logger.error("Could not create %s: %s", record.log_class.__name__, e, exc_info=e)
+
+        close_old_connections()
+        try:
+            for log_class, logs in batches.items():
+                try:
+                    log_class.bulk_create_logs(logs, batch_size=self.batch_size)
+                except Exception as e:
+                    logger.error("Could not save %d %s: %s", len(logs), log_class.__name__, e, exc_info=e)
+        finally:
+            close_old_connections()
+
+    def run(self):
+        records: list[RawRequestLog] = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            try:
+                record = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                record = None
+
+            if record is self._stop_sentinel:
+                self.flush(records)
+                return
+
+            if record is not None:
+                records.append(record)
+
+            if len(records) >= self.batch_size or time.monotonic() >= deadline:
+                if records:
+                    self.flush(records)
+                    records = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # We have been forked, and the queue's internal locks may be
+                # in any state. Start over.
+                self._queue = queue.Queue(maxsize=self.max_queue_size)
+                self._pid = os.getpid()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run, name="spodcat-request-log-writer", daemon=True)
+                self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.stop)
+                self._atexit_registered = True
+
+    def stop(self, timeout: float | None = 30.0):
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+
+        try:
+            self._queue.put(self._stop_sentinel, timeout=timeout)
+        except queue.Full:
+            logger.error("Request log queue is full, could not stop writer cleanly")
+            return
+
+        thread.join(timeout=timeout)
+        self._thread = None
+
+
+request_log_writer: RequestLogWriter | None = None
+request_log_writer_lock = threading.Lock()
+
+
+def get_request_log_writer() -> RequestLogWriter:
+    from spodcat.logs import writer
+
+    if writer.request_log_writer is None:
+        with writer.request_log_writer_lock:
+            if writer.request_log_writer is None:
+                writer.request_log_writer = RequestLogWriter(
+                    max_queue_size=spodcat_settings.REQUEST_LOG_QUEUE_SIZE,
+                    batch_size=spodcat_settings.REQUEST_LOG_BATCH_SIZE,
+                    flush_interval=spodcat_settings.REQUEST_LOG_FLUSH_INTERVAL,
+                )
+
+    return writer.request_log_writer
@@ -40,6 +40,26 @@ DEFAULTS = {
     "BACKEND_ROOT": "",
     "USE_INTERNAL_AUDIO_PROXY": False,
     "USE_INTERNAL_AUDIO_REDIRECT": False,
+    "ASYNC_REQUEST_LOGS": False,
+    "REQUEST_LOG_QUEUE_SIZE": 10000,
+    "REQUEST_LOG_BATCH_SIZE": 100,
+    "REQUEST_LOG_FLUSH_INTERVAL": 5.0,
+    "DEFER_REMOTE_HOST_LOOKUPS": False,
+    "REMOTE_HOST_LOOKUP_TIMEOUT": 2.0,
+    "REMOTE_HOST_LOOKUP_WORKERS": 4,
+    "LOG_LOOKUP_CACHE_SIZE": 10000,
+    "LOG_LOOKUP_CACHE_BACKEND": None,
+    "PRELOAD_LOG_DATA": False,
+    "USE_LOG_ROLLUPS": False,
+    "APPROXIMATE_UNIQUE_IPS": False,
+    "LOG_RETENTION_DAYS": {},
+    "LOG_ARCHIVE_STORAGE": None,
+    "AUDIO_REQUEST_SESSION_WINDOW": None,
+    "COMPACT_REQUEST_LOGS": False,
+    "GRAPH_CACHE_BACKEND": None,
+    "GRAPH_CACHE_TIMEOUT": 86400,
+    "GRAPH_CACHE_CURRENT_TIMEOUT": 60,
+    "STATS_CACHE_TIMEOUT": 60,
 }
 
 
@@ -1,10 +1,14 @@
 import datetime
+import functools
 from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING, Self
 
 from dateutil.relativedelta import relativedelta
+from django.db.models import DateField
+from django.db.models.functions import Trunc
+from django.utils.timezone import get_current_timezone_name
 
-from spodcat.utils import date_to_timestamp_ms
+from spodcat.utils import date_to_datetime, date_to_timestamp_ms
 
 
 if TYPE_CHECKING:
@@ -18,20 +22,24 @@ class TimePeriod(ABC):
     """
     start_date: datetime.date
     end_date: datetime.date
-    __start_timestamp: int
-    __end_timestamp: int
+    trunc_kind: str
 
     @property
-    def start_timestamp(self):
-        if not hasattr(self, "__start_timestamp"):
-            self.__start_timestamp = date_to_timestamp_ms(self.start_date)
-        return self.__start_timestamp
+    def end_datetime(self) -> datetime.datetime:
+        """Exclusive upper bound, in the current timezone."""
+        return date_to_datetime(self.end_date)
 
     @property
-    def end_timestamp(self):
-        if not hasattr(self, "__end_timestamp"):
-            self.__end_timestamp = date_to_timestamp_ms(self.end_date)
-        return self.__end_timestamp
+    def start_datetime(self) -> datetime.datetime:
+        return date_to_datetime(self.start_date)
+
+    @functools.cached_property
+    def start_timestamp(self) -> int:
+        return date_to_timestamp_ms(self.start_date)
+
+    @functools.cached_property
+    def end_timestamp(self) -> int:
+        return date_to_timestamp_ms(self.end_date)
 
     @abstractmethod
     def __init__(self, start_date: datetime.date):
@@ -58,6 +66,23 @@ class TimePeriod(ABC):
     def __sub__(self, other) -> Self | int:
         ...
 
+    @classmethod
+    def get_boundaries(cls, start_date: datetime.date, end_date: datetime.date) -> tuple[int, ...]:
+        """
+        Start timestamps of all periods from the one containing `start_date`
+        up to and including the one containing `end_date`, followed by the
+        end timestamp of the last one. Cached per timezone.
+        """
+        return get_period_boundaries(cls, start_date, end_date, get_current_timezone_name())
+
+    @classmethod
+    def trunc(cls, field: str) -> Trunc:
+        """
+        Expression that truncates the DateTimeField `field` to the start date
+        of its period, in the current timezone.
+        """
+        return Trunc(field, cls.trunc_kind, output_field=DateField())
+
     def range(self, stop: Self, inclusive: bool = True) -> "Generator[Self]":
         if stop > self:
             for i in range(stop - self):
@@ -69,6 +94,8 @@ class TimePeriod(ABC):
 
 
 class Day(TimePeriod):
+    trunc_kind = "day"
+
     def __init__(self, start_date: datetime.date):
         self.start_date = start_date
         self.end_date = self.start_date + relativedelta(days=1)
@@ -87,6 +114,8 @@ class Day(TimePeriod):
 
 
 class Month(TimePeriod):
+    trunc_kind = "month"
+
     def __init__(self, start_date: datetime.date):
         self.start_date = datetime.date(start_date.year, start_date.month, 1)
         self.end_date = self.start_date + relativedelta(months=1)
@@ -106,6 +135,8 @@ class Month(TimePeriod):
 
 
 class Week(TimePeriod):
+    trunc_kind = "week"
+
     def __init__(self, start_date: datetime.date):
         year, week, _ = start_date.isocalendar()
         self.start_date = datetime.date.fromisocalendar(year, week, 1)
@@ -125,6 +156,8 @@ class Week(TimePeriod):
 
 
 class Year(TimePeriod):
+    trunc_kind = "year"
+
     def __init__(self, start_date: datetime.date):
         self.start_date = datetime.date(start_date.year, 1, 1)
         self.end_date = self.start_date + relativedelta(years=1)
@@ -140,3 +173,18 @@ class Year(TimePeriod):
         if isinstance(other, Year):
             return relativedelta(self.start_date, other.start_date).years
         return NotImplemented
+
+
+@functools.lru_cache(maxsize=100)
+def get_period_boundaries(
+    period_type: type[TimePeriod],
+    start_date: datetime.date,
+    end_date: datetime.date,
+    timezone_name: str,
+) -> tuple[int, ...]:
+    # timezone_name is only there for the cache key; the timestamps are
+    # computed in the current timezone, which it's the name of.
+    periods = list(period_type(start_date).range(period_type(end_date)))
+    if not periods:
+        return ()
+    return (*(period.start_timestamp for period in periods), periods[-1].end_timestamp)
@@ -79,6 +79,8 @@ class EpisodeViewSet(PodcastContentViewSet[Episode]):
                 request,
                 PodcastEpisodeAudioRequestLog,
                 episode=episode,
+                range_end=range_end,
+                range_start=range_start,
                 response_body_size=range_end - range_start,
                 status_code=status_code,
                 duration_ms=duration_ms,
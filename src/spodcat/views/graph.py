@@ -1,5 +1,14 @@
+import hashlib
+import json
 from datetime import date, timedelta
 
+from django.contrib.auth.models import AbstractUser
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    quote_etag,
+)
+from django.utils.timezone import get_current_timezone_name, localdate
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
@@ -9,7 +18,9 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from spodcat import serializers
-from spodcat.logs.graph_data import PeriodicalGraphData
+from spodcat.logs.cache import get_graph_cache, get_graph_cache_generation
+from spodcat.logs.graph_data import GraphData, PeriodicalGraphData
+from spodcat.settings import spodcat_settings
 from spodcat.time_period import Day, Month, TimePeriod, Week, Year
 
 
@@ -19,35 +30,115 @@ class GraphView(APIView):
     permission_classes=[IsAuthenticated]
 
     def get(self, request: Request, *args, **kwargs):
-        from spodcat.logs.models import (
-            PodcastEpisodeAudioRequestLog,
-            PodcastRssRequestLog,
-        )
-
         graph_type = request.query_params["type"]
-        graph_data: PeriodicalGraphData | None = None
         podcast_id = request.query_params.get("podcast")
         episode_id = request.query_params.get("episode")
-        grouped = podcast_id is None and episode_id is None
+        today = localdate()
         start_date = (
             date.fromisoformat(request.query_params["start"])
             if "start" in request.query_params
-            else date.today() - timedelta(days=30)
+            else today - timedelta(days=30)
         )
         end_date = (
             date.fromisoformat(request.query_params["end"])
             if "end" in request.query_params
-            else date.today()
+            else today
         )
         period = self.get_graph_period_type(request)
+        cache = get_graph_cache()
+        cached = None
+
+        if cache is not None:
+            cache_key = self.get_cache_key(
+                request,
+                get_graph_cache_generation(cache),
+                graph_type,
+                podcast_id,
+                episode_id,
+                start_date,
+                end_date,
+            )
+            cached = cache.get(cache_key)
+
+        if cached is not None:
+            etag, data = cached
+        else:
+            data = self.get_graph_data(request, graph_type, podcast_id, episode_id, start_date, end_date, period)
+            etag = quote_etag(hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest())
+            if cache is not None:
+                # Past days' data only changes when logs are imported,
+                # reclassified, or rolled up, which invalidates the cache.
+                timeout = (
+                    spodcat_settings.GRAPH_CACHE_TIMEOUT
+                    if end_date < today
+                    else spodcat_settings.GRAPH_CACHE_CURRENT_TIMEOUT
+                )
+                cache.set(cache_key, (etag, data), timeout=timeout)
+
+        response = Response(data, headers={"ETag": etag})
+        # Makes browsers revalidate every time, which gets them a 304 if
+        # nothing has changed.
+        patch_cache_control(response, private=True, no_cache=True)
+        return get_conditional_response(request, etag=etag, response=response) or response
+
+    def get_cache_key(
+        self,
+        request: Request,
+        generation: str,
+        graph_type: str,
+        podcast_id: str | None,
+        episode_id: str | None,
+        start_date: date,
+        end_date: date,
+    ) -> str:
+        from spodcat.models import Podcast
+
+        user = request.user
+        if not isinstance(user, AbstractUser) or not user.is_staff:
+            podcasts = []
+        elif user.is_superuser:
+            podcasts = ["*"]
+        else:
+            podcasts = sorted(Podcast.objects.filter_by_user(user).values_list("pk", flat=True).distinct())
+
+        params = [
+            graph_type,
+            podcast_id,
+            episode_id,
+            request.query_params.get("period"),
+            start_date.isoformat(),
+            end_date.isoformat(),
+            get_current_timezone_name(),
+            podcasts,
+        ]
+        return f"spodcat:graph:{generation}:{hashlib.sha1(json.dumps(params).encode()).hexdigest()}"
+
+    def get_graph_data(
+        self,
+        request: Request,
+        graph_type: str,
+        podcast_id: str | None,
+        episode_id: str | None,
+        start_date: date,
+        end_date: date,
+        period: type[TimePeriod] | None,
+    ) -> dict:
+        from spodcat.logs.models import (
+            EpisodeRetentionHistogram,
+            PodcastEpisodeAudioDailyRollup,
+            PodcastEpisodeAudioRequestLog,
+            PodcastRssRequestLog,
+            UniqueIpSketch,
+            UniqueIpSketchLogType,
+        )
+
+        graph_data: PeriodicalGraphData | GraphData | None = None
+        grouped = podcast_id is None and episode_id is None
 
         graph_qs = (
             PodcastEpisodeAudioRequestLog.objects
-            .filter(
-                is_bot=False,
-                created__date__gte=start_date,
-                created__date__lte=end_date,
-            )
+            .filter(is_bot=False)
+            .filter_dates(start_date=start_date, end_date=end_date)
             .filter_by_user(request.user)
         )
         if episode_id:
@@ -55,32 +146,98 @@ class GraphView(APIView):
         elif podcast_id:
             graph_qs = graph_qs.filter(episode__podcast=podcast_id)
 
+        rollup_qs = None
+        rollups_through = (
+            PodcastEpisodeAudioDailyRollup.get_complete_through()
+            if spodcat_settings.USE_LOG_ROLLUPS and graph_type in ("episode-plays", "podcast-plays")
+            else None
+        )
+        if rollups_through is not None:
+            # Rollups for all days they are complete through, raw logs for
+            # the days after that.
+            rollup_qs = (
+                PodcastEpisodeAudioDailyRollup.objects
+                .filter(is_bot=False, date__gte=start_date, date__lte=end_date)
+                .filter(date__lte=rollups_through)
+                .filter_by_user(request.user)
+            )
+            if episode_id:
+                rollup_qs = rollup_qs.filter(episode=episode_id)
+            elif podcast_id:
+                rollup_qs = rollup_qs.filter(episode__podcast=podcast_id)
+            graph_qs = graph_qs.filter_dates(start_date=rollups_through + timedelta(days=1))
+
         if graph_type == "episode-plays":
-            graph_data = graph_qs.get_episode_play_count_graph_data(period=period or Day)
+            graph_data = graph_qs.get_episode_play_count_graph_data(period=period or Day, rollups=rollup_qs)
         elif graph_type == "podcast-plays":
-            graph_data = graph_qs.get_podcast_play_count_graph_data(period=period or Day, grouped=grouped)
+            graph_data = graph_qs.get_podcast_play_count_graph_data(
+                period=period or Day,
+                grouped=grouped,
+                rollups=rollup_qs,
+            )
         elif graph_type == "unique-ips":
-            graph_data = graph_qs.get_unique_ips_graph_data(period=period or Month, grouped=grouped, average=False)
+            sketches = UniqueIpSketch.get_sketches(
+                UniqueIpSketchLogType.AUDIO,
+                is_bot=False,
+                date__gte=start_date,
+                date__lte=end_date,
+            )
+            if sketches is not None:
+                if episode_id:
+                    sketches = sketches.filter(content=episode_id)
+                elif podcast_id:
+                    sketches = sketches.filter(podcast=podcast_id)
+                sketches = sketches.filter_by_user(request.user)
+            graph_data = graph_qs.get_unique_ips_graph_data(
+                period=period or Month,
+                grouped=grouped,
+                average=False,
+                sketches=sketches,
+            )
         elif graph_type == "rss-unique-ips":
             graph_qs = (
                 PodcastRssRequestLog.objects
-                .filter(
-                    is_bot=False,
-                    created__date__gte=start_date,
-                    created__date__lte=end_date,
-                )
-                .exclude(user_agent="")
+                .filter(is_bot=False)
+                .filter_dates(start_date=start_date, end_date=end_date)
+                .exclude_without_user_agent()
                 .filter_by_user(request.user)
             )
+            sketches = UniqueIpSketch.get_sketches(
+                UniqueIpSketchLogType.RSS,
+                is_bot=False,
+                date__gte=start_date,
+                date__lte=end_date,
+            )
             if episode_id:
                 graph_qs = graph_qs.filter(podcast__contents=episode_id)
+                sketches = sketches.filter(podcast__contents=episode_id) if sketches is not None else None
             elif podcast_id:
                 graph_qs = graph_qs.filter(podcast=podcast_id)
-            graph_data = graph_qs.get_unique_ips_graph_data(period=period or Month, grouped=grouped, average=True)
+                sketches = sketches.filter(podcast=podcast_id) if sketches is not None else None
+            if sketches is not None:
+                sketches = sketches.filter_by_user(request.user)
+            graph_data = graph_qs.get_unique_ips_graph_data(
+                period=period or Month,
+                grouped=grouped,
+                average=True,
+                sketches=sketches,
+            )
+        elif graph_type == "episode-retention":
+            # Precomputed by the rollup_audio_coverage command; start and end
+            # dates don't apply.
+            histogram_qs = EpisodeRetentionHistogram.objects.filter_by_user(request.user)
+            if episode_id:
+                histogram_qs = histogram_qs.filter(episode=episode_id)
+            elif podcast_id:
+                histogram_qs = histogram_qs.filter(episode__podcast=podcast_id)
+            graph_data = histogram_qs.get_retention_graph_data()
 
+        if isinstance(graph_data, GraphData):
+            serializer = serializers.GraphSerializer({"datasets": graph_data.datasets})
+            return serializer.data
         if graph_data:
             serializer = serializers.GraphSerializer({"datasets": graph_data.get_datasets(start_date, end_date)})
-            return Response(serializer.data)
+            return serializer.data
 
         raise ValidationError({"type": "Not a valid graph type."})
 
@@ -3,6 +3,8 @@ from typing import TYPE_CHECKING
 
 from rest_framework.request import Request
 
+from spodcat.settings import spodcat_settings
+
 
 if TYPE_CHECKING:
     from spodcat.logs.models import RequestLog
@@ -14,6 +16,14 @@ logger = logging.getLogger(__name__)
 class LogRequestMixin:
     def log_request(self, request: Request, log_class: type["RequestLog"], **kwargs):
         try:
-            log_class.create_from_request(request, **kwargs)
+            if spodcat_settings.ASYNC_REQUEST_LOGS:
+                from spodcat.logs.writer import (
+                    RawRequestLog,
+                    get_request_log_writer,
+                )
+
+                get_request_log_writer().enqueue(RawRequestLog.from_request(log_class, request, **kwargs))
+            else:
+                log_class.create_from_request(request, **kwargs)
         except Exception as e:
             logger.error("Could not create %s: %s", log_class.__name__, e, exc_info=e)